@@ -10,6 +10,10 @@ PyShell master module
 =====================
 
 Use this for quick access to commonly used classes!
+
+On Python 3.7 and later, the command line engines are imported only when 
+they are first used, so that ``import pyshell`` stays cheap for short-lived
+tools.
 """
 
 from __future__ import (absolute_import, unicode_literals, division,
@@ -17,17 +21,34 @@ from __future__ import (absolute_import, unicode_literals, division,
 
 # pylint: disable = invalid-name
 
+import sys as _sys
+import importlib as _importlib
+
 version = "0.6.2"
 __all__ = []
 
-from .base import *
-__all__ += ['CLIEngine',
-    'PYSHELL_LOGGING','PYSHELL_LOGGING_STREAM','PYSHELL_LOGGING_STREAM_ALL']
-
 from .loggers import getLogger, getSimpleLogger, configure_logging, buffer_logger
-__all__ += ['getLogger' , 'getSimpleLogger', 'configure_logging']
+from .loggers import PYSHELL_LOGGING, PYSHELL_LOGGING_STREAM, PYSHELL_LOGGING_STREAM_ALL
+__all__ += ['getLogger' , 'getSimpleLogger', 'configure_logging',
+    'PYSHELL_LOGGING','PYSHELL_LOGGING_STREAM','PYSHELL_LOGGING_STREAM_ALL']
 buffer_logger()
 del buffer_logger # Cleanup Namespace
 
-from .subcommand import SCEngine, SCController
-__all__ += ['SCEngine', 'SCController']
\ No newline at end of file
+_lazy = {
+    'CLIEngine' : '.base',
+    'SCEngine' : '.subcommand',
+    'SCController' : '.subcommand',
+}
+__all__ += list(_lazy)
+
+def __getattr__(name):
+    """Import the command line engines on first use."""
+    if name in _lazy:
+        value = getattr(_importlib.import_module(_lazy[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    
+if _sys.version_info < (3, 7):
+    from .base import CLIEngine
+    from .subcommand import SCEngine, SCController
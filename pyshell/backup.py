@@ -15,26 +15,357 @@ from __future__ import (absolute_import, unicode_literals, division,
                         print_function)
 
 
-from subprocess import Popen
+from subprocess import Popen, PIPE
 import subprocess
 import os, os.path
+import re
 import sys
+import time
+import errno
+import signal
 import argparse
+import io
+import json
+import math
+import hashlib
+import shutil
+import tempfile
+import threading
+import collections
+try:
+    import collections.abc as collections_abc
+except ImportError:
+    collections_abc = collections
+from six.moves import queue
+from six.moves import shlex_quote
 from textwrap import fill
 from warnings import warn
 import six
 
 from . import version, CLIEngine, PYSHELL_LOGGING_STREAM
+from .loggers import getLogger
 from .util import force_dir_path, is_remote_path
+from .sync import NativeProcess, Manifest, scan, _replace
 
 __all__ = ['BackupEngine']
 
+NATIVE = "native"
+"""The ``command`` which copies files in-process with :mod:`pyshell.sync`,
+instead of running rsync. It only copies between local paths."""
+
+_POLICY = ('retries', 'backoff', 'timeout', 'idle_timeout', 'retry_codes', 'nice', 'ionice',
+    'incremental')
+"""Settings which can be made for all targets, or for each target."""
+
+_SETTINGS = ('concurrency', 'host_concurrency', 'manifests', 'bwlimit', 'bwlimit_restart',
+    'ssh', 'ssh_master', 'history', 'history_size') + _POLICY
+"""Settings for the engine, which are read from the top level of the 
+configuration. A top level mapping with one of these names is still read as
+a target, with a warning."""
+
+log = getLogger(__name__)
+
+_PROGRESS = re.compile(r"^\s*([\d,]+)\s+(\d+)%\s+(\S+/s)\s+(\d+:\d{2}:\d{2})")
+_STATS_FILES = re.compile(r"^Number of (?:regular )?files transferred: ([\d,]+)")
+_STATS_SIZE = re.compile(r"^Total transferred file size: ([\d,]+)")
+
+try:
+    from shutil import which
+except ImportError: # pragma: no cover
+    from distutils.spawn import find_executable as which
+
+def _cache_dir():
+    """The directory for pyshell's cached data."""
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "pyshell")
+
+def _data_dir():
+    """The directory for pyshell's persistent, per-user data."""
+    data = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(data, "pyshell")
+
+def _command_version(cmd):
+    """The first line of ``cmd --version``.
+    
+    Results are cached on disk, keyed by the path and modification time of
+    the command, so the command is only run again when it changes. Errors 
+    from running the command (e.g. :exc:`subprocess.CalledProcessError`) 
+    are raised as usual."""
+    path = which(cmd)
+    key = None
+    filename = os.path.join(_cache_dir(), "versions.json")
+    cache = {}
+    if path is not None:
+        key = "{0}:{1!r}".format(os.path.realpath(path), os.stat(path).st_mtime)
+        try:
+            with open(filename, 'r') as stream:
+                cache = json.load(stream)
+        except (IOError, OSError, ValueError):
+            cache = {}
+        if key in cache:
+            return cache[key]
+    version = subprocess.check_output([cmd, str('--version')]).splitlines()[0].decode("utf-8", "replace")
+    if key is not None:
+        cache[key] = version
+        try:
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as stream:
+                json.dump(cache, stream)
+        except (IOError, OSError):
+            pass
+    return version
+
+def _bind_engine(action, engine):
+    """Return an argparse action bound to an engine."""
+    class _BoundAction(action):
+        pass
+    _BoundAction.engine = engine
+    return _BoundAction
+
+class _HelpAction(argparse._HelpAction):
+    """Help which includes the command version, found only when help is shown."""
+    
+    engine = None
+    
+    def __call__(self, parser, namespace, values, option_string=None):
+        parser.description = self.engine.full_description
+        super(_HelpAction, self).__call__(parser, namespace, values, option_string)
+    
+class _VersionAction(argparse._VersionAction):
+    """A version which includes the command version, found only when asked."""
+    
+    engine = None
+    
+    def __call__(self, parser, namespace, values, option_string=None):
+        self.version = "%(prog)s version {version}\n{cmd_version}".format(
+            version=version, cmd_version=self.engine._cmd_version)
+        super(_VersionAction, self).__call__(parser, namespace, values, option_string)
+    
+def _percentile(values, percent):
+    """The ``percent`` percentile of some values, by the nearest rank."""
+    values = sorted(values)
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100 * len(values)))
+    return values[max(rank - 1, 0)]
+    
+class _History(object):
+    """A history of backup runs, kept as one JSON report per line. The file
+    is rewritten through a temporary file which replaces it, so a run which
+    is interrupted never leaves a truncated history.
+    
+    :param filename: The history file.
+    :param size: The number of runs to keep.
+    """
+    def __init__(self, filename, size=100):
+        super(_History, self).__init__()
+        self.filename = filename
+        self.size = size
+        
+    def load(self):
+        """The reports of previous runs, oldest first."""
+        reports = []
+        try:
+            with io.open(self.filename, 'r', encoding='utf-8') as stream:
+                for line in stream:
+                    try:
+                        reports.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except (IOError, OSError):
+            pass
+        return reports
+        
+    def append(self, report):
+        """Add a report, dropping the oldest reports beyond :attr:`size`."""
+        reports = (self.load() + [report])[-self.size:]
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, partial = tempfile.mkstemp(prefix=".{0}.".format(os.path.basename(self.filename)),
+            suffix=".partial", dir=directory or os.curdir)
+        try:
+            with io.open(fd, 'w', encoding='utf-8') as stream:
+                for item in reports:
+                    line = json.dumps(item, sort_keys=True)
+                    stream.write((line if isinstance(line, six.text_type) else line.decode('utf-8')) + "\n")
+                stream.flush()
+                os.fsync(stream.fileno())
+            _replace(partial, self.filename)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        
+    def summary(self, modes=None):
+        """Summarize the successful runs of each target, as a mapping of 
+        target names to their number of runs, median (``p50``) and 95th 
+        percentile (``p95``) durations in seconds, ``throughput`` in bytes
+        per second and ``last`` status. Dry runs are ignored."""
+        runs = {}
+        for report in self.load():
+            if report.get('dry_run'):
+                continue
+            for result in report.get('targets', []):
+                if modes and result['target'] not in modes:
+                    continue
+                runs.setdefault(result['target'], []).append(result)
+        summary = {}
+        for mode, results in runs.items():
+            ok = [ result for result in results if result['status'] == "ok" ]
+            durations = [ result['elapsed'] for result in ok ]
+            elapsed = sum(durations)
+            summary[mode] = dict(runs=len(results), p50=_percentile(durations, 50),
+                p95=_percentile(durations, 95), last=results[-1]['status'],
+                throughput=sum(result['transferred'] for result in ok) / elapsed if elapsed else None)
+        return summary
+    
+def _format_bytes(size):
+    """Format a number of bytes for people."""
+    for unit in ("B", "kB", "MB", "GB", "TB"):
+        if abs(size) < 1000 or unit == "TB":
+            break
+        size /= 1000
+    return "{0:.1f}{1}".format(size, unit) if unit != "B" else "{0:d}B".format(int(size))
+
+class _Progress(object):
+    """Transfer progress for a single destination, parsed from the
+    ``--info=progress2`` and ``--stats`` output of rsync."""
+    
+    def __init__(self):
+        super(_Progress, self).__init__()
+        self.transferred = 0
+        self.files = None
+        self.percent = 0
+        self.rate = ""
+        self.eta = ""
+        self.started = None
+        self.finished = None
+        
+    def parse(self, line):
+        """Update from a line of output. Returns whether the line was a
+        progress line."""
+        match = _PROGRESS.match(line)
+        if match is None:
+            files = _STATS_FILES.match(line)
+            if files is not None:
+                self.files = int(files.group(1).replace(",", ""))
+            size = _STATS_SIZE.match(line)
+            if size is not None:
+                self.transferred = int(size.group(1).replace(",", ""))
+            return False
+        self.transferred = int(match.group(1).replace(",", ""))
+        self.percent = int(match.group(2))
+        self.rate = match.group(3)
+        self.eta = match.group(4)
+        return True
+        
+    @property
+    def elapsed(self):
+        """Time spent on the transfer, in seconds."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+        
+    def line(self, name):
+        """A one line summary of progress."""
+        return "{0:<18s} {1:>9s} {2:>3d}% {3:>12s} ETA {4:s}".format(
+            name, _format_bytes(self.transferred), self.percent, self.rate, self.eta or "-:--:--")
+
+class _SSHMaster(object):
+    """A shared SSH connection to a remote host, used by every rsync command 
+    copying to or from it, so that each command doesn't make its own 
+    connection.
+    
+    :param target: The ``[user@]host`` to connect to.
+    :param directory: The directory for the control socket.
+    :param ssh: The ssh command.
+    """
+    def __init__(self, target, directory, ssh="ssh"):
+        super(_SSHMaster, self).__init__()
+        self.target = target
+        self.ssh = ssh
+        self.path = os.path.join(directory, re.sub(r"[^\w.@-]", "_", target))
+        self.running = False
+        
+    persist = 3600
+    """Seconds the connection stays open once no command is using it. Targets
+    may wait a long time between commands (for retries, for the targets they
+    run after, or for the concurrency limits), so this is long. The 
+    connection is closed by :meth:`stop` at the end of the backup, and this
+    only matters when that never happens (e.g. the backup is killed): the ssh
+    process then exits on its own instead of lingering. A connection which
+    closed anyway is made again by :meth:`restart`."""
+        
+    @property
+    def options(self):
+        """The ssh options which use this connection."""
+        return ["-o", "ControlPath={0}".format(self.path)]
+        
+    @property
+    def rsh(self):
+        """The remote shell command for rsync's ``-e`` option."""
+        return " ".join(shlex_quote(arg) for arg in [self.ssh] + self.options)
+        
+    def start(self):
+        """Connect, returning whether the connection was made. ssh moves to
+        the background once connected (and authenticated)."""
+        with open(os.devnull, 'w') as devnull:
+            returncode = subprocess.call([self.ssh, "-o", "ControlMaster=yes", 
+                "-o", "ControlPersist={0:d}".format(self.persist)] + self.options + ["-fN", self.target],
+                stdout=devnull)
+        self.running = (returncode == 0)
+        if not self.running:
+            warn("Couldn't share a connection to {target} (ssh exited with code "\
+                "{code}).".format(target=self.target, code=returncode), RuntimeWarning)
+        return self.running
+        
+    def check(self):
+        """Whether the connection is still open."""
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call([self.ssh] + self.options + ["-O", "check", self.target],
+                stdout=devnull, stderr=devnull) == 0
+        
+    def restart(self):
+        """Connect again if the connection was made, but has since closed.
+        Returns whether the connection is open."""
+        if self.running and not self.check():
+            log.debug("Reconnecting the shared connection to %s.", self.target)
+            return self.start()
+        return self.running
+        
+    def stop(self):
+        """Close the connection."""
+        if not self.running:
+            return
+        self.running = False
+        with open(os.devnull, 'w') as devnull:
+            subprocess.call([self.ssh] + self.options + ["-O", "exit", self.target], 
+                stdout=devnull, stderr=devnull)
+        
 class _BackupDestination(object):
     """Private class for managing backup destinations"""
+    retry_codes = (23, 24, 30, 35)
+    """The exit codes of rsync which are worth retrying: partial transfers 
+    (23, 24) and rsync's own timeouts (30, 35), which include the
+    :attr:`idle_timeout`. Attempts stopped by the wall clock :attr:`timeout` 
+    are never retried."""
+    
+    ionice_classes = {"realtime": "1", "best-effort": "2", "idle": "3"}
+    """The I/O scheduling classes understood by ``ionice``."""
+    
+    partial_dir = ".rsync-partial"
+    """The directory rsync keeps partially transferred files in when a 
+    transfer is retried, so that they can be resumed."""
+    
     def __init__(self, name, command='rsync', destination=None, origin=None, 
-        delete=False, triggers=None, reverse=False, reversedel=False):
+        delete=False, triggers=None, reverse=False, reversedel=False, priority=0,
+        after=None, manifest=None, incremental=False, retries=0, backoff=10.0,
+        timeout=None, idle_timeout=None, retry_codes=None, nice=None, ionice=None):
         super(_BackupDestination, self).__init__()
         self.name = name
+        self.priority = priority
         self.pseudo = destination is None or origin is None
         self.command = command
         self._destination = destination
@@ -45,8 +376,39 @@ class _BackupDestination(object):
         if triggers is None:
             triggers = []
         self.triggers = triggers
+        self.after = list(after) if after is not None else []
+        self.manifest = manifest
+        self.incremental = incremental
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        if retry_codes is not None:
+            self.retry_codes = tuple(retry_codes)
+        self.nice = nice
+        self.ionice = ionice
+        self.cost = 0
+        self.bwlimit = None
+        self.rsh = None
+        self.acquire = None
+        self.attempts = 0
+        self.timed_out = False
+        self._retrying = threading.Event()
+        self._backing_off = threading.Event()
+        self._preparing = threading.Event()
+        self._cancelled = threading.Event()
+        self._restart = threading.Event()
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._reaped = threading.Event()
+        self.progress = _Progress()
+        self.output = self._print_output
+        self._reader = None
         self._process = False
+        self._prints = False
         self._returncode = None
+        self._scanned = None
+        self._files_from = None
         self._pargs = [ self.command ]
         if self.pseudo and not (destination is None and origin is None):
             raise AttributeError("Missing destination or orign")
@@ -58,14 +420,29 @@ class _BackupDestination(object):
         
     @property
     def running(self):
-        """Accessor for the process argument."""
-        return isinstance(self._process,Popen) and getattr(self._process,'returncode',None) is None
+        """Accessor for the process argument. Destinations finding their
+        changed paths, or waiting to retry, are also running."""
+        return (isinstance(self._process,(Popen, NativeProcess)) and 
+            getattr(self._process,'returncode',None) is None) or self._retrying.is_set() \
+            or self._preparing.is_set()
         
     @property
     def returncode(self):
         """The return code for the running process"""
         return self._returncode
         
+    @property
+    def status(self):
+        """The outcome of this destination: ``"skipped"`` if it never
+        started, ``"running"``, ``"timeout"``, ``"ok"`` or ``"failed"``."""
+        if self.attempts == 0:
+            return "skipped"
+        elif self.running or self.returncode is None:
+            return "running"
+        elif self.timed_out:
+            return "timeout"
+        return "ok" if self.returncode == 0 else "failed"
+        
     @property
     def destination(self):
         """The endpoint for this rsync destination"""
@@ -81,6 +458,28 @@ class _BackupDestination(object):
         """Detect if either path is remote"""
         return is_remote_path(self.origin) , is_remote_path(self.destination)
         
+    @property
+    def host(self):
+        """The remote host used by this destination, or ``None`` for local copies."""
+        target = self.ssh_target
+        if target is None:
+            return None
+        return target.split("@")[-1]
+        
+    @property
+    def ssh_target(self):
+        """The ``[user@]host`` of the remote path used by this destination, 
+        or ``None`` for local copies and for rsync daemon paths (``host::module``
+        or ``rsync://host/module``), which don't use ssh."""
+        if self.pseudo:
+            return None
+        for path in (self.origin, self.destination):
+            if is_remote_path(path):
+                if path.startswith("rsync://") or "::" in path.split(os.path.sep)[0]:
+                    return None
+                return path.split(":", 1)[0]
+        return None
+        
     @property
     def paths(self):
         """Return the correct path pair arguments"""
@@ -124,9 +523,13 @@ class _BackupDestination(object):
                     destination=self.destination),
                 RuntimeWarning)
             return False
+        elif self.command == NATIVE and any(self.remote):
+            warn("Skipping '{mode}' backup. The '{native}' command can't copy "\
+                "remote paths.".format(mode=self.name, native=NATIVE), RuntimeWarning)
+            return False
         
         # Set up this command's arguments
-        self._pargs += list(args) + self.paths
+        self._pargs += list(args)
         
         # Check whether we should use the '--del' option
         if (self.delete or delete) and ((self.reverse and\
@@ -138,32 +541,311 @@ class _BackupDestination(object):
             warn("{mode} is not using '--del' because '--reverse' is set. To \
             override this, please use '--reverse-delete'".format(mode=self.name), UserWarning)
         
+        if self.idle_timeout and self.command != NATIVE:
+            self._pargs += ['--timeout={0:d}'.format(int(self.idle_timeout))]
+        
         print("Starting {mode} backup... {dryrun}".format(mode=self.name,dryrun="" if "-n" not in self._pargs else "(DRY RUN)"))
         
-        # Print the command
-        if prints:
+        # Run the command
+        self._prints = prints
+        self.progress = _Progress()
+        self.progress.started = time.time()
+        self.attempts = 1
+        self.timed_out = False
+        self._cancelled.clear()
+        self._reaper = None
+        self._reaped.clear()
+        if self.command != NATIVE and self.incremental and self.manifest is not None:
+            # Scanning the origin can take a while, so it is left to the
+            # thread which waits for this destination. See :meth:`_prepare`.
+            self._preparing.set()
+        else:
+            self._start(self.paths)
+        
+        return True
+        
+    def _start(self, paths):
+        """Add the paths to the command's arguments, and start it."""
+        self._pargs += paths
+        if self._prints:
             print(" ".join(self._pargs))
+        self._spawn()
         
-        # Run the command
-        self._process = Popen(self._pargs)
+    def _prepare(self):
+        """Find the paths which changed for an incremental run, and start
+        the command. This is called by :meth:`wait`, so that scanning a large 
+        origin doesn't hold up other destinations. Returns whether the 
+        command was started."""
+        try:
+            paths = self.paths
+            if not self._cancelled.is_set():
+                try:
+                    paths = self._incremental(paths)
+                except (IOError, OSError) as error:
+                    warn("Mode {mode} couldn't find changed paths ({error}), so "\
+                        "all paths will be checked.".format(mode=self.name, error=error), 
+                        RuntimeWarning)
+                    paths = self.paths
+            if self._cancelled.is_set():
+                self._returncode = 20
+                return False
+            self._start(paths)
+            return True
+        finally:
+            self._preparing.clear()
+        
+    def _spawn(self):
+        """Start the command's process, and a thread to read its output."""
+        if self.command == NATIVE:
+            process = NativeProcess(self._pargs[1:], manifest=self.manifest)
+        else:
+            args = list(self._pargs)
+            if self.bwlimit:
+                args.insert(1, "--bwlimit={0:d}".format(int(self.bwlimit)))
+            if self.rsh and not any(arg == "-e" or arg.startswith("--rsh") for arg in args):
+                args[1:1] = ["-e", self.rsh]
+            process = Popen(self._prefix() + args, stdout=PIPE)
+        with self._lock:
+            self._process = process
         self._returncode = None
+        self._reader = threading.Thread(target=self._read_output, 
+            name="read({0})".format(self.name))
+        self._reader.daemon = True
+        self._reader.start()
         
-        return True
+    def _prefix(self):
+        """The ``nice`` and ``ionice`` commands which run the command with
+        this destination's CPU and I/O priority."""
+        prefix = []
+        if self.nice is not None:
+            prefix += ["nice", "-n", str(self.nice)]
+        if self.ionice is not None:
+            if which("ionice") is None:
+                warn("Ignoring 'ionice' for mode {mode}, because ionice is not "\
+                    "installed.".format(mode=self.name), RuntimeWarning)
+            else:
+                klass, _, level = str(self.ionice).partition(":")
+                prefix += ["ionice", "-c", self.ionice_classes.get(klass, klass)]
+                if level:
+                    prefix += ["-n", level]
+        return prefix
+        
+    def throttle(self, bwlimit):
+        """Change the bandwidth limit (in KiB/s) of this destination. A 
+        running rsync is restarted to use the new limit, resuming partially
+        transferred files."""
+        self.bwlimit = bwlimit
+        if self.command != NATIVE and self.running and not self._retrying.is_set() \
+            and not self._preparing.is_set():
+            self._restart.set()
+            self._signal()
+    
+    def _signal(self):
+        """Ask the process to stop. :class:`~subprocess.Popen` isn't thread 
+        safe, so only the thread in :meth:`wait` (the reaper) polls or waits
+        for the process, and other threads only send it ``SIGTERM``."""
+        with self._lock:
+            process = self._process
+            if isinstance(process, NativeProcess):
+                process.terminate()
+            elif isinstance(process, Popen) and process.returncode is None:
+                try:
+                    os.kill(process.pid, signal.SIGTERM)
+                except OSError as error:
+                    if error.errno != errno.ESRCH:
+                        raise
+        
+    def _incremental(self, paths):
+        """Give rsync only the paths which changed since the last successful
+        run, using the :mod:`pyshell.sync` manifest of the origin.
+        
+        A full run is used (and a manifest made for next time) when there is
+        no manifest yet, and whenever rsync must look at the whole tree: when 
+        deleting files, when reversed, and for remote origins.
+        """
+        origin, destination = paths
+        self._scanned = None
+        if self.reverse or '--del' in self._pargs or is_remote_path(origin) \
+            or not os.path.isdir(origin):
+            return paths
+        manifest = Manifest(self.manifest, origin, destination)
+        changed, self._scanned = scan(origin, manifest)
+        if not manifest.files:
+            return paths
+        
+        # Paths in the list are relative to the source directory, and rsync
+        # copies a directory itself when there is no trailing separator.
+        if origin.endswith(os.sep):
+            source, prefix = origin, ""
+        else:
+            source = os.path.dirname(os.path.abspath(origin)) + os.sep
+            prefix = os.path.basename(origin)
+        with tempfile.NamedTemporaryFile('wb', prefix="backup-", suffix=".files", 
+            delete=False) as stream:
+            for path in changed:
+                stream.write(os.path.join(prefix, path).encode("utf-8") + b"\0")
+        self._files_from = stream.name
+        log.debug("Backup '%s' has %d changed paths.", self.name, len(changed))
+        return ['--from0', '--files-from={0}'.format(self._files_from), source, destination]
+        
+    def _finish_incremental(self):
+        """Save the manifest after a successful run, and clean up."""
+        scanned, self._scanned = self._scanned, None
+        files_from, self._files_from = self._files_from, None
+        if scanned is not None and self.returncode == 0 and "-n" not in self._pargs:
+            scanned.save()
+        if files_from is not None:
+            os.remove(files_from)
+        
+    def _read_output(self):
+        """Read the command's output, splitting progress updates from other 
+        lines, which are passed to :attr:`output`."""
+        fileno = self._process.stdout.fileno()
+        remainder = b""
+        while True:
+            chunk = os.read(fileno, 65536)
+            if not chunk:
+                break
+            lines = re.split(b"[\r\n]", remainder + chunk)
+            remainder = lines.pop()
+            for line in lines:
+                self._handle_output(line)
+        if remainder:
+            self._handle_output(remainder)
+        self._process.stdout.close()
+        
+    def _handle_output(self, line):
+        """Handle a single line of output."""
+        line = line.decode("utf-8", "replace")
+        if line.strip() and not self.progress.parse(line):
+            self.output(self, line)
+            
+    def _print_output(self, destination, line):
+        """Print a line of output, labeled with this destination's name."""
+        print("[{mode}] {line}".format(mode=self.name, line=line))
         
     def wait(self):
-        """Wait for this command to complete"""
-        self._returncode = self._process.wait()
+        """Wait for this command to complete, retrying it if it fails with 
+        one of the :attr:`retry_codes`. The calling thread becomes the reaper:
+        the only thread which waits for the process, and records its exit
+        status."""
+        with self._lock:
+            reaper, self._reaper = self._reaper, self._reaper or threading.current_thread()
+        if reaper is not None:
+            # :meth:`kill` got here first, and waits for the process itself.
+            self._reaped.wait()
+            return
+        try:
+            self._wait()
+        finally:
+            with self._lock:
+                self._reaper = None
+            self._reaped.set()
+        
+    def _wait(self):
+        """Wait for the process, retry it, and report the outcome. This is
+        only called by the reaper thread."""
+        started = self._prepare() if self._preparing.is_set() else True
+        while started:
+            self._returncode = self._wait_process()
+            if self._reader is not None:
+                self._reader.join()
+                self._reader = None
+            if self._restart.is_set():
+                self._restart.clear()
+                if self.returncode != 0 and not self._cancelled.is_set():
+                    self._resume()
+                    self._spawn()
+                    continue
+            if not self._retry():
+                break
+        if isinstance(self._process, NativeProcess):
+            self.progress.transferred = self._process.sync.transferred
+            self.progress.files = self._process.sync.copied
+        self._finish_incremental()
+        self.progress.finished = time.time()
         if self.returncode != 0:
             warn("Mode {mode} exited abmnormally with code "\
                 "{code}".format(mode=self.name,code=self.returncode), RuntimeWarning)
         print("Finished {mode} backup.".format(mode=self.name))
+        log.info("Backup '%s' transferred %s in %.1fs (exit code %d).", self.name,
+            _format_bytes(self.progress.transferred), self.progress.elapsed, self.returncode)
         
         
+    def _wait_process(self):
+        """Wait for the process, terminating it if it runs longer than
+        :attr:`timeout` seconds."""
+        if not self.timeout:
+            return self._process.wait()
+        deadline = time.time() + self.timeout
+        while self._process.poll() is None:
+            if time.time() > deadline:
+                warn("Mode {mode} timed out after {timeout:g}s.".format(
+                    mode=self.name, timeout=self.timeout), RuntimeWarning)
+                self.timed_out = True
+                self._signal()
+                break
+            time.sleep(min(0.1, max(deadline - time.time(), 0.0)))
+        return self._process.wait()
+        
+    def _retry(self):
+        """Restart the command after a retryable failure, waiting longer after 
+        each attempt. Returns whether the command was restarted. 
+        
+        While it waits, the destination is :attr:`running` but backing off.
+        If :attr:`acquire` is set, it is called with this destination once the 
+        wait is over, and blocks until the destination may run again, 
+        returning ``False`` if it was cancelled meanwhile."""
+        if self.returncode not in self.retry_codes or self.timed_out \
+            or self.attempts > self.retries or self._cancelled.is_set():
+            return False
+        delay = self.backoff * 2 ** (self.attempts - 1)
+        warn("Mode {mode} exited with code {code}, retrying in {delay:g}s "\
+            "(attempt {attempt} of {attempts}).".format(mode=self.name, code=self.returncode,
+            delay=delay, attempt=self.attempts + 1, attempts=self.retries + 1), RuntimeWarning)
+        self._retrying.set()
+        self._backing_off.set()
+        try:
+            if self._cancelled.wait(delay) or self._cancelled.is_set():
+                return False
+            if self.acquire is not None and not self.acquire(self):
+                return False
+            self.attempts += 1
+            self._resume()
+            self._spawn()
+        finally:
+            self._backing_off.clear()
+            self._retrying.clear()
+        return True
+        
+    def _resume(self):
+        """Keep partially transferred files, so that the next run resumes them."""
+        partial = "--partial-dir={0}".format(self.partial_dir)
+        if self.command != NATIVE and partial not in self._pargs:
+            self._pargs.insert(1, partial)
+        
     def kill(self):
         """Kill this command's process"""
-        if self.running:
-            self._process.terminate()
-            self._returncode = self._process.wait()
+        self._cancelled.set()
+        if self._preparing.is_set():
+            print("Terminated {mode} backup".format(mode=self.name))
+            return False
+        elif self.running:
+            with self._lock:
+                reaper, self._reaper = self._reaper, self._reaper or threading.current_thread()
+            self._signal()
+            if reaper is None:
+                # Nothing is waiting for this destination, so reap it here.
+                try:
+                    self._returncode = self._process.wait()
+                    self._finish_incremental()
+                finally:
+                    with self._lock:
+                        self._reaper = None
+                    self._reaped.set()
+            else:
+                while not self._reaped.is_set():
+                    self._reaped.wait(0.1)
             if self.returncode != 0:
                 warn("Mode {mode} terminated with code "\
                     "{code}".format(mode=self.name, code=self.returncode), RuntimeWarning)
@@ -190,6 +872,244 @@ class _BackupDestination(object):
         
         
 
+class _BackupScheduler(object):
+    """Run backup destinations with bounded concurrency.
+    
+    :param start: A function which launches a destination, returning ``True``
+        if it was launched.
+    :param concurrency: The maximum number of destinations running at once.
+    :param host_concurrency: The maximum number of destinations running at once
+        against each remote host. Local copies count as a single host.
+    :param tick: A function called regularly while destinations are running.
+    :param bwlimit: The total bandwidth (in KiB/s) shared by the running 
+        destinations.
+    :param restart: Whether to restart running destinations to give them a
+        larger share of the bandwidth when others finish.
+    
+    Destinations are launched in priority order (highest first, then the most 
+    costly, then in the order they were added), and the next destination is
+    launched as soon as
+    any running destination finishes. A limit of ``0`` or ``None`` means no
+    limit. Destinations can be added with the names of destinations they must 
+    run after. They are launched only once those have finished successfully,
+    and skipped if any of those fail.
+    
+    The bandwidth limit is split evenly between the destinations which may 
+    run at once, counting those still pending, so the running destinations 
+    stay within the limit as others launch. Without ``restart``, only newly
+    launched destinations get a larger share once fewer are left.
+    
+    Destinations waiting to retry give up their place in the concurrency 
+    limits while they back off, and wait for a place before running again.
+    """
+    def __init__(self, start, concurrency=None, host_concurrency=None, tick=None,
+        bwlimit=None, restart=False):
+        super(_BackupScheduler, self).__init__()
+        self.start = start
+        self.tick = tick
+        self.bwlimit = bwlimit
+        self.restart = restart
+        self.concurrency = concurrency
+        self.host_concurrency = host_concurrency
+        self.pending = []
+        self.running = []
+        self.scheduled = set()
+        self.finished = {}
+        self._added = 0
+        self._finished = queue.Queue()
+        self._slots = threading.Condition()
+        
+    def add(self, destination, after=()):
+        """Schedule a destination, unless it has already been scheduled.
+        
+        :param destination: The destination to schedule.
+        :param after: Names of scheduled destinations which must finish first.
+        """
+        if destination.name in self.scheduled:
+            return
+        self.scheduled.add(destination.name)
+        self.pending.append((-destination.priority, -destination.cost, self._added, 
+            destination, tuple(after)))
+        self._added += 1
+        
+    def _blocked(self, after):
+        """Whether a destination must wait for others. Raises :exc:`ValueError`
+        if any of them failed."""
+        for name in after:
+            if name not in self.finished:
+                return True
+            if not self.finished[name]:
+                raise ValueError(name)
+        return False
+        
+    def _available(self, destination):
+        """Whether the concurrency limits allow this destination to start.
+        Destinations backing off before a retry don't count against them."""
+        running = [ other for other in self.running if other is not destination
+            and not other._backing_off.is_set() ]
+        if self.concurrency and len(running) >= self.concurrency:
+            return False
+        if self.host_concurrency:
+            host = destination.host
+            if sum(1 for other in running if other.host == host) >= self.host_concurrency:
+                return False
+        return True
+        
+    def _acquire(self, destination):
+        """Wait until a destination which backed off may run again, taking 
+        back its place in the concurrency limits. Returns ``False`` if it was
+        cancelled meanwhile. This is the destination's 
+        :attr:`~_BackupDestination.acquire`."""
+        with self._slots:
+            while not self._available(destination):
+                if destination._cancelled.is_set():
+                    return False
+                self._slots.wait(0.1)
+            destination._backing_off.clear()
+        return not destination._cancelled.is_set()
+        
+    def _share(self, launching=0):
+        """The bandwidth share of each destination, when ``launching`` more
+        destinations start."""
+        active = len(self.running) + len(self.pending) + launching
+        if self.concurrency:
+            active = min(active, self.concurrency)
+        return max(1, int(self.bwlimit // max(1, active)))
+        
+    def _launch_ready(self):
+        """Launch every pending destination which the limits allow. Launching
+        a destination may schedule others, so this repeats until nothing more 
+        can be launched."""
+        with self._slots:
+            self._launch_pending()
+        
+    def _launch_pending(self):
+        """Launch pending destinations, holding the lock on the limits."""
+        launching = True
+        while launching:
+            launching = False
+            for item in sorted(self.pending):
+                destination, after = item[3:]
+                try:
+                    if self._blocked(after) or not self._available(destination):
+                        continue
+                except ValueError as failed:
+                    warn("Skipping '{mode}' backup, because '{failed}' failed.".format(
+                        mode=destination.name, failed=failed), RuntimeWarning)
+                    self.pending.remove(item)
+                    self.finished[destination.name] = False
+                    launching = True
+                    continue
+                self.pending.remove(item)
+                launching = True
+                if self.bwlimit:
+                    destination.bwlimit = self._share(1)
+                destination.acquire = self._acquire
+                if not self.start(destination):
+                    self.finished[destination.name] = False
+                elif destination.running:
+                    self.running.append(destination)
+                    thread = threading.Thread(target=self._wait, args=(destination,),
+                        name="wait({0})".format(destination.name))
+                    thread.daemon = True
+                    thread.start()
+                else:
+                    self.finished[destination.name] = True
+        
+    def _wait(self, destination):
+        """Wait for a destination in the background."""
+        try:
+            destination.wait()
+        finally:
+            self._finished.put(destination)
+        
+    def run(self):
+        """Run all of the scheduled destinations."""
+        self._launch_ready()
+        while self.running:
+            if self.tick is not None:
+                self.tick()
+            try:
+                destination = self._finished.get(True, 0.5)
+            except queue.Empty:
+                # Destinations backing off leave room for others.
+                self._launch_ready()
+                continue
+            with self._slots:
+                self.running.remove(destination)
+                self._slots.notify_all()
+            self.finished[destination.name] = (destination.returncode == 0)
+            self._launch_ready()
+            if self.bwlimit and self.restart:
+                share = self._share()
+                for other in self.running:
+                    if other.bwlimit and other.bwlimit < share:
+                        other.throttle(share)
+            
+def _backup_plan(destinations, modes):
+    """Plan the backup of the selected modes.
+    
+    :param destinations: A mapping of mode names to destinations.
+    :param modes: The selected mode names.
+    :returns: A list of ``(mode, after)`` pairs in dependency order, where 
+        ``after`` is the list of planned modes which must run first.
+    
+    The plan includes every selected mode, and every mode they trigger 
+    (recursively), each once. Modes named in ``after`` are waited on only 
+    if they are part of the plan. Raises :exc:`ValueError` for unknown modes 
+    and for dependency cycles.
+    """
+    def get(name, referrer=None):
+        """Get a destination, with a helpful error."""
+        if name not in destinations:
+            if referrer is None:
+                raise ValueError("Target '{0}' does not exist.".format(name))
+            raise ValueError("Target '{0}' (used by '{1}') does not exist.".format(name, referrer))
+        return destinations[name]
+    
+    planned = []
+    stack = [ (name, None) for name in reversed(list(modes)) ]
+    while stack:
+        name, referrer = stack.pop()
+        destination = get(name, referrer)
+        if name in planned:
+            continue
+        planned.append(name)
+        stack.extend((trigger, name) for trigger in reversed(destination.triggers))
+    
+    after = {}
+    for name in planned:
+        for dependency in destinations[name].after:
+            get(dependency, name)
+        after[name] = [ dependency for dependency in destinations[name].after 
+            if dependency in planned ]
+    
+    order = []
+    state = {}
+    for root in planned:
+        if root in state:
+            continue
+        path = [root]
+        state[root] = "visiting"
+        iterators = [iter(after[root])]
+        while iterators:
+            for dependency in iterators[-1]:
+                if state.get(dependency) == "visiting":
+                    cycle = path[path.index(dependency):] + [dependency]
+                    raise ValueError("Targets have a dependency cycle: {0}".format(
+                        " -> ".join(reversed(cycle))))
+                if dependency not in state:
+                    state[dependency] = "visiting"
+                    path.append(dependency)
+                    iterators.append(iter(after[dependency]))
+                    break
+            else:
+                iterators.pop()
+                done = path.pop()
+                state[done] = "done"
+                order.append((done, after[done]))
+    return order
+    
 class BackupEngine(CLIEngine):
     """The controlling engine for backups."""
     
@@ -203,8 +1123,21 @@ class BackupEngine(CLIEngine):
         """
         return fill("BackUp – A simple backup utility using {cmd}. The "\
         "utility has configurable targets, and can spawn multiple "\
-        "simultaneous {cmd} processes for efficiency.".format(cmd=self._cmd))\
-        + "\n\n" + fill("Using {version}".format(version=self._cmd_version))
+        "simultaneous {cmd} processes for efficiency.".format(cmd=self._cmd))
+        
+    @property
+    def full_description(self):
+        """The description, with the version of the underlying command.
+        Finding the version runs the command, so this is only used when help
+        is shown."""
+        return self.description + "\n\n" + fill("Using {version}".format(version=self._cmd_version))
+        
+    @property
+    def _cmd_version(self):
+        """The version of the underlying command, found when first needed."""
+        if self.__cmd_version is None:
+            self.__cmd_version = _command_version(self._cmd)
+        return self.__cmd_version
         
         
     @property
@@ -223,24 +1156,26 @@ class BackupEngine(CLIEngine):
     def __init__(self, cmd="rsync"):
         # - Initialization of Command Variables
         # This code all comes before the call to `super` so that the 
-        # `self._cmd` variable is set properly and the `self._cmd_version`
-        # variable is also set when the `super` call asks for the description,
-        # the description property can correctly incorporate information about
-        # the name and version of the command in use.
+        # `self._cmd` variable is set properly when the `super` call asks for 
+        # the description. The version of the command is found only when the
+        # help or version text is shown, see :attr:`_cmd_version`.
         self._cmd = str(cmd)
-        self._cmd_version = subprocess.check_output(
-            [self._cmd, str('--version')],
-            ).splitlines()[0] # We take only the first line
+        self.__cmd_version = None
         # - End initialization of Command Variables
         super(BackupEngine, self).__init__()
         
         self._destinations = {}
         self._help  = [    ]
         self._pargs = ['-a','--partial', '-u']
+        self._scheduler = None
+        self._plan = []
+        self._masters = []
+        self._ssh_directory = None
     
     def init(self):
         """Initialize the command line arguments"""
         super(BackupEngine, self).init()
+        self.parser.register('action', 'help', _bind_engine(_HelpAction, self))
         # This argument should be parsed before the help
         # text is created to dynamically include this info
         # in the help screen.
@@ -258,8 +1193,19 @@ class BackupEngine(CLIEngine):
         self.parser.add_argument('--reverse-delete',
             action='store_true',dest='reversedel',
             help="Use --del flag even when reversed.")
+        self.parser.add_argument('-j','--jobs',
+            action='store', type=int, default=None, metavar='N',
+            help="Run at most N targets at once.")
+        self.parser.add_argument('--progress',
+            action='store_true',
+            help="Show the progress of each target (requires rsync 3.1).")
+        self.parser.add_argument('--stats',
+            action='store_true',
+            help="Summarize the durations and throughput of previous runs of "
+            "the given targets (or all targets), instead of running them.")
         self.parser.usage = "%(prog)s [-nqdvpr] [--config file.yml] [--prefix "
-        "origin [destination] | --root ]\n            target [target ...] {{{cmd} args}}".format(cmd=self._cmd)
+        "origin [destination] | --root ]\n            target [target ...] {{{cmd} args}}\n"\
+        "       %(prog)s --stats [target ...]".format(cmd=self._cmd)
         
     @property
     def backup_config(self):
@@ -269,9 +1215,71 @@ class BackupEngine(CLIEngine):
         else:
             return self.config[self.cfgbase]
     
+    concurrency = None
+    """The default maximum number of targets run at once, which is no limit.
+    It can be set with ``concurrency`` in the configuration, or with ``--jobs``."""
+    
+    host_concurrency = None
+    """The default maximum number of targets run at once against each host. It
+    can be set with ``host_concurrency`` in the configuration."""
+    
+    retries = 0
+    """The default number of times a target is retried after failing with a
+    retryable rsync exit code. It can be set with ``retries`` in the 
+    configuration, for all targets or for each target."""
+    
+    backoff = 10.0
+    """The default delay (in seconds) before the first retry. The delay 
+    doubles with each further retry. It can be set with ``backoff``."""
+    
+    timeout = None
+    """The default time limit (in seconds) for each attempt at a target. It
+    can be set with ``timeout``. A target which runs out of time has used
+    its whole budget, so it is reported as timed out and is not retried."""
+    
+    idle_timeout = None
+    """The default time (in seconds) rsync may go without transferring data
+    before giving up, passed as ``--timeout``. It can be set with 
+    ``idle_timeout``. rsync exits with code 30 when it stalls for this long,
+    so a stalled target is retried like any other :attr:`retry_codes` 
+    failure."""
+    
+    retry_codes = None
+    """The rsync exit codes which are retried, if not the default of
+    :attr:`_BackupDestination.retry_codes`. It can be set with 
+    ``retry_codes``."""
+    
+    nice = None
+    """The default ``nice`` adjustment for rsync. It can be set with ``nice``."""
+    
+    ionice = None
+    """The default ``ionice`` class for rsync, e.g. ``idle`` or 
+    ``best-effort:7`` (class and level). It can be set with ``ionice``."""
+    
+    incremental = False
+    """Whether rsync targets are given only the paths which changed since
+    their last successful run (see :attr:`manifests`). Files changed or
+    removed directly in the destination are not repaired by such runs, so
+    this is off by default. It can be set with ``incremental``, for all 
+    targets or for each target."""
+    
+    bwlimit = None
+    """The bandwidth (in KiB/s) shared by all running rsync targets. It can be
+    set with ``bwlimit`` in the configuration."""
+    
+    bwlimit_restart = False
+    """Whether running rsync targets are restarted to use the bandwidth freed
+    when other targets finish. It can be set with ``bwlimit_restart``."""
+    
     def set_destination(self, argname, origin=None, destination=None,
-        delete=False, triggers=None):
-        """Set a backup route for rsync"""
+        delete=False, triggers=None, priority=0, after=None, command=None,
+        **policy):
+        """Set a backup route for rsync
+        
+        Keyword arguments ``retries``, ``backoff``, ``timeout``, 
+        ``idle_timeout``, ``retry_codes``, ``nice``, ``ionice`` and
+        ``incremental`` override this engine's defaults for the target.
+        """
         
         if argname in self._destinations:
             warn("Mode {mode} will be overwritten.".format(mode=argname),
@@ -287,13 +1295,17 @@ class BackupEngine(CLIEngine):
         # Set Properties
         self._destinations[argname] = _BackupDestination(
             name = argname,
-            command = self._cmd,
+            command = command or self._cmd,
             destination = destination,
             origin = origin,
             delete = delete,
             triggers = triggers,
             reverse = reverse,
-            reversedel = getattr(self.opts,'reversedel',False)
+            reversedel = getattr(self.opts,'reversedel',False),
+            priority = priority,
+            after = after if isinstance(after, list) else [],
+            manifest = self._manifest_path(argname),
+            **self._policy(**policy)
         )
         
         if self._destinations[argname].operable:
@@ -302,41 +1314,200 @@ class BackupEngine(CLIEngine):
         else:
             del self._destinations[argname]
         
+    def _policy(self, **policy):
+        """The retry, timeout and priority settings for a target, with this 
+        engine's defaults."""
+        for key in _POLICY:
+            if policy.get(key) is None:
+                policy[key] = getattr(self, key)
+        return policy
+        
+    manifests = None
+    """The directory where the :mod:`pyshell.sync` manifests of each target
+    are kept. It can be set with ``manifests`` in the configuration, and
+    defaults to ``manifests`` in the :meth:`_state_dir` of the configuration.
+    Targets using rsync with :attr:`incremental` set give it only the paths
+    which changed since their last run."""
+    
+    def _state_dir(self):
+        """The per-user directory for the state kept between runs of this
+        configuration (manifests and history), in pyshell's data directory (``$XDG_DATA_HOME/pyshell``,
+        usually ``~/.local/share/pyshell``). It is named for the configuration 
+        file which was loaded, by its real path, so it doesn't depend on the
+        working directory."""
+        filename = self.config.filename
+        if isinstance(filename, six.string_types) and os.path.isfile(filename):
+            path = os.path.realpath(filename)
+            digest = hashlib.md5(path.encode("utf-8") if isinstance(path, six.text_type) else path)
+            name = "{0}-{1}".format(os.path.splitext(os.path.basename(path))[0], digest.hexdigest()[:8])
+        else:
+            name = "default"
+        return os.path.join(_data_dir(), "backup", name)
+    
+    def _manifest_path(self, mode):
+        """The manifest file for a target."""
+        directory = self.manifests
+        if directory is None:
+            directory = os.path.join(self._state_dir(), "manifests")
+        return os.path.join(os.path.expanduser(directory), "{0}.json".format(mode))
+        
     def parse(self):
         """Parse the command line arguments"""
         super(BackupEngine, self).parse()
         
+        if getattr(self.opts, 'stats', False):
+            return
         if not self.opts.modes:
             self.parser.error("No backup routine selected. "\
-            "Must select at least one:\n+%s" % " +".join(self._origins.keys()))
+            "Must select at least one:\n+%s" % " +".join(self._destinations.keys()))
         for mode in self.opts.modes:
             if mode not in self._destinations:
                 self.parser.error("Target '{}' does not exist.".format(mode))
+        try:
+            self._plan = _backup_plan(self._destinations, self.opts.modes)
+        except ValueError as error:
+            self.parser.error(str(error))
         if self.opts.verbose:
             self._pargs += ['-v']
         if not self.opts.run:
             self._pargs += ['-n']
         
+        if getattr(self.opts, 'progress', False):
+            self._pargs += ['--info=progress2']
         if self.opts.args:
             self._pargs += self.opts.args
     
     def do(self):
         """Run all the given stored processes"""
-        for mode in self.opts.modes:
-            self._start_mode(mode)
-        for mode in self._destinations.keys():
-            self._end_mode(mode)
+        if getattr(self.opts, 'stats', False):
+            self._report_stats()
+            return
+        started = time.time()
+        summary = _History(self._history_path(), self.history_size).summary()
+        for mode, _ in self._plan:
+            if summary.get(mode, {}).get('p50') is not None:
+                self._destinations[mode].cost = summary[mode]['p50']
+        concurrency = getattr(self.opts, 'jobs', None)
+        if concurrency is None:
+            concurrency = self.concurrency
+        display = self._progress_display() if getattr(self.opts, 'progress', False) else None
+        self._scheduler = _BackupScheduler(self._start_mode, 
+            concurrency=concurrency, host_concurrency=self.host_concurrency,
+            tick=display.update if display is not None else None,
+            bwlimit=self.bwlimit, restart=self.bwlimit_restart)
+        for mode, after in self._plan:
+            destination = self._destinations[mode]
+            if display is not None:
+                destination.output = self._log_output
+            self._scheduler.add(destination, after=after)
+        try:
+            self._start_masters()
+            self._scheduler.run()
+        finally:
+            if display is not None:
+                display.finish()
+            self._stop_masters()
+        self._report_results()
+        self._record(started)
+        
+    @property
+    def results(self):
+        """The outcome of each planned target, as a list of dictionaries."""
+        results = []
+        for mode, _ in self._plan:
+            destination = self._destinations[mode]
+            if destination.pseudo:
+                continue
+            results.append(dict(target=mode, status=destination.status,
+                attempts=destination.attempts, returncode=destination.returncode,
+                elapsed=destination.progress.elapsed, 
+                transferred=destination.progress.transferred,
+                files=destination.progress.files))
+        return results
+        
+    history = None
+    """The file where a JSON report of each run is kept. It can be set with
+    ``history`` in the configuration, and defaults to ``history.jsonl`` in
+    the :meth:`_state_dir` of the configuration."""
+    
+    history_size = 100
+    """The number of runs kept in the :attr:`history`. It can be set with
+    ``history_size``."""
+    
+    def _history_path(self):
+        """The history file."""
+        if self.history is not None:
+            return os.path.expanduser(self.history)
+        return os.path.join(self._state_dir(), "history.jsonl")
+        
+    def _record(self, started):
+        """Add a report of this run to the history."""
+        results = self.results
+        if not results:
+            return
+        finished = time.time()
+        report = dict(started=started, finished=finished, elapsed=finished - started,
+            dry_run="-n" in self._pargs, targets=results)
+        try:
+            _History(self._history_path(), self.history_size).append(report)
+        except (IOError, OSError) as error:
+            warn("Couldn't record this run in '{0}': {1}".format(self._history_path(), error),
+                RuntimeWarning)
+        
+    def _report_stats(self):
+        """Print a summary of previous runs."""
+        summary = _History(self._history_path(), self.history_size).summary(self.opts.modes)
+        if not summary:
+            print("No runs recorded in '{0}'.".format(self._history_path()))
+            return
+        def seconds(value):
+            """Format a duration."""
+            return "-" if value is None else "{0:.1f}s".format(value)
+        print("{0:<18s} {1:>4s} {2:>9s} {3:>9s} {4:>12s} {5:<8s}".format(
+            "Target", "Runs", "p50", "p95", "Throughput", "Last"))
+        for mode in sorted(summary):
+            stats = summary[mode]
+            throughput = "-" if stats['throughput'] is None else _format_bytes(stats['throughput']) + "/s"
+            print("{0:<18s} {1:>4d} {2:>9s} {3:>9s} {4:>12s} {5:<8s}".format(mode, stats['runs'],
+                seconds(stats['p50']), seconds(stats['p95']), throughput, stats['last']))
+        
+    def _report_results(self):
+        """Print a table of the outcome of each target."""
+        results = self.results
+        if not results:
+            return
+        print("{0:<18s} {1:<8s} {2:>8s} {3:>4s} {4:>9s} {5:>11s}".format(
+            "Target", "Status", "Attempts", "Exit", "Time", "Transferred"))
+        for result in results:
+            print("{target:<18s} {status:<8s} {attempts:>8d} {code:>4s} {elapsed:>8.1f}s {size:>11s}".format(
+                code="-" if result["returncode"] is None else str(result["returncode"]),
+                size=_format_bytes(result["transferred"]), **result))
+            log.info("Backup '%(target)s' %(status)s after %(attempts)d attempt(s).", result)
+                
+    def _progress_display(self):
+        """Make a display of the progress of each target, redrawn in place."""
+        try:
+            from .console.pbar import MultiLineProgressBar
+        except ImportError:
+            warn("Install 'progressbar' to display backup progress.", UserWarning)
+            return None
+        def lines():
+            """Lines of progress for started targets."""
+            return [ self._destinations[mode].progress.line(mode) for mode, _ in self._plan 
+                if self._destinations[mode].progress.started is not None ]
+        return MultiLineProgressBar(lines, fd=sys.stdout).start()
+        
+    def _log_output(self, destination, line):
+        """Log a line of output, so it doesn't disturb the progress display."""
+        log.debug("[%s] %s", destination.name, line)
             
-    def _start_mode(self,mode):
-        """Start a single mode"""
-        if self._destinations[mode].launch(self._pargs,prints=self.opts.prints):
-            for trigger in self._destinations[mode].triggers:
-                self._start_mode(trigger)
-    
-    def _end_mode(self, mode):
-        """Wait for a particular process to end."""
-        if self._destinations[mode].running:
-            self._destinations[mode].wait()
+    def _start_mode(self, destination):
+        """Start a single mode, reconnecting its shared SSH connection if it
+        has closed."""
+        for master in self._masters:
+            if destination.rsh is not None and destination.rsh == master.rsh:
+                master.restart()
+        return destination.launch(self._pargs,prints=self.opts.prints)
         
     def _kill_mode(self, mode):
         """Kill a particular subprocess"""
@@ -347,6 +1518,50 @@ class BackupEngine(CLIEngine):
         """Kill all mode procedures"""
         for mode in self._destinations.keys():
             self._kill_mode(mode)
+        self._stop_masters()
+        
+    def final(self):
+        """Close shared SSH connections."""
+        super(BackupEngine, self).final()
+        self._stop_masters()
+        
+    ssh = "ssh"
+    """The ssh command used for shared connections. It can be set with ``ssh``
+    in the configuration."""
+    
+    ssh_master = True
+    """Whether rsync targets copying to or from the same remote host share a
+    single SSH connection. It can be set with ``ssh_master``."""
+    
+    def _start_masters(self):
+        """Start a shared SSH connection for each remote host used by the 
+        planned rsync targets."""
+        if not self.ssh_master:
+            return
+        targets = {}
+        for mode, _ in self._plan:
+            destination = self._destinations[mode]
+            if destination.command != NATIVE and destination.ssh_target is not None:
+                targets.setdefault(destination.ssh_target, []).append(destination)
+        if not targets:
+            return
+        self._ssh_directory = tempfile.mkdtemp(prefix="backup-ssh-")
+        for target, destinations in sorted(targets.items()):
+            master = _SSHMaster(target, self._ssh_directory, ssh=self.ssh)
+            self._masters.append(master)
+            if master.start():
+                log.debug("Sharing a connection to %s with %d target(s).", target, len(destinations))
+                for destination in destinations:
+                    destination.rsh = master.rsh
+        
+    def _stop_masters(self):
+        """Close the shared SSH connections."""
+        masters, self._masters = self._masters, []
+        for master in masters:
+            master.stop()
+        directory, self._ssh_directory = self._ssh_directory, None
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
     
     def configure(self):
         """Configure the simulator"""
@@ -364,8 +1579,17 @@ class BackupEngine(CLIEngine):
         self._help += [ '','', 'Configured from \'%s\'' % self.opts.config,
             '', 'targets:' ]
         
-        dest_prefix = self.backup_config.pop('destination',"")
-        orig_prefix = self.backup_config.pop('origin',"")
+        settings = {}
+        for key in ('destination', 'origin') + _SETTINGS:
+            if isinstance(self.backup_config.get(key), collections_abc.Mapping):
+                warn("Target '{0}' is named for a setting, which is deprecated. "\
+                    "Please rename that target.".format(key), UserWarning)
+            elif key in self.backup_config:
+                settings[key] = self.backup_config.pop(key)
+        dest_prefix = settings.get('destination',"")
+        orig_prefix = settings.get('origin',"")
+        for key in _SETTINGS:
+            setattr(self, key, settings.get(key, getattr(self, key)))
         
         for mode, mcfg in self.backup_config.items():
             if "destination" in mcfg or "origin" in mcfg:
@@ -375,7 +1599,11 @@ class BackupEngine(CLIEngine):
                 destination = None
                 origin = None
             self.set_destination(argname = mode, origin = origin,
-                destination = destination, delete = mcfg.pop('delete',False), triggers=mcfg.pop("triggers",None))
+                destination = destination, delete = mcfg.pop('delete',False), triggers=mcfg.pop("triggers",None),
+                priority = mcfg.pop('priority', 0), after = mcfg.pop('after', None),
+                command = mcfg.pop('command', None),
+                **dict((key, mcfg.pop(key)) for key in list(mcfg.keys()) 
+                    if key in _POLICY))
         
         self.parser.add_argument('-n', '--dry-run', action='store_false',
             dest='run', help="Print what would be copied, but don't copy")
@@ -385,11 +1613,11 @@ class BackupEngine(CLIEngine):
             dest='delete', help="Delete duplicated files")
         self.parser.add_argument('-v', '--print', action='store_true',
             dest='prints', help="Print {cmd} commands".format(cmd=self._cmd))
-        self.parser.add_argument('--version', action='version',
-            version="%(prog)s version {version}\n{cmd_version}".format(
-                version=version, cmd_version=self._cmd_version))
-        self.parser.add_argument('modes', metavar='target', nargs="+", 
-            choices=list(self._destinations.keys()) ,default=[], help="The %(prog)s target's name.")
+        self.parser.add_argument('--version', action=_bind_engine(_VersionAction, self))
+        # Targets are optional with --stats, and are checked in parse(), 
+        # since argparse rejects an empty list when given choices.
+        self.parser.add_argument('modes', metavar='target', nargs="*", 
+            default=[], help="The %(prog)s target's name.")
         self.parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
         self.parser.epilog += "\n".join(self._help)
         
@@ -77,6 +77,11 @@ class CLIEngine(object):
     :func:`~pkg_resources.resource_filename`. To specify a super-configuration 
     in the current directory, use ``__main__`` as the module name."""
     
+    envprefix = None
+    """The prefix for environment variables which should be loaded into the 
+    configuration, after configuration files, e.g. ``"MYAPP"``. See 
+    :meth:`~pyshell.config.Configuration.load_environ`."""
+    
     def __init__(self, prefix_chars=str("-"), 
         conflict_handler='error'):
         super(CLIEngine, self).__init__()
@@ -169,6 +174,7 @@ class CLIEngine(object):
             2. The command line specified file from the user's home folder 
             ``~/config.yml``
             3. The command line specified file from the working directory.
+            4. Environment variables prefixed with :attr:`envprefix`.
         
         If the third file is not found, and the user specified a new name for 
         the configuration file, then the user is warned that no configuration 
@@ -179,7 +185,8 @@ class CLIEngine(object):
         """
         cfg = getattr(self.opts, 'config', self.defaultcfg)
         self.config.configure(module=self.__module__,
-            defaultcfg=self.defaultcfg, cfg=cfg,supercfg=self.supercfg)
+            defaultcfg=self.defaultcfg, cfg=cfg,supercfg=self.supercfg,
+            environ=self.envprefix)
         self.config.parse_literals(*getattr(self.opts, 'configure', []))
         
     def after_configure(self):
@@ -50,6 +50,13 @@ Structured Configurations: :class:`StructuredConfiguration`
     :members:
     :inherited-members:
 
+Frozen Configurations: :class:`FrozenConfiguration`
+---------------------------------------------------
+
+.. autoclass::
+    pyshell.config.FrozenConfiguration
+    :members:
+
 Argparse Action for Configurations: :class:`ConfigureAction`
 ------------------------------------------------------------
 
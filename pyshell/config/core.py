@@ -14,6 +14,10 @@ from __future__ import (absolute_import, unicode_literals, division,
 # Standard Python Modules
 import os
 import collections
+try:
+    import collections.abc as collections_abc
+except ImportError:
+    collections_abc = collections
 import abc
 import re
 import yaml
@@ -23,6 +27,7 @@ from warnings import warn
 import ast
 import six
 import argparse
+from multiprocessing.pool import ThreadPool
 
 # Submodules from this system
 from .. import util
@@ -32,7 +37,8 @@ from ..yaml import PyshellLoader, PyshellDumper
 #pylint: disable=R0904
 
 __all__ = ['ConfigurationError',
-    'Configuration', 'DottedConfiguration', 'StructuredConfiguration']
+    'Configuration', 'DottedConfiguration', 'StructuredConfiguration',
+    'FrozenConfiguration', 'Provenance']
 
 
 class ConfigurationError(Exception):
@@ -61,6 +67,15 @@ class DeepNestDict(collections.OrderedDict):
                     p.pretty(value)
                 p.breakable(" ")
 
+class Provenance(collections.namedtuple("Provenance", ["key", "source", "line"])):
+    """The origin of a configuration value, see :meth:`Configuration.explain`."""
+    __slots__ = ()
+    
+    def __str__(self):
+        """Source and line, like ``file.yml:12``"""
+        if self.line is None:
+            return "{0}: {1}".format(self.key, self.source)
+        return "{0}: {1}:{2:d}".format(self.key, self.source, self.line)
 
 class Configuration(MutableMappingBase):
     """Adds extra methods to dictionary for configuration"""
@@ -69,6 +84,9 @@ class Configuration(MutableMappingBase):
         self._filename = None
         self._strict = False
         self._dn = self.__class__
+        self._provenance = None
+        self._provenance_below = None
+        self._sources = None
     
     _strict = False
     """Whether to use strict lookup controls.""" #pylint: disable=W0105
@@ -90,9 +108,9 @@ class Configuration(MutableMappingBase):
     @dn.setter
     def dn(self, new_type):
         """Deep nesting type setter.""" #pylint: disable=C0103
-        if not issubclass(new_type, collections.MutableMapping):
+        if not issubclass(new_type, collections_abc.MutableMapping):
             raise TypeError("Deep nesting type must be an instance of {:s}, got {:s}".format(
-                collections.MutableMapping, new_type
+                collections_abc.MutableMapping, new_type
             ))
         self._dn = new_type
     
@@ -127,7 +145,7 @@ class Configuration(MutableMappingBase):
     def __getitem__(self, key):
         """Dictionary getter"""
         rval = self._store.__getitem__(key)
-        if isinstance(rval, collections.MutableMapping):
+        if isinstance(rval, collections_abc.MutableMapping):
             return self.dn(rval)
         else:
             return rval
@@ -146,6 +164,20 @@ class Configuration(MutableMappingBase):
                     p.pretty(value)
                 p.breakable(" ")
     
+    def __setitem__(self, key, value):
+        """Dictonary setter"""
+        self._set(key, value, "set")
+        
+    def _set(self, key, value, source):
+        """Set a value, recording ``source`` as its provenance."""
+        self._store.__setitem__(key, value)
+        self._track(value, source, key)
+        
+    def __delitem__(self, key):
+        """Dictionary delete"""
+        self._store.__delitem__(key)
+        self._forget(key)
+        
     def update(self, other, deep=True): #pylint: disable=W0221
         """Update the dictionary using :meth:`merge`.
         
@@ -155,14 +187,20 @@ class Configuration(MutableMappingBase):
         
         """
         if deep:
-            self.merge(other)
+            self.merge(other, source="set")
         else:
+            if isinstance(other, MutableMappingBase):
+                other = other.store
             self._store.update(other)
+            for key, value in six.iteritems(dict(other)):
+                self._track(value, "set", key)
     
-    def merge(self, other):
+    def merge(self, other, source=None):
         """Merge another configuration into this one (the master).
         
         :param dict-like other: The other dictionary to be merged.
+        :param source: A description of where ``other`` came from, recorded
+            when tracking provenance (see :meth:`track_provenance`).
         
         See :func:`deepmerge`.
         
@@ -177,6 +215,7 @@ class Configuration(MutableMappingBase):
         if isinstance(other, MutableMappingBase):
             other = other.store
         self._store = deepmerge(self.store, other, self.dt)
+        self._track(other, source)
         
     def imerge(self, other):
         """Inverse :meth:`merge`, where ``other`` will be considered original, and this object will be canonical.
@@ -198,6 +237,118 @@ class Configuration(MutableMappingBase):
         self._store = deepmerge(self.store, other, self.dt, invert=True)
         
     
+    def track_provenance(self, enabled=True):
+        """Start (or stop) recording where each value came from.
+        
+        When enabled, :meth:`merge` and :meth:`load` record the source (and
+        for YAML files, the line) of each value they set, in a side-table
+        keyed by flattened path. Values set directly or with :meth:`update`
+        are recorded as ``"set"``, and values from :meth:`parse_literals` as
+        ``"command line"``. Replacing a value discards the provenance of
+        anything which was nested below it. Source strings are shared between entries.
+        Use :meth:`explain` to look up a value. Disabling tracking discards
+        the recorded provenance.
+        """
+        if enabled and self._provenance is None:
+            self._provenance = {}
+            self._provenance_below = {}
+            self._sources = {}
+        elif not enabled:
+            self._provenance = None
+            self._provenance_below = None
+            self._sources = None
+        
+    @property
+    def _provenance_separator(self):
+        """Separator for flattened provenance keys."""
+        return getattr(self, 'separator', '.')
+        
+    def _track(self, value, source, key=None):
+        """Record ``source`` as the provenance of ``value``, which was set
+        at ``key`` (or merged at the root when ``key`` is ``None``)."""
+        if self._provenance is None:
+            return
+        source = self._sources.setdefault(source, source)
+        if isinstance(value, collections_abc.Mapping) and (len(value) or key is None):
+            paths = _leaf_paths(value, self._provenance_separator, key or "")
+        else:
+            paths = [key]
+        self._record(dict((path, (source, None)) for path in paths))
+        
+    def _provenance_parents(self, path):
+        """The flattened paths above a flattened path."""
+        separator = self._provenance_separator
+        parts = path.split(separator)
+        return [ separator.join(parts[:i]) for i in range(1, len(parts)) ]
+        
+    def _record(self, entries):
+        """Record provenance entries keyed by flattened path, discarding the
+        entries for the values they replace: those above or below each path.
+        
+        The recorded paths below each path are indexed, so recording an entry
+        only looks at its own parents and the entries it replaces."""
+        for path, entry in six.iteritems(entries):
+            parents = self._provenance_parents(path)
+            for parent in parents:
+                self._discard(parent)
+            for child in list(self._provenance_below.get(path, ())):
+                self._discard(child)
+            if path not in self._provenance:
+                for parent in parents:
+                    self._provenance_below.setdefault(parent, set()).add(path)
+            self._provenance[path] = entry
+            
+    def _discard(self, path):
+        """Discard the provenance entry of a single flattened path."""
+        if path not in self._provenance:
+            return
+        del self._provenance[path]
+        for parent in self._provenance_parents(path):
+            below = self._provenance_below.get(parent)
+            if below is not None:
+                below.discard(path)
+                if not below:
+                    del self._provenance_below[parent]
+        
+    def _forget(self, key):
+        """Discard the provenance of a deleted key and everything below it."""
+        if self._provenance is None:
+            return
+        for path in [key] + list(self._provenance_below.get(key, ())):
+            self._discard(path)
+        
+    def explain(self, key):
+        """Explain where a configuration value came from.
+        
+        :param key: The flattened key, e.g. ``"a.b.c"``.
+        :returns: A :class:`Provenance` tuple, ``(key, source, line)``. 
+            ``line`` is ``None`` when the value was not loaded from a YAML file.
+        :raises: :exc:`KeyError` if no provenance was recorded for ``key``.
+        
+        If ``key`` was set as part of a larger value (e.g. a list), the 
+        provenance of the nearest recorded parent is returned.
+        """
+        if self._provenance is None:
+            raise ValueError("Provenance is not being tracked. Use {0}.track_provenance()".format(
+                self.__class__.__name__))
+        separator = self._provenance_separator
+        parts = key.split(separator)
+        for i in range(len(parts), 0, -1):
+            path = separator.join(parts[:i])
+            if path in self._provenance:
+                return Provenance(path, *self._provenance[path])
+        raise KeyError('%s' % key)
+        
+    def provenance(self, prefix=None):
+        """Return the recorded :class:`Provenance` for every value below ``prefix``,
+        as a dictionary keyed by flattened path."""
+        if self._provenance is None:
+            raise ValueError("Provenance is not being tracked. Use {0}.track_provenance()".format(
+                self.__class__.__name__))
+        head = None if prefix is None else prefix + self._provenance_separator
+        return dict((path, Provenance(path, *entry)) for path, entry in 
+            six.iteritems(self._provenance) if head is None or path == prefix or path.startswith(head))
+        
     def save(self, filename, silent=True):
         """Save this configuration as a YAML file. YAML files generally have 
         the ``.yaml`` or ``.yml`` extension. If the filename ends in 
@@ -228,7 +379,7 @@ class Configuration(MutableMappingBase):
                         "(.dat,.yaml,.yml): %s" % filename)
             self._filename = filename
         
-    def load(self, filename, silent=True, fname=None):
+    def load(self, filename, silent=True, fname=None, documents=None):
         """Loads a configuration from a yaml file, and merges it into 
         the master configuration.
         
@@ -237,13 +388,25 @@ class Configuration(MutableMappingBase):
             non-existant configuration file. If this is the case, the failure 
             to find a configuration file will be logged, will not raise an 
             error.
+        :param list documents: The YAML documents already parsed from 
+            ``filename``. If provided, ``filename`` will not be read.
         :raises: :exc:`IOError` if the file can't be found.
         :returns: boolean, whether the file was loaded.
         """
         loaded = False
         isstream = False
+        lines = {}
         try:
-            if hasattr(filename, 'read') and hasattr(filename, 'readlines'):
+            if documents is not None:
+                new = list(documents)
+            elif self._provenance is not None:
+                isstream = hasattr(filename, 'read') and hasattr(filename, 'readlines')
+                if isstream:
+                    new, lines = self._load_with_lines(filename)
+                else:
+                    with open(filename, "r") as stream:
+                        new, lines = self._load_with_lines(stream)
+            elif hasattr(filename, 'read') and hasattr(filename, 'readlines'):
                 new = list(yaml.load_all(filename, Loader=self._loader))
                 isstream = True
             else:
@@ -256,7 +419,14 @@ class Configuration(MutableMappingBase):
             else:
                 raise
         else:
-            if len(new) != 0:
+            if self._provenance is not None and len(new) != 0:
+                source = fname or getattr(filename, 'name', None) or (
+                    "<stream>" if isstream else filename)
+                self.merge(new[-1], source=source)
+                source = self._sources[source]
+                self._record(dict((path, (source, line)) 
+                    for path, line in six.iteritems(lines)))
+            elif len(new) != 0:
                 self.merge(new[-1])
             if isstream and fname is not None:
                 self._filename = fname
@@ -267,6 +437,23 @@ class Configuration(MutableMappingBase):
             self._load_yaml_callback(*new[:-1])
             loaded = bool(len(new))
         return loaded
+        
+    def _load_with_lines(self, stream):
+        """Load YAML documents from a stream, along with the line numbers
+        of the values in the last document, keyed by flattened path."""
+        loader = self._loader(stream)
+        documents, lines = [], {}
+        try:
+            while loader.check_node():
+                node = loader.get_node()
+                documents.append(loader.construct_document(node))
+                lines = {}
+                if isinstance(node, yaml.MappingNode):
+                    _node_lines(node, "", self._provenance_separator, lines)
+        finally:
+            if hasattr(loader, 'dispose'):
+                loader.dispose()
+        return documents, lines
     
     def _load_yaml_callback(self,*documents):
         """Called with the extra documents that were loaded from the yaml file."""
@@ -295,12 +482,27 @@ class Configuration(MutableMappingBase):
         
         This method does not return anything.
         """
-        if deep_store_type is not None and issubclass(deep_store_type, collections.Mapping):
+        if deep_store_type is not None and issubclass(deep_store_type, collections_abc.Mapping):
             self._dt = deep_store_type #pylint: disable=C0103
         elif deep_store_type is not None:
             raise TypeError("%r is not a mapping type." % deep_store_type)
         self._store = reformat(self._store, self.dt)
-        
+
+    def freeze(self):
+        """Return an immutable, hashable copy of this configuration.
+
+        See :class:`FrozenConfiguration`.
+
+        .. doctest::
+
+            >>> a = Configuration(**{'a':{'b':'c'}})
+            >>> frozen = a.freeze()
+            >>> frozen == {'a':{'b':'c'}}
+            True
+
+        """
+        return FrozenConfiguration(self._store)
+
     def parse_literals(self, *literals, **kwargs):
         """Turn a list of literals into configuration items.
         
@@ -316,23 +518,30 @@ class Configuration(MutableMappingBase):
         get parsed to  ``self["foo.bat"] = "bar"``.  This is useful for 
         parsing configuration command line options.
         
+        :keyword source: The provenance recorded for these values, defaults
+            to ``"command line"``.
+        
         """
+        sep = kwargs.pop('sep', "=")
+        source = kwargs.pop('source', "command line")
         for item in literals:    
-            parts = item.split(kwargs.pop('sep', "="), 1)
+            parts = item.split(sep, 1)
             if len(parts) != 2:
                 raise ValueError("Invalid literal: %s" % item)
             else:
                 key, value = parts
             try:
-                self[key] = ast.literal_eval(value)
+                value = ast.literal_eval(value)
             except (ValueError, SyntaxError):
-                self[key] = value
+                pass
+            self._set(key, value, source)
         
-    def load_resource(self, module, filename, silent=True):
+    def load_resource(self, module, filename, silent=True, documents=None):
         """Load from a resource filename"""
-        from pkg_resources import resource_stream
+        if documents is not None:
+            return self.load(filename, fname=filename, silent=silent, documents=documents)
         try:
-            with resource_stream(module, filename) as stream:
+            with util.resource_stream(module, filename) as stream:
                 self.load(stream, fname=filename, silent=silent)
         except IOError:
             if silent:
@@ -342,9 +551,92 @@ class Configuration(MutableMappingBase):
             else:
                 raise
         
+    
+    load_workers = 4
+    """The maximum number of threads used by :meth:`configure` and 
+    :meth:`make` to read and parse configuration files concurrently."""
+    
+    @classmethod
+    def _read(cls, source):
+        """Read and parse the YAML documents from a filename, or from a
+        ``(module, filename)`` resource pair."""
+        if isinstance(source, tuple):
+            with util.resource_stream(*source) as stream:
+                return list(yaml.load_all(stream, Loader=cls._loader))
+        with open(source, "r") as stream:
+            return list(yaml.load_all(stream, Loader=cls._loader))
+        
+    @classmethod
+    def _prefetch(cls, sources):
+        """Read and parse many sources concurrently.
+        
+        :param sources: Filenames or ``(module, filename)`` resource pairs.
+        :returns: A dictionary mapping each source which could be read to its
+            parsed YAML documents.
+        
+        Sources which fail to read or parse are left out, so that loading them
+        again serially reproduces the usual warnings and errors.
+        """
+        def read(source):
+            """Read a single source, ignoring errors."""
+            #pylint: disable=W0703
+            try:
+                return source, cls._read(source)
+            except Exception:
+                return source, None
+        sources = list(collections.OrderedDict.fromkeys(sources))
+        if len(sources) > 1 and cls.load_workers > 1:
+            pool = ThreadPool(min(cls.load_workers, len(sources)))
+            try:
+                results = pool.map(read, sources)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [ read(source) for source in sources ]
+        return dict((source, documents) for source, documents in results 
+            if documents is not None)
+        
+    def load_environ(self, prefix, separator="__", environ=None):
+        """Load configuration values from environment variables.
+        
+        :param string prefix: The prefix for environment variables to load.
+        :param string separator: The separator between nesting levels in 
+            variable names.
+        :param environ: The environment mapping, defaults to :data:`os.environ`.
+        :returns: boolean, whether any variables were loaded.
+        
+        Variables named like ``MYAPP__LOGGING__ROOT__LEVEL=INFO`` become 
+        ``self["logging"]["root"]["level"] = "INFO"``. Names are matched to 
+        existing keys without regard to case, and new keys are lower case. 
+        Values are coerced to booleans, ``None``, integers and floats where 
+        possible, otherwise they are kept as strings. All values are applied 
+        in a single :meth:`merge`.
+        
+        The environment is scanned once per call. Parsed values are cached, 
+        and reused while the matching variables remain unchanged. A variable
+        which conflicts with a nested one (``MYAPP__A`` and ``MYAPP__A__B``)
+        is ignored with a warning.
+        """
+        if environ is None:
+            environ = os.environ
+        overlay = self.dt()
+        index = {}
+        for parts, value in _parse_environ(prefix, separator, environ):
+            store, node = self._store, overlay
+            for part in parts[:-1]:
+                key = _match_key(store, part, index)
+                store = store.get(key) if isinstance(store, collections_abc.Mapping) else None
+                if not isinstance(node.get(key), collections_abc.Mapping):
+                    node[key] = self.dt()
+                node = node[key]
+            node[_match_key(store, parts[-1], index)] = value
+        if len(overlay):
+            self.merge(overlay, source="environment ({0}{1}*)".format(prefix, separator))
+        return bool(len(overlay))
         
     def configure(self, module=__name__, defaultcfg=False,
-        cfg=False, supercfg=None):
+        cfg=False, supercfg=None, environ=None):
         """The configuration loads (starting with a blank configuration):
         
             1. The list of ``supercfg`` 's. This list should contain tuples 
@@ -352,6 +644,8 @@ class Configuration(MutableMappingBase):
             2. The ``module`` configuration file named for ``defaultcfg``
             3. The ``cfg`` file from the user's home folder ``~/config.yml``
             4. The ``cfg`` file from the working directory.
+            5. Environment variables starting with ``environ``, if it is set. 
+               See :meth:`load_environ`.
         
         If the fourth file is not found, and the user specified a new name 
         for the configuration file (i.e. ``cfg != defaultcfg``), then the 
@@ -367,49 +661,68 @@ class Configuration(MutableMappingBase):
             file which might exist in the module's file.
         :param list supercfg: A list of configuration files to preload. The 
             list should contian pairs of ``(module,name)`` as tuples.
+        :param string environ: The prefix for environment variables to load.
+        
+        The files are read and parsed concurrently (see :attr:`load_workers`),
+        and then merged in the order above.
         
         """
         if not defaultcfg:
             return
         if supercfg is None:
             supercfg = []
+        sources = [ superfilename if supermodule is None else (supermodule, superfilename)
+            for supermodule, superfilename in supercfg ]
+        sources.append((module, defaultcfg))
+        usercfg = os.path.expanduser("~/%s" % cfg) if cfg else None
+        if cfg and util.check_exists("~/%s" % cfg):
+            sources.append(usercfg)
+        if cfg and os.path.exists(cfg):
+            sources.append(cfg)
+        if self._provenance is None:
+            prefetched = self._prefetch(sources)
+        else:
+            # Prefetched documents don't carry line numbers.
+            prefetched = {}
+        
         for supermodule, superfilename in supercfg:
             if supermodule is None:
-                self.load(superfilename)
+                self.load(superfilename, documents=prefetched.get(superfilename))
             else:
-                self.load_resource(supermodule,superfilename)
-        self.load_resource(module, defaultcfg)
-        if cfg and util.check_exists("~/%s" % cfg):
-            self.load(os.path.expanduser("~/%s" % cfg))
+                self.load_resource(supermodule,superfilename,
+                    documents=prefetched.get((supermodule, superfilename)))
+        self.load_resource(module, defaultcfg, documents=prefetched.get((module, defaultcfg)))
+        if cfg and usercfg in sources:
+            self.load(usercfg, documents=prefetched.get(usercfg))
         if cfg and os.path.exists(cfg):
-            self.load(cfg, silent=False)
+            self.load(cfg, silent=False, documents=prefetched.get(cfg))
         elif cfg and cfg != defaultcfg:
             warn("Configuration File '{}'"
                 " not found!".format(cfg), RuntimeWarning)
-        
-        
+        if environ:
+            self.load_environ(environ)
         
     @classmethod
     def create(cls, module=__name__, defaultcfg=False,
-        cfg=False, supercfg=None):
+        cfg=False, supercfg=None, environ=None):
         """Create a configuration from a series of YAML files.
         
         See :meth:`configure` for a detailed description of the 
         resolution order of configuration files for this method.
         """
         config = cls()
-        config.configure(module, defaultcfg, cfg, supercfg)
+        config.configure(module, defaultcfg, cfg, supercfg, environ)
         return config
         
     @classmethod
-    def fromfile(cls, filename):
+    def fromfile(cls, filename, documents=None):
         """Create a configuration from a single YAML file."""
         config = cls()
-        config.load(filename, silent=False)
+        config.load(filename, silent=False, documents=documents)
         return config
         
     @classmethod
-    def fromresource(cls, module, filename):
+    def fromresource(cls, module, filename, documents=None):
         """Create a configuration from a resource filename pair.
         
         :param module: The module containing the file.
@@ -417,7 +730,7 @@ class Configuration(MutableMappingBase):
         
         """
         config = cls()
-        config.load_resource(module, filename)
+        config.load_resource(module, filename, documents=documents)
         return config
         
     @classmethod
@@ -428,25 +741,37 @@ class Configuration(MutableMappingBase):
         
         - None
         - An instance of this class.
+        - A :class:`FrozenConfiguration`, which will be thawed.
         - Any insatance of :class:`collections.Mapping`
         - A string filename for :meth:`fromfile`
         - A tuple of argumments to :meth:`fromresource`
         - A sequence of arguments to this method, which can be recursively added to this configuration.
         
+        Files and resources in a sequence are read and parsed concurrently, 
+        and then merged in order.
+        
         """
         if base is None:
             return cls()
         elif isinstance(base,cls):
             return base
-        elif isinstance(base,collections.Mapping):
+        elif isinstance(base,FrozenConfiguration):
+            return base.thaw(cls)
+        elif isinstance(base,collections_abc.Mapping):
             return cls(base)        
         elif isinstance(base,tuple) and len(base) == 2:
             return cls.fromresource(*base)
         elif isinstance(base,six.string_types):
             return cls.fromfile(base)
-        elif isinstance(base,collections.Sequence):
+        elif isinstance(base,collections_abc.Sequence):
             config = cls()
+            prefetched = cls._prefetch([ item for item in base if _is_source(item) ])
             for item in base:
+                if _is_source(item) and item in prefetched:
+                    if isinstance(item, tuple):
+                        item = cls.fromresource(*item, documents=prefetched[item])
+                    else:
+                        item = cls.fromfile(item, documents=prefetched[item])
                 config.merge(cls.make(item))
             return config
         else:
@@ -455,6 +780,250 @@ class Configuration(MutableMappingBase):
             ))
 
 
+def _leaf_paths(d, separator, stump=""):
+    """Iterate over the flattened paths to the leaves of a nested mapping."""
+    for key, value in six.iteritems(d):
+        path = separator.join((stump, six.text_type(key))) if stump else six.text_type(key)
+        if isinstance(value, collections_abc.Mapping) and len(value):
+            for leaf in _leaf_paths(value, separator, path):
+                yield leaf
+        else:
+            yield path
+            
+def _node_lines(node, stump, separator, lines):
+    """Record the (1-based) line of each leaf in a composed YAML mapping node."""
+    for key_node, value_node in node.value:
+        if not isinstance(key_node, yaml.ScalarNode):
+            continue
+        path = separator.join((stump, key_node.value)) if stump else key_node.value
+        if isinstance(value_node, yaml.MappingNode) and len(value_node.value):
+            _node_lines(value_node, path, separator, lines)
+        else:
+            lines[path] = value_node.start_mark.line + 1
+
+_ENVIRON_CONSTANTS = {
+    "true" : True, "yes" : True, "on" : True,
+    "false" : False, "no" : False, "off" : False,
+    "null" : None, "none" : None, "~" : None,
+}
+
+def _coerce_environ(value):
+    """Cheap typed coercion for an environment variable value."""
+    try:
+        return _ENVIRON_CONSTANTS[value.lower()]
+    except KeyError:
+        pass
+    if value and value[0] in "+-.0123456789":
+        for ttype in (int, float):
+            try:
+                return ttype(value)
+            except ValueError:
+                pass
+    return value
+
+_environ_cache = {}
+
+def _parse_environ(prefix, separator, environ):
+    """Scan the environment for prefixed variables, returning a list of 
+    ``(parts, value)`` pairs, where ``parts`` is the tuple of key levels.
+    
+    The result is cached against an unordered fingerprint of the matching
+    variables, so only a change to one of them causes them to be sorted and
+    parsed again. A variable which is also used as the parent of another
+    (``PREFIX__A`` and ``PREFIX__A__B``) is ignored with a warning, which is
+    repeated whenever the cached result is reused."""
+    head = prefix + separator
+    fingerprint = frozenset((name, value) for name, value in environ.items() 
+        if name.startswith(head))
+    cached = _environ_cache.get((prefix, separator))
+    if cached is None or cached[0] != fingerprint:
+        parsed = []
+        for name, value in sorted(fingerprint):
+            parts = tuple(part for part in name[len(head):].split(separator) if part)
+            if parts:
+                parsed.append((parts, _coerce_environ(value)))
+        parents = set(tuple(part.lower() for part in parts[:i]) 
+            for parts, value in parsed for i in range(1, len(parts)))
+        ignored = [ (parts, value) for parts, value in parsed 
+            if tuple(part.lower() for part in parts) in parents ]
+        for item in ignored:
+            parsed.remove(item)
+        cached = _environ_cache[(prefix, separator)] = (fingerprint, parsed, ignored)
+    fingerprint, parsed, ignored = cached
+    for parts, value in ignored:
+        warn("Environment variable {0}{1} is ignored, because it is also "
+            "used as a parent of other variables.".format(head, separator.join(parts)))
+    return parsed
+
+def _match_key(store, part, index):
+    """Find the key in ``store`` which matches ``part`` without regard to case.
+    
+    ``index`` caches lower-case key lookups by store."""
+    if not isinstance(store, collections_abc.Mapping):
+        return part.lower()
+    if part in store:
+        return part
+    try:
+        keys = index[id(store)]
+    except KeyError:
+        keys = index[id(store)] = dict((key.lower(), key) for key in store 
+            if isinstance(key, six.string_types))
+    return keys.get(part.lower(), part.lower())
+
+def _is_source(item):
+    """Whether an item passed to :meth:`Configuration.make` is a file or a resource."""
+    return isinstance(item, six.string_types) or (isinstance(item, tuple) and 
+        len(item) == 2 and all(isinstance(part, six.string_types) for part in item))
+
+def _freeze(value, separator=None):
+    """Recursively convert a value into an immutable equivalent."""
+    if isinstance(value, FrozenConfiguration):
+        return value
+    elif isinstance(value, collections_abc.Mapping):
+        return FrozenConfiguration(value, separator=separator)
+    elif isinstance(value, (collections_abc.Set, set)):
+        return frozenset(_freeze(item, separator) for item in value)
+    elif (isinstance(value, collections_abc.Sequence)
+        and not isinstance(value, six.string_types + (six.binary_type,))):
+        return tuple(_freeze(item, separator) for item in value)
+    return value
+
+def _thaw(value, dt=dict):
+    """Recursively convert a frozen value into a mutable equivalent."""
+    if isinstance(value, FrozenConfiguration):
+        return dt((key, _thaw(item, dt)) for key, item in six.iteritems(value._store))
+    elif isinstance(value, frozenset):
+        return set(_thaw(item, dt) for item in value)
+    elif isinstance(value, tuple):
+        return [ _thaw(item, dt) for item in value ]
+    return value
+
+class FrozenConfiguration(collections_abc.Mapping):
+    """An immutable, hashable configuration.
+
+    Frozen configurations are usually created with :meth:`Configuration.freeze`.
+    Nested mappings are frozen once, at construction, so that accessing a
+    subtree returns the stored :class:`FrozenConfiguration` directly, without
+    copying or re-wrapping. Sequences become tuples and sets become frozensets.
+
+    The hash is computed on first use and then cached, so frozen configurations
+    (and their subtrees) are cheap to use as memoization keys::
+
+        >>> frozen = DottedConfiguration({"a":{"b":{"c":1}}}).freeze()
+        >>> frozen["a.b"] is frozen["a"]["b"]
+        True
+        >>> cache = { frozen["a"] : "expensive" }
+
+    Equality is structural, and order-insensitive.
+
+    :param mapping: The mapping to freeze.
+    :param separator: If set, keys may be dotted, as in :class:`DottedConfiguration`.
+
+    """
+    def __init__(self, mapping=(), separator=None):
+        super(FrozenConfiguration, self).__init__()
+        self.separator = separator
+        self._hash = None
+        if isinstance(mapping, MutableMappingBase):
+            mapping = mapping.store
+        elif not isinstance(mapping, collections_abc.Mapping):
+            mapping = dict(mapping)
+        self._store = collections.OrderedDict(
+            (key, _freeze(value, separator)) for key, value in six.iteritems(mapping))
+
+    def __getitem__(self, key):
+        """Dictionary getter"""
+        try:
+            return self._store[key]
+        except KeyError:
+            if self.separator is None or not isinstance(key, six.string_types):
+                raise
+        parts = key.split(self.separator)
+        np = len(parts)
+        for i in range(1, np):
+            head = self.separator.join(parts[:np-i])
+            if isinstance(self._store.get(head), FrozenConfiguration):
+                try:
+                    return self._store[head][self.separator.join(parts[np-i:])]
+                except KeyError:
+                    pass
+        raise KeyError('%s' % key)
+
+    def __contains__(self, key):
+        """Dictionary in"""
+        try:
+            self[key]
+        except KeyError:
+            return False
+        else:
+            return True
+
+    def __iter__(self):
+        """Return an iterator for this dictionary"""
+        return iter(self._store)
+
+    def __len__(self):
+        """Length"""
+        return len(self._store)
+
+    def __hash__(self):
+        """Cached hash of the contents."""
+        if self._hash is None:
+            self._hash = hash(frozenset(six.iteritems(self._store)))
+        return self._hash
+
+    def __eq__(self, other):
+        """Structural equality"""
+        if self is other:
+            return True
+        if not isinstance(other, collections_abc.Mapping):
+            return NotImplemented
+        if not isinstance(other, FrozenConfiguration):
+            other = FrozenConfiguration(other)
+        elif (self._hash is not None and other._hash is not None
+            and self._hash != other._hash):
+            return False
+        return dict.__eq__(self._store, other._store)
+
+    def __ne__(self, other):
+        """Structural inequality"""
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __str__(self):
+        """String representation of this object"""
+        return repr(self.store)
+
+    def __repr__(self):
+        """String for this object"""
+        return "<%s %s>" % (self.__class__.__name__, str(self.store))
+
+    def __reduce__(self):
+        """Pickle support"""
+        return (self.__class__, (self.store, self.separator))
+
+    @property
+    def store(self):
+        """A mutable copy of the configuration, as nested dictionaries."""
+        return _thaw(self)
+
+    def thaw(self, cls=None):
+        """Return a mutable configuration with the contents of this one.
+
+        :param cls: The configuration class to create. Defaults to
+            :class:`DottedConfiguration` if this configuration uses a
+            separator, and :class:`Configuration` otherwise.
+
+        """
+        if cls is None:
+            cls = Configuration if self.separator is None else DottedConfiguration
+        config = cls()
+        config.merge(_thaw(self, config.dt))
+        return config
+
+
 
 class DottedConfiguration(Configuration):
     """A configuration which can use dotted accessor methods.
@@ -484,6 +1053,11 @@ class DottedConfiguration(Configuration):
     separator = "."
     """The deep nesting separator character(s)."""
     
+    def freeze(self):
+        """Return an immutable, hashable copy of this configuration, which
+        retains dotted access. See :class:`FrozenConfiguration`."""
+        return FrozenConfiguration(self._store, separator=self.separator)
+
     def flatten(self,sequence=False):
         """Returns this dictionary, flattened so that all dotted names are at the root level."""
         return flatten(self.store, sequence=sequence, separator=self.separator, dt=self.dt)
@@ -492,7 +1066,7 @@ class DottedConfiguration(Configuration):
         """Test if the given item is empty"""
         #pylint: disable=W0703
         try:
-            if isinstance(item, collections.Mapping):
+            if isinstance(item, collections_abc.Mapping):
                 return all([self._isempty(value) 
                     for value in item.values()])
             elif isinstance(item, collections.Sized):
@@ -509,7 +1083,7 @@ class DottedConfiguration(Configuration):
         """Recursive getitem calling function."""
         if len(parts) == 0:
             return store
-        if not isinstance(store, collections.Mapping):
+        if not isinstance(store, collections_abc.Mapping):
             raise KeyError
         
         np = len(parts)
@@ -590,22 +1164,26 @@ class DottedConfiguration(Configuration):
         return rval
             
         
-    def __setitem__(self, key, value):
-        """Dictonary setter"""
+    def _set(self, key, value, source):
+        """Set a value, recording ``source`` as its provenance."""
         keyparts = key.split(self.separator)
         if len(keyparts) > 1:
-            return self._setitem(self._store, keyparts, value)
-        return self._store.__setitem__(key, value)
+            self._setitem(self._store, keyparts, value)
+        else:
+            self._store.__setitem__(key, value)
+        self._track(value, source, key)
         
     def __delitem__(self, key):
         """Dictionary delete"""
         keyparts = key.split(self.separator)
         try:
             if len(keyparts) > 1:
-                return self._delitem(self._store, keyparts)        
-            return self._store.__delitem__(key)
+                self._delitem(self._store, keyparts)
+            else:
+                self._store.__delitem__(key)
         except KeyError:
             raise KeyError('%s' % key)
+        self._forget(key)
         
     def __contains__(self, key):
         """Dictionary in"""
@@ -709,18 +1287,19 @@ class StructuredConfiguration(DottedConfiguration):
             metadata["Files"]["This"] = self._saving_filename
         return [ metadata ]
     
-    def load(self, filename=None, silent=True, fname=None):
+    def load(self, filename=None, silent=True, fname=None, documents=None):
         """Load the configuration to a YAML file. If ``filename`` is 
         not provided, the configuration will use the file set by 
         :meth:`setFile`.
         
         :param string filename: Target filename.
         :param bool silent: Whether to raise an error if the target file cannot be found.
+        :param list documents: YAML documents already parsed from ``filename``.
         
         Uses :meth:`Configuration.load`."""
         if filename == None:
             filename = self._metadata["Files.This"]
-        loaded = super(StructuredConfiguration, self).load(filename, silent, fname=fname)
+        loaded = super(StructuredConfiguration, self).load(filename, silent, fname=fname, documents=documents)
         if loaded and self._set_on_load:
             self.metadata["Files.Loaded"].append(self.filename)
         
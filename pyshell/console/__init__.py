@@ -7,21 +7,31 @@
 #  Copyright 2013 Alexander Rudy. All rights reserved.
 # 
 
-try:
-    from IPython.utils.coloransi import TermColors
-except ImportError:
-    from . import terminal
-    HAVE_IPYTHON = False
-else:
-    HAVE_IPYTHON = True
-
+from operator import methodcaller
 
 __all__ = ['get_color']
 
+_colors = None
+
+def _color_source():
+    """Find the source of terminal colors the first time it is needed.
+    
+    IPython's colors are preferred, but importing IPython (or probing the
+    terminal) is slow, so neither happens when this package is imported."""
+    global _colors
+    if _colors is None:
+        try:
+            from IPython.utils.coloransi import TermColors
+        except ImportError:
+            from . import terminal
+            terminal.probe()
+            _colors = (terminal, methodcaller('upper'), terminal.NORMAL)
+        else:
+            _colors = (TermColors, methodcaller('capitalize'), TermColors.Normal)
+    return _colors
+
 def get_color(color):
     """Try to get colors!"""
-    if HAVE_IPYTHON:
-        return getattr(TermColors,color.capitalize(),TermColors.Normal)
-    else:
-        return getattr(terminal,color.upper(),terminal.NORMAL)
+    source, transform, default = _color_source()
+    return getattr(source, transform(color), default)
     
@@ -24,11 +24,16 @@ This module contains extensions to the progressbar module (<http://pypi.python.o
     ColorBar
     :members:
     :inherited-members:
+    
+.. autoclass::
+    MultiLineProgressBar
+    :members:
 
 """
 import progressbar
 
 import string
+import time
 from . import terminal
 
 from progressbar import *
@@ -55,6 +60,7 @@ class ProgressBar(progressbar.ProgressBar):
         self.seconds_elapsed = now - self.start_time
         self.next_update = self.currval + self.update_interval
         if getattr(self,'_lines',0) > 0:
+            terminal.probe()
             self.fd.write(self._lines * (terminal.UP + terminal.BOL + terminal.CLEAR_EOL))
         line = self._format_line() + "\n"
         self.fd.write(line)
@@ -65,6 +71,7 @@ class ProgressBar(progressbar.ProgressBar):
     def finish(self):
         """Puts the progress bar in a finished state"""
         super(ProgressBar,self).finish()
+        terminal.probe()
         self.fd.write(self._lines * (terminal.UP + terminal.BOL + terminal.CLEAR_EOL))
         
 class ColorBar(progressbar.Bar):
@@ -85,6 +92,7 @@ class ColorBar(progressbar.Bar):
         self.right = right
         self.fill = fill
         self.fill_left = fill_left
+        terminal.probe()
         self.color = getattr(terminal,color.upper(),terminal.NORMAL)
         self.nocolor = terminal.NORMAL
 
@@ -106,3 +114,28 @@ class ColorBar(progressbar.Bar):
         else:
             return '%s%s%s%s%s' % (color,left, marked.rjust(width, self.fill), right, nocolor)
 
+
+class MultiLineProgressBar(ProgressBar):
+    """A progress display with several lines, redrawn in place.
+    
+    :param lines: A function which returns the lines to display.
+    :param poll: The shortest time, in seconds, between redraws.
+    
+    Lines are truncated to the terminal width, so that the previous display can
+    be erased accurately before each redraw.
+    """
+    
+    def __init__(self, lines, maxval=100, poll=0.5, **kwargs):
+        super(MultiLineProgressBar, self).__init__(maxval=maxval, poll=poll, **kwargs)
+        self.lines = lines
+        
+    def _format_line(self):
+        """Join the lines of the display."""
+        width = max(self.term_width - 1, 1)
+        return "\n".join(line[:width] for line in self.lines())
+        
+    def _need_update(self):
+        """Redraw at most every ``poll`` seconds."""
+        if self.finished or self.last_update_time is None:
+            return True
+        return time.time() - self.last_update_time >= self.poll
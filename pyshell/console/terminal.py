@@ -3,6 +3,11 @@
 # License: BSD
 
 """Terminal controller module
+
+On Python 3.7 and later, terminal capabilities are probed the first time
+they are used, or when :func:`probe` is called. Earlier versions can't defer
+module attributes, so the terminal is probed when this module is imported.
+
 Example of usage:
     print BG_BLUE + 'Text on blue background' + NORMAL
     print BLUE + UNDERLINE + 'Blue underlined text' + NORMAL
@@ -75,12 +80,41 @@ def render(text):
     Example:
     apply("%(GREEN)s%(BOLD)stext%(NORMAL)s") -> a bold green text
     """
+    probe()
     return text % MODULE.__dict__
 
-try:
-    import curses
-    setup()
-except Exception as e:
-    # There is a failure; set all attributes to default
-    print(('Warning: %s' % e ))
-    default()   
+_probed = False
+
+def probe():
+    """Set the terminal control strings, probing the terminal the first time
+    this is called. Probing is deferred until the capabilities are needed,
+    as it is slow and may print a warning."""
+    global _probed, curses
+    if _probed:
+        return
+    _probed = True
+    try:
+        import curses
+        setup()
+    except Exception as e:
+        # There is a failure; set all attributes to default
+        print(('Warning: %s' % e ))
+        default()
+
+def _capabilities():
+    """The names of all of the terminal attributes."""
+    names = set(CONTROLS) | set(VALUES)
+    for color in COLORS:
+        names.add(color)
+        names.add('BG_%s' % color)
+    return names
+    
+def __getattr__(name):
+    """Probe the terminal on first access to a capability (Python 3.7+)."""
+    if not _probed and name in _capabilities():
+        probe()
+        return MODULE.__dict__[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+if sys.version_info < (3, 7):
+    probe()
@@ -37,6 +37,9 @@ Automatic Logger Buffering
 .. autofunction::
     buffer_logger
     
+.. autodata::
+    BUFFER_MAXLEN
+    
 Custom Handlers and Formatters
 -------------------------------
 
@@ -44,13 +47,54 @@ Custom Handlers and Formatters
     ManyTargetHandler
     :members:
 
+.. autofunction::
+    handle_batch
+
 .. autoclass::
     BufferHandler
     :members:
     
+.. autoclass::
+    AsyncTargetHandler
+    :members:
+    
+.. autoclass::
+    CompressedRotatingFileHandler
+    :members:
+    
 .. autoclass::
     ColorStreamFormatter
     :members:
+    
+.. autoclass::
+    JSONFormatter
+    
+.. autoclass::
+    RateLimitFilter
+
+Instrumentation
+---------------
+
+.. autofunction::
+    enable_metrics
+
+.. autofunction::
+    metrics_snapshot
+
+.. autofunction::
+    reset_metrics
+
+.. autofunction::
+    dump_metrics
+
+.. autofunction::
+    start_metrics_dump
+
+.. autofunction::
+    stop_metrics_dump
+
+.. autodata::
+    LATENCY_BOUNDS
 
 """
 from __future__ import (absolute_import, unicode_literals, division,
@@ -59,22 +103,38 @@ from __future__ import (absolute_import, unicode_literals, division,
 import logging, logging.config
 import logging.handlers as handlers
 
+import bisect
 import math
+import json
+from json.encoder import encode_basestring_ascii
+import re
 import copy
 import sys
 import time
 import os, os.path
-import yaml
+import io
+import locale
+import shutil
 import collections
+try:
+    import collections.abc as collections_abc
+except ImportError:
+    collections_abc = collections
 
 
 import warnings
+import threading
+import weakref
+import atexit
+import six
+from six.moves import queue
 
 from .console import get_color
 
 __all__ = ['configure_logging','debuffer_logger','GrowlHandler',
-    'ManyTargetHandler','BufferHandler','getLogger','buffer_root','status',
-    'getSimpleLogger',
+    'ManyTargetHandler','BufferHandler','AsyncTargetHandler','CompressedRotatingFileHandler','JSONFormatter','RateLimitFilter','getLogger','buffer_root','status',
+    'getSimpleLogger','enable_metrics','reset_metrics','metrics_snapshot','dump_metrics',
+    'start_metrics_dump','stop_metrics_dump',
     'PYSHELL_LOGGING','PYSHELL_LOGGING_STREAM','PYSHELL_LOGGING_STREAM_ALL']
 
 PYSHELL_LOGGING = [('pyshell','logging.yml')]
@@ -104,6 +164,25 @@ def configure_logging(configuration):
     The loggers will be configured. If any loggers to be configured have a :class:`~loggers.BufferHandler`, that buffer
     will be emptied into the newly configured handlers.
     
+    In addition to the keys used by :func:`logging.config.dictConfig`, the
+    ``logging`` configuration may contain a ``background`` section, which 
+    moves the named handlers onto background threads (see 
+    :class:`AsyncTargetHandler`)::
+        
+        logging:
+          background:
+            handlers: [file]
+            maxsize: 10000
+            policy: drop_oldest
+    
+    and a ``metrics`` section, which enables instrumentation, and optionally
+    a periodic dump of the metrics (see :func:`start_metrics_dump`)::
+        
+        logging:
+          metrics:
+            interval: 60
+            name: pyshell.metrics
+    
     """ 
     from .config import DottedConfiguration
     config = DottedConfiguration.make(configuration)
@@ -115,7 +194,14 @@ def configure_logging(configuration):
         if "root" in config["logging"]:
             _prepare_config()
         
-        logging.config.dictConfig(config["logging"].store)
+        logging_config = config["logging"].store
+        background = logging_config.pop("background", None)
+        metrics = logging_config.pop("metrics", None)
+        logging.config.dictConfig(logging_config)
+        if background:
+            _configure_background(**dict((str(key), value) for key, value in background.items()))
+        if metrics is not None:
+            _configure_metrics(**dict((str(key), value) for key, value in (metrics or {}).items()))
         
         if "py.warnings" in config["logging.loggers"]:
             captureWarnings(True)
@@ -124,6 +210,41 @@ def configure_logging(configuration):
         if "root" in config["logging"]:
             debuffer_logger()
     
+def _configure_background(handlers=(), **kwargs):
+    """Replace named handlers with :class:`AsyncTargetHandler` wrappers 
+    on every logger which uses them.
+    
+    :param handlers: The names of the handlers to move to background threads.
+    :param kwargs: Keyword arguments for :class:`AsyncTargetHandler`.
+    
+    """
+    loggers = _all_loggers()
+    names = set(handlers)
+    wrapped = {}
+    for logger in loggers:
+        for handler in logger.handlers[:]:
+            if handler.get_name() not in names or isinstance(handler, AsyncTargetHandler):
+                continue
+            if handler not in wrapped:
+                wrapped[handler] = AsyncTargetHandler(handler, **kwargs)
+            logger.removeHandler(handler)
+            logger.addHandler(wrapped[handler])
+    missing = names - set(handler.get_name() for handler in wrapped)
+    if missing:
+        warnings.warn("Background logging handlers {0} were not found.".format(
+            ", ".join(sorted(missing))), RuntimeWarning)
+    return list(wrapped.values())
+    
+def _all_loggers():
+    """Return every logger which has been created, including the root logger."""
+    return [ logger for logger in list(logging.Logger.manager.loggerDict.values())
+        if isinstance(logger, logging.Logger) ] + [ logging.getLogger() ]
+    
+BUFFER_MAXLEN = 100000
+"""The maximum number of records held by the :class:`BufferHandler` objects
+which are automatically attached by :func:`getLogger` and :func:`buffer_logger`.
+When full, the oldest records are dropped. Set to ``None`` for unbounded buffers."""
+
 def getLogger(name=None):
     """Return a logger for a specified name.
     
@@ -133,7 +254,7 @@ def getLogger(name=None):
     of :func:`logging.getLogger`."""
     logger = logging.getLogger(name)
     if not len(logger.handlers):
-        logger.addHandler(BufferHandler(1e7))
+        logger.addHandler(BufferHandler(1e7, maxlen=BUFFER_MAXLEN))
     return logger
     
 
@@ -209,7 +330,7 @@ def buffer_logger(name=None):
         _log.removeHandler(handler)
     _log.setLevel(1)
     if not _buffer:
-        _buffer = BufferHandler(1e7)
+        _buffer = BufferHandler(1e7, maxlen=BUFFER_MAXLEN)
     _log.addHandler(_buffer)
     _buffers[name] = _buffer
     
@@ -242,17 +363,40 @@ def debuffer_logger(name=None):
 class PyshellLogger(logging.getLoggerClass()):
     """
     This is a logger object which can act as the 
+    
+    Any registered level name can be used as a logging method, e.g. 
+    ``logger.status("message")`` logs at the ``STATUS`` level. The method for 
+    each level is made the first time it is used, and then cached on the class.
     """
     
+    def __init__(self, *args, **kwargs):
+        super(PyshellLogger, self).__init__(*args, **kwargs)
+        if _metrics is not None:
+            _instrument_logger(self)
+    
+    def addHandler(self, handler):
+        """Add a handler, instrumenting it if metrics are enabled."""
+        super(PyshellLogger, self).addHandler(handler)
+        if _metrics is not None:
+            _instrument_handler(handler)
     
     def __getattr__(self,name):
         """Return special level functions."""
-        if name.upper() not in logging._levelNames:
+        level = None if name.startswith("_") else logging.getLevelName(name.upper())
+        if not isinstance(level, int):
             raise AttributeError("{0} has no attribute {1}".format(self,name))
-        def log(msg, *args,**kwargs):
-            self._log(logging._levelNames[name.upper()],msg,args,**kwargs)
-        log.__doc__ = "Log a message at level {}".format(name)
-        return log
+        log = _level_method(name, level)
+        setattr(type(self), name, log)
+        return getattr(self, name)
+        
+def _level_method(name, level):
+    """Make a logging method for a custom level."""
+    def log(self, msg, *args, **kwargs):
+        if self.isEnabledFor(level):
+            self._log(level, msg, args, **kwargs)
+    log.__name__ = str(name)
+    log.__doc__ = "Log a message at level {}".format(name)
+    return log
 
 logging.setLoggerClass(PyshellLogger)
 
@@ -318,7 +462,14 @@ class GrowlHandler(logging.Handler):
             self.handleError(record)
             
 class ColorStreamFormatter(logging.Formatter):
-    """Print to stream with colors!"""
+    """Print to stream with colors!
+    
+    The ``color`` and ``nocolor`` fields are available to the format string.
+    Colors are looked up once per level number, and records are never
+    modified to carry them, so one record can be shared safely between
+    handlers with different formatters. For the default ``%`` style, the
+    colors for each level are substituted into the format string ahead of
+    time, so each record is interpolated only once."""
     
     color = {
         logging.DEBUG : "magenta",
@@ -327,26 +478,358 @@ class ColorStreamFormatter(logging.Formatter):
         logging.ERROR : "red",
     }
     
+    def __init__(self, *args, **kwargs):
+        super(ColorStreamFormatter, self).__init__(*args, **kwargs)
+        self._uses_time = self.usesTime()
+        self._percent = isinstance(getattr(self, "_style", None),
+            (type(None), getattr(logging, "PercentStyle", type(None))))
+        self._colors = {}
+        self._templates = {}
+        for levelno in set(self.color) | set([logging.NOTSET, logging.CRITICAL]):
+            self.colors(levelno)
+            self._template(levelno)
+    
+    def colors(self, levelno):
+        """Return the ``(color, nocolor)`` pair for a level number."""
+        try:
+            return self._colors[levelno]
+        except KeyError:
+            pass
+        thresholds = [ level for level in self.color if level <= levelno ]
+        if thresholds:
+            color = get_color(self.color[max(thresholds)])
+        else:
+            color = ""
+        nocolor = "" if color == "" else get_color("Normal")
+        self._colors[levelno] = (color, nocolor)
+        return color, nocolor
+    
+    def _template(self, levelno):
+        """Return the format string with this level's colors filled in."""
+        try:
+            return self._templates[levelno]
+        except KeyError:
+            pass
+        values = dict(zip(("color", "nocolor"), self.colors(levelno)))
+        template = _COLOR_FIELDS.sub(
+            lambda m : (("%" + m.group(2) + "s") % values[m.group(1)]).replace("%", "%%"),
+            self._fmt)
+        self._templates[levelno] = template
+        return template
+    
+    def formatMessage(self, record):
+        """Interpolate the format string for a record."""
+        if self._percent:
+            return self._template(record.levelno) % record.__dict__
+        color, nocolor = self.colors(record.levelno)
+        values = dict(record.__dict__, color=color, nocolor=nocolor)
+        return self._style.format(_RecordView(values))
+    
     def format(self, record):
         """Format a record with colors from the terminal module."""
-        if record.levelno < logging.DEBUG:
-            record.color = ""
-        elif record.levelno < logging.INFO:
-            record.color = get_color(self.color[logging.DEBUG])
-        elif record.levelno < logging.WARN:
-            record.color = get_color(self.color[logging.INFO])
-        elif record.levelno < logging.ERROR:
-            record.color = get_color(self.color[logging.WARN])
-        else:
-            record.color = get_color(self.color[logging.ERROR])
+        record.message = record.getMessage()
+        repeated = getattr(record, "repeated", 0)
+        if repeated:
+            record.message = "{0} (repeated {1:d} times)".format(record.message, repeated)
+        if self._uses_time:
+            record.asctime = self.formatTime(record, self.datefmt)
+        s = self.formatMessage(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + record.exc_text
+        if getattr(record, "stack_info", None):
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + self.formatStack(record.stack_info)
+        return s
+        
+_COLOR_FIELDS = re.compile(r"%\(((?:no)?color)\)([#0 +-]*\d*(?:\.\d*)?)s")
+
+class _RecordView(object):
+    """A stand-in record with extra attributes, used for formatting."""
+    def __init__(self, values):
+        self.__dict__ = values
         
-        if record.color == "":
-            record.nocolor = ""
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects, for newline-delimited JSON logs.
+    
+    :param fmt: A format string, used only to choose the fields when ``fields``
+        is not given: each attribute it refers to becomes a field, in order.
+    :param datefmt: The date format used for ``asctime``.
+    :param style: The style of ``fmt``, one of ``%``, ``{`` or ``$``.
+    :param fields: The record attributes to include, in order. Either a list of
+        attribute names, or a mapping of output names to attribute names. The
+        ``message``, ``asctime``, ``exc_info`` and ``stack_info`` attributes are
+        formatted as they would be by :class:`logging.Formatter`.
+    :param static: A mapping of constant fields added to every record.
+    :param extra: Whether to include attributes set by the ``extra=`` argument
+        to logging calls.
+    
+    The field list and static fields are encoded once, when the formatter is 
+    created, and each value is serialized with the :mod:`json` C encoder. 
+    In a logging configuration, use this class as a formatter factory::
+        
+        formatters:
+          json:
+            (): pyshell.loggers.JSONFormatter
+            fields: [created, levelname, name, message]
+            static:
+              service: backup
+        
+    """
+    
+    default_fields = ("created", "levelname", "name", "message")
+    
+    def __init__(self, fmt=None, datefmt=None, style="%", fields=None, static=None, extra=True):
+        super(JSONFormatter, self).__init__(None, datefmt)
+        if fields is None and fmt is not None:
+            fields = _FORMAT_FIELDS[style].findall(fmt)
+        if fields is None:
+            fields = self.default_fields
+        if isinstance(fields, collections_abc.Mapping):
+            fields = list(fields.items())
         else:
-            record.nocolor = get_color("Normal")
-            
-        return super(ColorStreamFormatter, self).format(record)
+            fields = [ (field, field) for field in fields ]
+        self._encoder = json.JSONEncoder(default=six.text_type, separators=(",", ":"))
+        self._fields = [ (self._key(name), self._getter(attribute)) for name, attribute in fields ]
+        self._static = [ self._key(name) + self._encoder.encode(value) 
+            for name, value in (static or {}).items() ]
+        attributes = set(attribute for _, attribute in fields)
+        self._skip = _RECORD_ATTRIBUTES | attributes | set(static or ())
+        if "exc_info" not in attributes:
+            self._exc_info = self._key("exc_info")
+        else:
+            self._exc_info = None
+        self.extra = extra
+        self._keys = {}
+    
+    def _key(self, name):
+        """Encode an object key, with its separator."""
+        return encode_basestring_ascii(name) + ":"
+    
+    def _getter(self, attribute):
+        """Make a function which gets the value of a record attribute."""
+        if attribute == "message":
+            return lambda record : record.getMessage()
+        elif attribute == "asctime":
+            return lambda record : self.formatTime(record, self.datefmt)
+        elif attribute == "exc_info":
+            return self._format_exception
+        elif attribute == "stack_info":
+            return self._format_stack
+        return lambda record : getattr(record, attribute, None)
+    
+    def _format_exception(self, record):
+        """Format the exception information for a record."""
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        return record.exc_text
+        
+    def _format_stack(self, record):
+        """Format the stack information for a record."""
+        stack_info = getattr(record, "stack_info", None)
+        return self.formatStack(stack_info) if stack_info else None
+    
+    def _encode(self, value):
+        """Encode a single value."""
+        encoder = _JSON_FAST.get(type(value))
+        if encoder is not None:
+            return encoder(value)
+        return self._encoder.encode(value)
+    
+    def format(self, record):
+        """Format a record as a JSON object."""
+        encode = self._encode
+        parts = list(self._static)
+        for key, getter in self._fields:
+            parts.append(key + encode(getter(record)))
+        if record.exc_info and self._exc_info is not None:
+            parts.append(self._exc_info + encode(self._format_exception(record)))
+        if self.extra:
+            keys = self._keys
+            for name in sorted(six.viewkeys(record.__dict__) - self._skip):
+                key = keys.get(name)
+                if key is None:
+                    key = keys[name] = self._key(name)
+                parts.append(key + encode(record.__dict__[name]))
+        return "{" + ",".join(parts) + "}"
+        
+_FORMAT_FIELDS = {
+    "%" : re.compile(r"%\((\w+)\)"),
+    "{" : re.compile(r"\{(\w+)"),
+    "$" : re.compile(r"\$\{?(\w+)"),
+}
+
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | frozenset(
+    ["message", "asctime", "exc_text", "stack_info"])
+
+def _encode_float(value):
+    """Encode a finite float, falling back on the JSON encoder for others."""
+    if math.isinf(value) or math.isnan(value):
+        return json.dumps(value)
+    return float.__repr__(value)
+
+_JSON_FAST = {
+    type(None) : lambda value : "null",
+    bool : lambda value : "true" if value else "false",
+    int : int.__repr__,
+    float : _encode_float,
+    six.text_type : encode_basestring_ascii,
+    six.binary_type : encode_basestring_ascii,
+}
+if six.PY3:
+    del _JSON_FAST[six.binary_type]
+
+class RateLimitFilter(logging.Filter):
+    """Rate limit and collapse repeated log messages.
+    
+    :param name: As for :class:`logging.Filter`, only records from this logger
+        and its children are passed.
+    :param rate: The number of records per second allowed for each message.
+    :param burst: The number of records for each message allowed in a burst.
+    :param period: The interval, in seconds, between summaries of suppressed
+        messages.
+    :param maxkeys: The maximum number of messages to track. The least recently
+        seen messages are forgotten first.
+    
+    Records are grouped by their logger name, level and unformatted message,
+    and each group is limited by a token bucket. When a record is passed
+    after others with the same message were suppressed, the number of
+    suppressed records is set as its ``repeated`` attribute. The message
+    itself is not changed, as the record is shared with every other handler;
+    :class:`ColorStreamFormatter` appends "(repeated N times)" to it, and
+    :class:`JSONFormatter` writes a ``repeated`` field. While a message is
+    suppressed, one record is let through as such a summary every ``period``
+    seconds.
+    
+    When the filter is closed (see :meth:`close`, which is also called at
+    exit), the last suppressed record of each message is passed on with the
+    count of the others, so no suppressed message goes unreported. It goes
+    only to where the filter is attached: to the handlers which have it, and
+    through the loggers which have it.
+    
+    In a logging configuration, use this class as a filter factory::
+        
+        filters:
+          ratelimit:
+            (): pyshell.loggers.RateLimitFilter
+            rate: 1
+            burst: 10
+        
+    """
+    
+    clock = staticmethod(getattr(time, "monotonic", time.time))
+    
+    def __init__(self, name="", rate=1.0, burst=10, period=60.0, maxkeys=1024):
+        super(RateLimitFilter, self).__init__(name)
+        self.rate = rate
+        self.burst = burst
+        self.period = period
+        self.maxkeys = maxkeys
+        self.suppressed = 0
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+        _rate_limit_filters.add(self)
+    
+    def _key(self, record):
+        """The group of messages for a record."""
+        try:
+            hash(record.msg)
+        except TypeError:
+            return (record.name, record.levelno, repr(record.msg))
+        return (record.name, record.levelno, record.msg)
+    
+    def _bucket(self, key, now):
+        """Find the bucket for a key, marking it as recently used."""
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = _TokenBucket(self.burst, now)
+            while len(self._buckets) >= self.maxkeys:
+                self._buckets.popitem(last=False)
+        self._buckets[key] = bucket
+        return bucket
+    
+    def filter(self, record):
+        """Decide whether a record should be logged."""
+        if not super(RateLimitFilter, self).filter(record):
+            return False
+        if self._closed:
+            return True
+        now = self.clock()
+        with self._lock:
+            bucket = self._bucket(self._key(record), now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.last) * self.rate)
+            bucket.last = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+            elif now - bucket.summarized < self.period:
+                bucket.repeated += 1
+                bucket.record = record
+                self.suppressed += 1
+                return False
+            repeated, bucket.repeated, bucket.record = bucket.repeated, 0, None
+            bucket.summarized = now
+        if repeated:
+            record.repeated = repeated
+        return True
+        
+    def close(self):
+        """Stop limiting, and log a summary of each suppressed message.
         
+        For each message with suppressed records, the last one is passed on,
+        with the number of the others as its ``repeated`` attribute. Records 
+        suppressed by a handler's filter are given to that handler alone, so 
+        other handlers don't see them twice, and records suppressed by a 
+        logger's filter are handled by that logger."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending = [ (bucket.record, bucket.repeated - 1) 
+                for bucket in self._buckets.values() if bucket.repeated ]
+            self._buckets.clear()
+        if not pending:
+            return
+        loggers = [ logger for logger in _all_loggers() if self in logger.filters ]
+        handlers = [ handler for handler in (ref() for ref in list(logging._handlerList))
+            if handler is not None and self in handler.filters ]
+        for record, repeated in pending:
+            if repeated:
+                record.repeated = repeated
+            reached = set()
+            for logger in loggers:
+                # Logger filters only see records logged to that logger.
+                if logger.name == record.name and logger.isEnabledFor(record.levelno):
+                    logger.handle(record)
+                    reached.update(_logger_handlers(logger))
+            for handler in handlers:
+                if handler not in reached and record.levelno >= handler.level:
+                    handler.handle(record)
+        
+class _TokenBucket(object):
+    """The rate limiting state for a single message."""
+    
+    __slots__ = ('tokens', 'last', 'repeated', 'summarized', 'record')
+    
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.last = now
+        self.repeated = 0
+        self.summarized = now
+        self.record = None
+        
+_rate_limit_filters = weakref.WeakSet()
+
+@atexit.register
+def _close_rate_limit_filters():
+    """Report suppressed messages from every rate limit filter at exit, 
+    before :func:`logging.shutdown` closes the handlers."""
+    for ratelimit in list(_rate_limit_filters):
+        ratelimit.close()
         
 class ManyTargetHandler(handlers.MemoryHandler):
     """A new default handler (similar to a NULL handler) which holds onto targets for later."""
@@ -356,8 +839,8 @@ class ManyTargetHandler(handlers.MemoryHandler):
             self.targets = set([self.target])
         else:
             self.targets = set()
-        if isinstance(targets,collections.Sequence):
-            self.targets += set(targets)
+        if isinstance(targets,collections_abc.Sequence):
+            self.targets |= set(targets)
 
     def setTarget(self,target):
         """Add another target to the handler"""
@@ -365,14 +848,21 @@ class ManyTargetHandler(handlers.MemoryHandler):
             self.targets.add(target)
                 
     def flush(self):
-        """Flush out this handler"""
+        """Flush out this handler.
+        
+        Records are filtered by the effective level of their logger (looked up 
+        once per logger), and then passed to each target in a single batch.
+        See :func:`handle_batch`."""
         if len(self.targets) > 0:
-            for record in self.buffer:
-                for target in self.targets:
-                    if (record.levelno >= target.level and
-                        logging.getLogger(record.name).isEnabledFor(record.levelno)):
-                        target.handle(record)
-            self.buffer = []
+            records, self.buffer = self.buffer, self._new_buffer()
+            records = _enabled_records(records)
+            for target in self.targets:
+                handle_batch(target, [ record for record in records 
+                    if record.levelno >= target.level ])
+            
+    def _new_buffer(self):
+        """Return a new, empty buffer."""
+        return []
     
     def close(self):
         """Close the handler"""
@@ -380,11 +870,811 @@ class ManyTargetHandler(handlers.MemoryHandler):
         self.targets = set()
         
         
+def _enabled_records(records):
+    """Filter records which their loggers are enabled for, looking up the
+    effective level of each logger only once."""
+    disable = logging.root.manager.disable
+    levels = {}
+    enabled = []
+    for record in records:
+        try:
+            level = levels[record.name]
+        except KeyError:
+            level = levels[record.name] = logging.getLogger(record.name).getEffectiveLevel()
+        if record.levelno >= level and record.levelno > disable:
+            enabled.append(record)
+    return enabled
+    
+def handle_batch(target, records):
+    """Handle a batch of records with a handler or a logger.
+    
+    :param target: A :class:`logging.Handler` or :class:`logging.Logger`.
+    :param records: A sequence of :class:`logging.LogRecord` objects.
+    
+    Targets which provide a ``handle_batch`` method are given the whole batch.
+    Loggers pass the batch along to each of their handlers (and their 
+    parents' handlers) in turn, and plain :class:`logging.StreamHandler` and
+    :class:`logging.FileHandler` instances write the batch with a single call
+    to ``stream.write``. Other handlers, including subclasses of those, which
+    may override :meth:`~logging.Handler.emit`, handle each record individually.
+    """
+    if not len(records):
+        return
+    if isinstance(target, logging.Logger):
+        _logger_handle_batch(target, records)
+    elif hasattr(target, 'handle_batch'):
+        target.handle_batch(records)
+    elif (type(target) in (logging.StreamHandler, logging.FileHandler) and
+        getattr(target, 'stream', None) is not None):
+        _stream_handle_batch(target, records)
+    else:
+        for record in records:
+            target.handle(record)
+            
+def _logger_handle_batch(logger, records):
+    """Handle a batch of records, as :meth:`logging.Logger.handle` would."""
+    if logger.disabled:
+        return
+    records = [ record for record in records if logger.filter(record) ]
+    found = 0
+    current = logger
+    while current:
+        for handler in current.handlers:
+            found += 1
+            handle_batch(handler, [ record for record in records 
+                if record.levelno >= handler.level ])
+        if not current.propagate:
+            break
+        current = current.parent
+    if found or not len(records):
+        return
+    last_resort = getattr(logging, 'lastResort', None)
+    if last_resort is not None:
+        for record in records:
+            if record.levelno >= last_resort.level:
+                last_resort.handle(record)
+    elif logging.raiseExceptions and not logger.manager.emittedNoHandlerWarning:
+        sys.stderr.write("No handlers could be found for logger \"{0}\"\n".format(logger.name))
+        logger.manager.emittedNoHandlerWarning = True
+        
+def _stream_handle_batch(handler, records):
+    """Format a batch of records, and write them to a stream handler at once."""
+    terminator = getattr(handler, 'terminator', str('\n'))
+    records = [ record for record in records if handler.filter(record) ]
+    lines = []
+    for record in records:
+        try:
+            lines.append(handler.format(record) + terminator)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            handler.handleError(record)
+    if not len(lines):
+        return
+    handler.acquire()
+    try:
+        # Join with an empty string of the same type as the formatted lines.
+        handler.stream.write(lines[0][:0].join(lines))
+        handler.flush()
+    except (UnicodeError, TypeError):
+        # Let the handler deal with encoding each record.
+        for record in records:
+            handler.emit(record)
+    finally:
+        handler.release()
+        
 class BufferHandler(ManyTargetHandler):
-    """A special case of ManyTargetHandler for use with :func:`debuffer_logger`."""
+    """A special case of ManyTargetHandler for use with :func:`debuffer_logger`.
+    
+    :param capacity: The number of records which will trigger a flush.
+    :param maxlen: The maximum number of records to hold. ``None`` for no limit.
+    :param max_bytes: The (approximate) maximum memory, in bytes, used by held 
+        records. ``None`` for no limit.
+    :param overflow: The policy used when the buffer is full. One of:
+    
+        - ``"oldest"``: Drop the oldest records to make room for new ones.
+        - ``"level"``: Drop new records below ``overflow_level``. Records at or
+          above ``overflow_level`` replace the oldest records.
+        - ``"sample"``: Keep one in every ``sample`` new records, replacing the 
+          oldest records, and drop the rest.
+    
+    :param overflow_level: The level used by the ``"level"`` policy.
+    :param sample: The sampling interval used by the ``"sample"`` policy.
+    
+    When either ``maxlen`` or ``max_bytes`` is set, records are held in a 
+    :class:`collections.deque` ring buffer. The number of dropped records is 
+    counted in :attr:`dropped` and :attr:`dropped_by_level`, and reported with 
+    a warning when the buffer is flushed into its targets.
+    """
     
     level = 1
     
+    OVERFLOW_POLICIES = ("oldest", "level", "sample")
+    
+    def __init__(self, capacity, flushLevel=logging.ERROR, target=None, targets=None,
+        maxlen=None, max_bytes=None, overflow="oldest", overflow_level=logging.WARNING,
+        sample=10):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Overflow policy must be in {0!r}, got {1!r}".format(
+                self.OVERFLOW_POLICIES, overflow))
+        self.maxlen = int(maxlen) if maxlen is not None else None
+        self.max_bytes = int(max_bytes) if max_bytes is not None else None
+        self.overflow = overflow
+        self.overflow_level = overflow_level
+        self.sample = int(sample)
+        self.dropped = 0
+        self.dropped_by_level = collections.Counter()
+        self.buffered_bytes = 0
+        self._sizes = collections.deque()
+        self._overflowed = 0
+        super(BufferHandler, self).__init__(capacity, flushLevel, target, targets)
+        self.buffer = self._new_buffer()
+        
+    @property
+    def bounded(self):
+        """Whether this buffer is a bounded ring buffer."""
+        return self.maxlen is not None or self.max_bytes is not None
+        
+    def _new_buffer(self):
+        """Return a new, empty buffer."""
+        self.buffered_bytes = 0
+        self._sizes = collections.deque()
+        if self.bounded:
+            return collections.deque()
+        return []
+        
+    def _full(self, size):
+        """Whether a record of ``size`` bytes would overflow the buffer."""
+        if self.maxlen is not None and len(self.buffer) >= self.maxlen:
+            return True
+        if self.max_bytes is not None and self.buffered_bytes + size > self.max_bytes:
+            return True
+        return False
+        
+    def _admit(self, record):
+        """Whether a new record should be admitted to a full buffer."""
+        if self.overflow == "level":
+            return record.levelno >= self.overflow_level
+        elif self.overflow == "sample":
+            self._overflowed += 1
+            return (self._overflowed % self.sample) == 0
+        return True
+        
+    def _drop(self, record):
+        """Count a dropped record."""
+        self.dropped += 1
+        self.dropped_by_level[record.levelno] += 1
+        
+    def emit(self, record):
+        """Add a record to the buffer, applying the overflow policy."""
+        if not self.bounded:
+            return super(BufferHandler, self).emit(record)
+        size = _record_size(record) if self.max_bytes is not None else 0
+        if self._full(size):
+            if not self._admit(record):
+                self._drop(record)
+                return
+            while len(self.buffer) and self._full(size):
+                self._drop(self.buffer.popleft())
+                self.buffered_bytes -= self._sizes.popleft()
+        self.buffer.append(record)
+        self._sizes.append(size)
+        self.buffered_bytes += size
+        if self.shouldFlush(record):
+            self.flush()
+            
+    def flush(self):
+        """Flush out this handler, reporting any dropped records."""
+        if len(self.targets) > 0 and self.dropped:
+            summary = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                "Dropped %d buffered log records (%s)", (self.dropped, 
+                ", ".join("{0}={1:d}".format(logging.getLevelName(level), count) 
+                    for level, count in sorted(self.dropped_by_level.items()))), None)
+            if self.bounded:
+                self.buffer.appendleft(summary)
+            else:
+                self.buffer.insert(0, summary)
+            self.dropped = 0
+            self.dropped_by_level.clear()
+        super(BufferHandler, self).flush()
+        
+def _record_size(record):
+    """Approximate the memory used by a log record, in bytes."""
+    size = sys.getsizeof(record) + sys.getsizeof(record.__dict__) + sys.getsizeof(record.msg)
+    if isinstance(record.args, tuple):
+        size += sum(sys.getsizeof(arg) for arg in record.args)
+    return size
+    
+class AsyncTargetHandler(logging.Handler):
+    """A handler which dispatches records to a target handler from a 
+    background thread, similar to a :class:`logging.handlers.QueueHandler`
+    and :class:`logging.handlers.QueueListener` pair.
+    
+    :param target: The handler which will handle records in the background.
+    :param maxsize: The maximum number of records waiting in the queue.
+    :param policy: The backpressure policy used when the queue is full. One of:
+    
+        - ``"block"``: Wait for space in the queue, up to ``timeout`` seconds, 
+          and then drop the record.
+        - ``"drop_newest"``: Drop the new record.
+        - ``"drop_oldest"``: Drop the oldest waiting record to make room.
+    
+    :param timeout: The longest time, in seconds, that the ``"block"`` policy 
+        will wait. ``None`` waits forever.
+    
+    The handler level and name follow the target. Records are prepared for
+    the queue by merging their arguments into the message, so that later 
+    changes to mutable arguments do not change the logged message. The number
+    of dropped records is counted in :attr:`dropped`.
+    """
+    
+    POLICIES = ("block", "drop_newest", "drop_oldest")
+    
+    _sentinel = None
+    
+    def __init__(self, target, maxsize=10000, policy="block", timeout=None):
+        if policy not in self.POLICIES:
+            raise ValueError("Backpressure policy must be in {0!r}, got {1!r}".format(
+                self.POLICIES, policy))
+        super(AsyncTargetHandler, self).__init__(target.level)
+        self.target = target
+        self.set_name(target.get_name())
+        self.policy = policy
+        self.timeout = timeout
+        self.dropped = 0
+        self.queue = queue.Queue(int(maxsize))
+        self._thread = threading.Thread(target=self._monitor, 
+            name="{0}({1})".format(self.__class__.__name__, target.get_name()))
+        self._thread.daemon = True
+        self._thread.start()
+        
+    def prepare(self, record):
+        """Prepare a record for the queue. The record is copied, so that other
+        handlers see the original record."""
+        if record.args:
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+        
+    def enqueue(self, record):
+        """Put a record on the queue, applying the backpressure policy."""
+        try:
+            if self.policy == "block":
+                self.queue.put(record, True, self.timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            if self.policy == "drop_oldest":
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                except queue.Empty:
+                    pass
+                self.dropped += 1
+                return self.enqueue(record)
+            self.dropped += 1
+        
+    def emit(self, record):
+        """Queue the record for the target. Once the handler is closed, 
+        nothing takes records from the queue, so they are given to the target
+        directly."""
+        try:
+            if self._thread is None:
+                if record.levelno >= self.target.level:
+                    self.target.handle(record)
+            else:
+                self.enqueue(self.prepare(record))
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+            
+    def _monitor(self):
+        """Dispatch queued records to the target, until the sentinel is found."""
+        while True:
+            record = self.queue.get()
+            try:
+                if record is self._sentinel:
+                    break
+                if record.levelno >= self.target.level:
+                    self.target.handle(record)
+            finally:
+                self.queue.task_done()
+            
+    def flush(self):
+        """Wait for queued records to be handled, then flush the target."""
+        if self._thread is not None:
+            self.queue.join()
+        self.target.flush()
+        
+    def close(self):
+        """Handle the remaining records, then stop the background thread."""
+        self.acquire()
+        try:
+            thread, self._thread = self._thread, None
+        finally:
+            self.release()
+        if thread is not None:
+            self.queue.put(self._sentinel)
+            thread.join()
+        super(AsyncTargetHandler, self).close()
+        
+class CompressedRotatingFileHandler(logging.FileHandler):
+    """A file handler which rotates by size or time, and compresses rotated files.
+    
+    :param filename: The name of the log file.
+    :param mode: The mode used to open the log file.
+    :param maxBytes: Rotate the file before it grows past this many (encoded) bytes. 
+        ``0`` disables size based rotation.
+    :param when: The units of ``interval``, one of ``S``, ``M``, ``H`` or ``D``
+        (seconds, minutes, hours or days). ``None`` disables time based rotation.
+    :param interval: Rotate the file after this many ``when`` units. Rotation
+        happens at multiples of this interval (since the epoch), so it
+        doesn't depend on how long the logging process runs.
+    :param backupCount: The number of rotated files to keep. ``0`` keeps them all.
+    :param encoding: The encoding of the log file.
+    :param delay: Don't open the log file until the first record is written.
+    :param compression: ``"gzip"``, ``"xz"`` or ``None``.
+    :param buffersize: The size, in bytes, of the write buffer.
+    :param flushInterval: The longest time, in seconds, that records stay in
+        the write buffer. Records at or above ``flushLevel`` are always flushed
+        immediately.
+    :param flushLevel: The level at which records are flushed immediately.
+    
+    Rotated files are named with the time of rotation, as in 
+    ``script.log.20140106-120000.gz``. They are compressed in a background 
+    thread, so that writing records never waits on compression. The same thread
+    flushes the write buffer every ``flushInterval`` seconds. ``xz`` compression
+    requires the :mod:`lzma` module. 
+    """
+    
+    UNITS = {"S" : 1, "M" : 60, "H" : 60 * 60, "D" : 60 * 60 * 24}
+    
+    COMPRESSION = {"gzip" : ".gz", "xz" : ".xz", None : ""}
+    
+    terminator = "\n"
+    
+    def __init__(self, filename, mode="a", maxBytes=0, when=None, interval=1, backupCount=0,
+        encoding=None, delay=False, compression="gzip", buffersize=2**20, flushInterval=1.0,
+        flushLevel=logging.ERROR):
+        if compression not in self.COMPRESSION:
+            raise ValueError("Compression must be in {0!r}, got {1!r}".format(
+                sorted(self.COMPRESSION, key=str), compression))
+        if compression is not None:
+            _compressor(compression)
+        if when is not None and when.upper() not in self.UNITS:
+            raise ValueError("Rotation interval units must be in {0!r}, got {1!r}".format(
+                sorted(self.UNITS), when))
+        self.maxBytes = int(maxBytes)
+        self.interval = self.UNITS[when.upper()] * interval if when is not None else None
+        self.backupCount = int(backupCount)
+        self.compression = compression
+        self.buffersize = int(buffersize)
+        self.flushInterval = flushInterval
+        self.flushLevel = flushLevel
+        self.size = 0
+        self.rolloverAt = None
+        super(CompressedRotatingFileHandler, self).__init__(filename, mode, encoding, delay)
+        if self.interval is not None:
+            # Like TimedRotatingFileHandler, start from the time the existing
+            # file was last written, so short-lived processes still rotate it.
+            if os.path.exists(self.baseFilename):
+                self.rolloverAt = self._nextRollover(os.stat(self.baseFilename).st_mtime)
+            else:
+                self.rolloverAt = self._nextRollover(time.time())
+        self._pattern = re.compile(re.escape(os.path.basename(self.baseFilename)) + 
+            r"\.(\d{8}-\d{6})(?:\.(\d+))?(?:\.gz|\.xz)?$")
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._work,
+            name="{0}({1})".format(self.__class__.__name__, os.path.basename(self.baseFilename)))
+        self._thread.daemon = True
+        self._thread.start()
+        
+    def _open(self):
+        """Open the log file with a large write buffer."""
+        stream = io.open(self.baseFilename, self.mode, buffering=self.buffersize, 
+            encoding=self.encoding)
+        self.size = os.path.getsize(self.baseFilename)
+        return stream
+        
+    def _encoding(self):
+        """The encoding of the log file, used to count the bytes written."""
+        if self.stream is not None:
+            return self.stream.encoding
+        return self.encoding or locale.getpreferredencoding(False)
+        
+    def _nextRollover(self, when):
+        """The time of the first rotation after ``when``: the end of the
+        interval which contains it."""
+        return (math.floor(when / self.interval) + 1) * self.interval
+        
+    def shouldRollover(self, size):
+        """Whether writing ``size`` more bytes should rotate the file first."""
+        if self.maxBytes > 0 and self.size and self.size + size > self.maxBytes:
+            return True
+        if self.rolloverAt is not None and time.time() >= self.rolloverAt:
+            return True
+        return False
+        
+    def doRollover(self):
+        """Rotate the log file, and queue the rotated file for compression."""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename):
+            stamp = "{0}.{1}".format(self.baseFilename, time.strftime("%Y%m%d-%H%M%S"))
+            rotated, n = stamp, 0
+            while any(os.path.exists(rotated + suffix) for suffix in self.COMPRESSION.values()):
+                n += 1
+                rotated = "{0}.{1:d}".format(stamp, n)
+            os.rename(self.baseFilename, rotated)
+            self._jobs.put(rotated)
+        if self.rolloverAt is not None:
+            self.rolloverAt = self._nextRollover(time.time())
+        self.size = 0
+        if not self.delay:
+            self.stream = self._open()
+        
+    def emit(self, record):
+        """Write a record, rotating the file first if necessary."""
+        try:
+            msg = self.format(record)
+            if isinstance(msg, six.binary_type):
+                msg = msg.decode("utf-8", "replace")
+            msg += self.terminator
+            size = len(msg.encode(self._encoding(), "replace"))
+            if self.shouldRollover(size):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg)
+            self.size += size
+            if record.levelno >= self.flushLevel:
+                self.stream.flush()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+            
+    def handle_batch(self, records):
+        """Handle a batch of records, taking the handler lock once. See 
+        :func:`handle_batch`."""
+        records = [ record for record in records if self.filter(record) ]
+        self.acquire()
+        try:
+            for record in records:
+                self.emit(record)
+        finally:
+            self.release()
+            
+    def _work(self):
+        """Compress rotated files, and flush the write buffer periodically."""
+        while True:
+            try:
+                rotated = self._jobs.get(True, self.flushInterval)
+            except queue.Empty:
+                self.acquire()
+                try:
+                    if self.stream is not None:
+                        self.stream.flush()
+                finally:
+                    self.release()
+                continue
+            try:
+                if rotated is None:
+                    break
+                self._compress(rotated)
+                self._remove_old()
+            except Exception:
+                warnings.warn("Couldn't compress rotated log file {0}: {1!s}".format(
+                    rotated, sys.exc_info()[1]), RuntimeWarning)
+            finally:
+                self._jobs.task_done()
+            
+    def _compress(self, rotated):
+        """Compress a rotated log file."""
+        if self.compression is None:
+            return
+        target = rotated + self.COMPRESSION[self.compression]
+        with open(rotated, "rb") as source:
+            with _compressor(self.compression)(target + ".tmp", "wb") as destination:
+                shutil.copyfileobj(source, destination)
+        os.rename(target + ".tmp", target)
+        os.remove(rotated)
+        
+    def _remove_old(self):
+        """Remove the oldest rotated log files, keeping ``backupCount``."""
+        if self.backupCount <= 0:
+            return
+        directory = os.path.dirname(self.baseFilename)
+        rotated = []
+        for filename in os.listdir(directory):
+            match = self._pattern.match(filename)
+            if match:
+                rotated.append((match.group(1), int(match.group(2) or 0), filename))
+        for _, _, filename in sorted(rotated)[:-self.backupCount]:
+            os.remove(os.path.join(directory, filename))
+        
+    def close(self):
+        """Finish compressing rotated files, then close the log file."""
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+        super(CompressedRotatingFileHandler, self).close()
+        
+def _compressor(compression):
+    """Return the ``open`` function for a compression format."""
+    if compression == "gzip":
+        import gzip
+        return gzip.open
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            raise ValueError("xz compression requires the lzma module.")
+    return lzma.open
+        
+def _configure_metrics(enabled=True, interval=None, **kwargs):
+    """Enable instrumentation, and start a periodic dump if an ``interval`` is given.
+    
+    :param enabled: Whether to enable instrumentation.
+    :param interval: The time between metrics dumps, in seconds.
+    :param kwargs: Keyword arguments for :func:`start_metrics_dump`.
+    
+    """
+    enable_metrics(enabled)
+    if enabled and interval:
+        start_metrics_dump(interval, **kwargs)
+    else:
+        stop_metrics_dump()
+
+LATENCY_BOUNDS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+"""The upper bounds, in seconds, of the handler latency histogram buckets.
+A final bucket counts everything slower than the last bound."""
+
+class _Metrics(object):
+    """Counters collected while instrumentation is enabled."""
+    
+    def __init__(self):
+        self.records = collections.Counter()
+        self.latency = {}
+        self.lock = threading.Lock()
+        
+    def count(self, record):
+        """Count a record handled by its logger."""
+        with self.lock:
+            self.records[(record.name, record.levelno)] += 1
+        
+    def time(self, handler, elapsed):
+        """Record the time taken by a handler."""
+        name = handler.get_name() or handler.__class__.__name__
+        with self.lock:
+            latency = self.latency.get(name)
+            if latency is None:
+                latency = self.latency[name] = [0, 0.0, 0.0, [0] * (len(LATENCY_BOUNDS) + 1)]
+            latency[0] += 1
+            latency[1] += elapsed
+            latency[2] = max(latency[2], elapsed)
+            latency[3][bisect.bisect_left(LATENCY_BOUNDS, elapsed)] += 1
+            
+    def snapshot(self):
+        """Copy the counters into plain dictionaries."""
+        records = {}
+        with self.lock:
+            for (name, levelno), count in self.records.items():
+                records.setdefault(name, {})[logging.getLevelName(levelno)] = count
+            handlers = dict((name, {
+                "count" : count, "total" : total, "max" : longest,
+                "histogram" : list(zip(LATENCY_BOUNDS + (None,), histogram)),
+            }) for name, (count, total, longest, histogram) in self.latency.items())
+        return records, handlers
+    
+_metrics = None
+_timer = getattr(time, "perf_counter", time.time)
+
+class _MetricsFilter(logging.Filter):
+    """Count the records handled by a logger. This filter never rejects records."""
+    
+    def filter(self, record):
+        """Count a record."""
+        metrics = _metrics
+        if metrics is not None:
+            metrics.count(record)
+        return True
+        
+_metrics_filter = _MetricsFilter()
+    
+class _TimedHandle(object):
+    """Replaces the ``handle`` method of a single handler, to time it."""
+    
+    def __init__(self, handler):
+        super(_TimedHandle, self).__init__()
+        self.handler = handler
+        self.handle = handler.handle
+        
+    def __call__(self, record):
+        """Time the handler's own ``handle`` method."""
+        metrics = _metrics
+        if metrics is None:
+            return self.handle(record)
+        start = _timer()
+        try:
+            return self.handle(record)
+        finally:
+            metrics.time(self.handler, _timer() - start)
+            
+def _logger_handlers(logger):
+    """The handlers a record logged to this logger is given to."""
+    handlers = []
+    while logger is not None:
+        handlers.extend(logger.handlers)
+        logger = logger.parent if logger.propagate else None
+    return handlers
+
+def _handler_tree(handler):
+    """A handler, and the targets it passes records on to."""
+    handlers = [handler]
+    targets = list(getattr(handler, "targets", None) or ())
+    if isinstance(getattr(handler, "target", None), logging.Handler):
+        targets.append(handler.target)
+    for target in targets:
+        if isinstance(target, logging.Handler) and target is not handler:
+            handlers.extend(_handler_tree(target))
+    return handlers
+            
+def _instrument_handler(handler):
+    """Time a handler, and its targets."""
+    for item in _handler_tree(handler):
+        if not isinstance(item.__dict__.get("handle"), _TimedHandle):
+            item.handle = _TimedHandle(item)
+            
+def _instrument_logger(logger):
+    """Count a logger's records, and time its handlers."""
+    if _metrics_filter not in logger.filters:
+        logger.filters.insert(0, _metrics_filter)
+    for handler in logger.handlers:
+        _instrument_handler(handler)
+        
+def _uninstrument_logger(logger):
+    """Remove instrumentation from a logger and its handlers."""
+    if _metrics_filter in logger.filters:
+        logger.removeFilter(_metrics_filter)
+    for handler in logger.handlers:
+        for item in _handler_tree(handler):
+            if isinstance(item.__dict__.get("handle"), _TimedHandle):
+                del item.handle
+        
+def _pyshell_loggers():
+    """The loggers which pyshell instruments: the root logger, and every :class:`PyshellLogger`."""
+    return [ logger for logger in _all_loggers() 
+        if isinstance(logger, PyshellLogger) or logger is logging.getLogger() ]
+
+def enable_metrics(enabled=True):
+    """Turn logging instrumentation on or off.
+    
+    While enabled, the records handled by each logger are counted by level, 
+    and the time taken by each handler is collected in a histogram (see 
+    :data:`LATENCY_BOUNDS`). Only the root logger and :class:`PyshellLogger`
+    instances are instrumented: a filter counts the records logged to each
+    logger, and the ``handle`` method of each of their handlers (and of the
+    targets of buffering and background handlers) is wrapped, on that handler
+    alone, to time it. Nothing in :mod:`logging` itself is changed, so other
+    loggers, and handlers elsewhere in the process, are unaffected.
+    
+    Handlers added to a :class:`PyshellLogger` while instrumentation is
+    enabled are instrumented as they are added. Calling this function again
+    instruments any which were missed, e.g. new targets of a buffer. 
+    Turning instrumentation off removes it, and discards the collected counters.
+    """
+    global _metrics
+    if enabled:
+        if _metrics is None:
+            _metrics = _Metrics()
+        for logger in _pyshell_loggers():
+            _instrument_logger(logger)
+    elif _metrics is not None:
+        _metrics = None
+        for logger in _pyshell_loggers():
+            _uninstrument_logger(logger)
+    
+def reset_metrics():
+    """Reset the instrumentation counters, if instrumentation is enabled."""
+    global _metrics
+    if _metrics is not None:
+        _metrics = _Metrics()
+    
+def metrics_snapshot():
+    """Return a snapshot of the logging metrics, as a dictionary with the keys:
+    
+    - ``records``: For each logger, the number of records handled at each level.
+    - ``handlers``: For each handler (by name, or by class when unnamed), the 
+      ``count``, ``total`` and ``max`` time spent handling records, in seconds, 
+      and a ``histogram`` of ``(bound, count)`` pairs.
+    - ``buffers``: For each logger with a :class:`BufferHandler`, the number of
+      records (``buffered``) and approximate ``bytes`` held, the ``maxlen`` 
+      and the number of ``dropped`` records.
+    - ``queues``: For each :class:`AsyncTargetHandler`, the number of records
+      ``queued`` and ``dropped``.
+    - ``enabled``: Whether instrumentation is enabled.
+    
+    ``records`` and ``handlers`` are only collected while instrumentation is
+    enabled (see :func:`enable_metrics`). Buffers and queues are always reported.
+    """
+    metrics = _metrics
+    records, handlers = metrics.snapshot() if metrics is not None else ({}, {})
+    buffers = {}
+    queues = {}
+    for logger in _all_loggers():
+        name = "__root__" if logger is logging.getLogger() else logger.name
+        for handler in logger.handlers:
+            if isinstance(handler, BufferHandler):
+                buffers[name] = {
+                    "buffered" : len(handler.buffer), "bytes" : handler.buffered_bytes,
+                    "maxlen" : handler.maxlen, "dropped" : handler.dropped,
+                }
+            elif isinstance(handler, AsyncTargetHandler):
+                queues[handler.get_name() or handler.target.__class__.__name__] = {
+                    "queued" : handler.queue.qsize(), "dropped" : handler.dropped,
+                }
+    return {"enabled" : metrics is not None, "records" : records, "handlers" : handlers, 
+        "buffers" : buffers, "queues" : queues}
+    
+def dump_metrics(name="pyshell.metrics", level=logging.INFO):
+    """Log a snapshot of the logging metrics.
+    
+    :param name: The logger to use.
+    :param level: The level to log at.
+    
+    The full snapshot is attached to the record as its ``metrics`` attribute,
+    which :class:`JSONFormatter` will include.
+    """
+    snapshot = metrics_snapshot()
+    logging.getLogger(name).log(level, 
+        "Logging metrics: %d records handled, %d buffered, %d dropped", 
+        sum(sum(counts.values()) for counts in snapshot["records"].values()),
+        sum(buffer["buffered"] for buffer in snapshot["buffers"].values()),
+        sum(item["dropped"] for item in list(snapshot["buffers"].values()) + list(snapshot["queues"].values())),
+        extra={"metrics" : snapshot})
+    return snapshot
+
+_dumper = None
+
+def start_metrics_dump(interval=60.0, name="pyshell.metrics", level=logging.INFO):
+    """Dump the logging metrics periodically, from a background thread.
+    
+    :param interval: The time between dumps, in seconds.
+    :param name: The logger to use.
+    :param level: The level to log at.
+    
+    Any previous periodic dump is stopped. See :func:`dump_metrics`.
+    """
+    global _dumper
+    stop_metrics_dump()
+    if isinstance(level, six.string_types):
+        level = logging.getLevelName(level)
+    stop = threading.Event()
+    def dump():
+        """Dump metrics until stopped."""
+        while not stop.wait(interval):
+            dump_metrics(name, level)
+    thread = threading.Thread(target=dump, name="dump_metrics({0})".format(name))
+    thread.daemon = True
+    thread.start()
+    _dumper = (thread, stop)
+    
+def stop_metrics_dump():
+    """Stop the periodic dump started by :func:`start_metrics_dump`."""
+    global _dumper
+    if _dumper is not None:
+        thread, stop = _dumper
+        stop.set()
+        thread.join()
+        _dumper = None
+        
 def _showwarning(message, category, filename, lineno, file=None, line=None):
     """docstring for showwarning"""
     logger = getLogger("py.warnings")
@@ -418,9 +1708,17 @@ logging.captureWarnings = captureWarnings
     
 logging.addLevelName(25,'STATUS')
 
+def _level_names():
+    """Return a mapping of level names to level numbers."""
+    if hasattr(logging, "getLevelNamesMapping"):
+        return logging.getLevelNamesMapping()
+    names = getattr(logging, "_nameToLevel", None)
+    if names is None:
+        names = dict((n, l) for n, l in logging._levelNames.items() if isinstance(l, int))
+    return dict(names)
+
 this = sys.modules[__name__]
-for l,n in logging._levelNames.items():
-    if isinstance(l,int):
-        setattr(this,n,l)
+for n,l in _level_names().items():
+    setattr(this,n,l)
     
         
\ No newline at end of file
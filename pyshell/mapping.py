@@ -34,6 +34,10 @@ from __future__ import (absolute_import, unicode_literals, division,
 # Standard Python Modules
 import os
 import collections
+try:
+    import collections.abc as collections_abc
+except ImportError:
+    collections_abc = collections
 import abc
 import re
 import yaml
@@ -60,14 +64,14 @@ def reformat(d, nt):
     
     """
     #pylint: disable=C0103
-    if not isinstance(d, collections.Mapping):
+    if not isinstance(d, collections_abc.Mapping):
         return d
     e = nt()
     for k in d:
         v = d.get(k)
-        if isinstance(v, collections.Mapping):
+        if isinstance(v, collections_abc.Mapping):
             e[k] = reformat(v, nt)
-        elif ( isinstance(v, collections.Sequence) 
+        elif ( isinstance(v, collections_abc.Sequence) 
             and not isinstance(v, six.string_types) ):
             e[k] = [ reformat(i, nt) for i in v ]
         else:
@@ -87,12 +91,12 @@ def flatten(d, stump="", sequence=False, separator=".", dt=dict):
     
     """
     o = dt()
-    if ( isinstance(d, collections.Sequence)
+    if ( isinstance(d, collections_abc.Sequence)
         and not isinstance(d, six.string_types) and
         sequence):
         for i,iv in enumerate(v):
             o.update(flatten(iv, nk+str(i), sequence, separator))
-    elif isinstance(d, collections.Mapping):    
+    elif isinstance(d, collections_abc.Mapping):    
         for k,v in d.items():
             nk = separator.join((stump,k)) if stump else k
             o.update(flatten(v, nk, sequence, separator))
@@ -109,7 +113,7 @@ def expand(d, sequence=False, separator=".", dt=dict):
     :param dt: The final output type for all levels of the nested dictionary.
     
     Each key with the `separator` will become a nested dictionary key in the final dictionary."""
-    if isinstance(d, collections.Mapping):
+    if isinstance(d, collections_abc.Mapping):
         o = dt()
         for k,v in d.items():
             ks = k.split(separator)
@@ -137,18 +141,18 @@ def advanceddeepmerge(d, u, s, sequence=True, invert=False, inplace=True):
     
     """
     #pylint: disable=C0103
-    if isinstance(d, collections.Mapping) and not inplace:
+    if isinstance(d, collections_abc.Mapping) and not inplace:
         e = type(d)(**d)
     else:
         e = d
     if (not hasattr(u,'__len__')) or len(u)==0:
         return e
     for k, v in u.items():
-        if isinstance(v, collections.Mapping):
+        if isinstance(v, collections_abc.Mapping):
             r = advanceddeepmerge(d.get(k, s()), v, s, sequence, invert, inplace)
             e[k] = r
-        elif (sequence and isinstance(v, collections.Sequence) and
-            isinstance(d.get(k, None), collections.Sequence) and not
+        elif (sequence and isinstance(v, collections_abc.Sequence) and
+            isinstance(d.get(k, None), collections_abc.Sequence) and not
             (isinstance(v, six.string_types) or 
             isinstance(d.get(k, None), six.string_types))):
             if invert:
@@ -176,14 +180,14 @@ def deepmerge(d, u, s, invert=False, inplace=True):
     
     """
     #pylint: disable=C0103
-    if isinstance(d, collections.Mapping) and not inplace:
+    if isinstance(d, collections_abc.Mapping) and not inplace:
         e = type(d)(**d)
     else:
         e = d
     if (not hasattr(u,'__len__')) or len(u)==0:
         return e
     for k, v in u.items():
-        if isinstance(v, collections.Mapping):
+        if isinstance(v, collections_abc.Mapping):
             r = deepmerge(d.get(k, s()), v, s, invert=invert, inplace=inplace)
             e[k] = r
         elif invert:
@@ -194,7 +198,7 @@ def deepmerge(d, u, s, invert=False, inplace=True):
         
 
 @six.add_metaclass(abc.ABCMeta)
-class MutableMappingBase(collections.MutableMapping):
+class MutableMappingBase(collections_abc.MutableMapping):
     """Base class for mutable mappings which store things in an internal dictionary.
     
     This class implements a full dictionary interface, including pretty-printing,
@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+#
+#  sync.py
+#  pyshell
+#
+"""
+.. currentmodule: pyshell.sync
+
+:mod:`sync` – In-process incremental file copies
+================================================
+
+A small replacement for ``rsync -a --partial -u`` when both the origin and the
+destination are local paths. Trees are walked with :func:`os.scandir`, files
+are compared by size and modification time against a :class:`Manifest` from
+the last copy, and changed files are copied in a pool of threads using
+:func:`os.copy_file_range` or :func:`os.sendfile` where they are available.
+
+As with ``rsync``, an origin ending in a path separator copies the contents
+of the origin directory, and an origin without one copies the directory
+itself into the destination.
+
+.. note::
+    Files whose size and modification time match the manifest are skipped
+    without looking at the destination, so changes made directly to the
+    destination are not noticed. Delete the manifest to check every file.
+
+.. autoclass::
+    NativeSync
+    :members:
+
+.. autoclass::
+    Manifest
+    :members:
+
+.. autoclass::
+    NativeProcess
+    :members:
+
+.. autofunction::
+    scan
+
+"""
+
+from __future__ import (absolute_import, unicode_literals, division,
+                        print_function)
+
+import os, os.path
+import sys
+import io
+import json
+import time
+import errno
+import shutil
+import stat
+import threading
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir
+except ImportError: # pragma: no cover
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+__all__ = ['NativeSync', 'NativeProcess', 'Manifest', 'scan']
+
+CHUNKSIZE = 2**23
+
+class SyncCancelled(Exception):
+    """Raised when a copy is cancelled."""
+    pass
+
+def _signature(st):
+    """The ``(size, mtime)`` signature of a file's :func:`os.lstat` result,
+    with the modification time in nanoseconds."""
+    mtime = getattr(st, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = int(st.st_mtime * 1e9)
+    return [st.st_size, mtime]
+
+def _entries(path, onerror=None):
+    """Yield ``(name, stat)`` for each entry in a directory, without
+    following symbolic links. Entries which can't be examined are passed to
+    ``onerror`` with the error and skipped, or the error is raised."""
+    if scandir is not None:
+        for entry in scandir(path):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError as e:
+                if onerror is None:
+                    raise
+                onerror(entry.name, e)
+                continue
+            yield entry.name, st
+    else: # pragma: no cover
+        for name in os.listdir(path):
+            try:
+                st = os.lstat(os.path.join(path, name))
+            except OSError as e:
+                if onerror is None:
+                    raise
+                onerror(name, e)
+                continue
+            yield name, st
+
+def walk(root, onerror=None):
+    """Walk a tree, yielding ``(relpath, stat)`` for every directory, file and
+    symbolic link below ``root``. Directories are yielded before their contents.
+
+    Like :func:`os.walk`, errors reading a directory or an entry are raised,
+    unless ``onerror`` is given. It is then called with the path (relative to
+    ``root``) and the error, and the walk skips that path and carries on.
+    """
+    stack = [""]
+    while stack:
+        relpath = stack.pop()
+        def failed(name, e):
+            """Report an entry of this directory which can't be examined."""
+            onerror(os.path.join(relpath, name) if relpath else name, e)
+        try:
+            entries = list(_entries(os.path.join(root, relpath) if relpath else root,
+                onerror=failed if onerror is not None else None))
+        except OSError as e:
+            if onerror is None:
+                raise
+            onerror(relpath, e)
+            continue
+        for name, st in entries:
+            child = os.path.join(relpath, name) if relpath else name
+            yield child, st
+            if stat.S_ISDIR(st.st_mode):
+                stack.append(child)
+
+def _copy_contents(fsrc, fdst):
+    """Copy the contents of one open file to another, in the kernel if we can."""
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while os.copy_file_range(infd, outfd, CHUNKSIZE):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            offset = os.lseek(infd, 0, os.SEEK_CUR)
+            while True:
+                sent = os.sendfile(outfd, infd, offset, CHUNKSIZE)
+                if not sent:
+                    return
+                offset += sent
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL):
+                raise
+            os.lseek(infd, offset, os.SEEK_SET)
+    shutil.copyfileobj(fsrc, fdst, 2**20)
+
+if hasattr(os, 'replace'):
+    _replace = os.replace
+else: # pragma: no cover
+    def _replace(src, dst):
+        """Replace ``dst`` with ``src``."""
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+def copy_file(src, dst):
+    """Copy a file with its permissions and modification time. The copy is
+    written to a hidden partial file next to ``dst``, which replaces ``dst``
+    only once the copy is complete."""
+    partial = os.path.join(os.path.dirname(dst), ".{0}.partial".format(os.path.basename(dst)))
+    try:
+        with io.open(src, 'rb') as fsrc:
+            with io.open(partial, 'wb') as fdst:
+                _copy_contents(fsrc, fdst)
+        shutil.copystat(src, partial)
+        _replace(partial, dst)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+def copy_link(src, dst):
+    """Copy a symbolic link."""
+    target = os.readlink(src)
+    if os.path.lexists(dst):
+        if os.path.islink(dst) and os.readlink(dst) == target:
+            return
+        _remove(dst)
+    os.symlink(target, dst)
+
+def _remove(path):
+    """Remove a file, link or directory tree."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+class Manifest(object):
+    """The signatures of the files copied from an origin to a destination.
+
+    :param filename: The file where the manifest is kept, or ``None`` to keep
+        it only in memory.
+    :param origin: The origin directory.
+    :param destination: The destination directory.
+
+    A saved manifest which was made for a different origin or destination is
+    ignored. Manifests made by :func:`scan` also record the modification time
+    of each directory in :attr:`directories`.
+    """
+
+    version = 1
+
+    def __init__(self, filename=None, origin=None, destination=None):
+        super(Manifest, self).__init__()
+        self.filename = filename
+        self.origin = origin
+        self.destination = destination
+        self.files = {}
+        self.directories = {}
+        if self.filename is not None:
+            self.load()
+
+    def load(self):
+        """Load the manifest from :attr:`filename`, if it exists."""
+        try:
+            with io.open(self.filename, 'r', encoding='utf-8') as stream:
+                data = json.load(stream)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('version') == self.version and data.get('origin') == self.origin \
+            and data.get('destination') == self.destination:
+            self.files = data.get('files', {})
+            self.directories = data.get('directories', {})
+
+    def save(self):
+        """Save the manifest to :attr:`filename`."""
+        if self.filename is None:
+            return
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        data = json.dumps(dict(version=self.version, origin=self.origin,
+            destination=self.destination, files=self.files,
+            directories=self.directories), ensure_ascii=True)
+        partial = self.filename + ".partial"
+        with io.open(partial, 'w', encoding='utf-8') as stream:
+            stream.write(data if isinstance(data, type("")) else data.decode('ascii'))
+        _replace(partial, self.filename)
+
+    def matches(self, relpath, signature):
+        """Whether a file is unchanged since it was last copied."""
+        return self.files.get(relpath) == signature
+
+    def children(self):
+        """A mapping of each directory to the names of the files and
+        directories it contained."""
+        children = dict((relpath, []) for relpath in self.directories)
+        for relpath in list(self.files) + list(self.directories):
+            if relpath:
+                parent, name = os.path.split(relpath)
+                children.setdefault(parent, []).append(name)
+        return children
+
+def scan(root, manifest):
+    """Find the files and directories below ``root`` which changed since the
+    ``manifest`` was made.
+
+    :returns: A list of changed paths, relative to ``root``, and a new
+        :class:`Manifest` for the tree.
+
+    Directories whose modification time matches the manifest contain the
+    same entries as before, so they are not read again, and only the
+    entries recorded in the manifest are checked. Editing a file in place
+    doesn't change its directory's modification time, so every file is
+    still checked.
+    """
+    current = Manifest(None, manifest.origin, manifest.destination)
+    current.filename = manifest.filename
+    children = manifest.children()
+    changed = []
+    stack = [("", os.stat(root))]
+    while stack:
+        relpath, st = stack.pop()
+        path = os.path.join(root, relpath) if relpath else root
+        mtime = _signature(st)[1]
+        current.directories[relpath] = mtime
+        entries = None
+        if manifest.directories.get(relpath) == mtime:
+            try:
+                entries = [ (name, os.lstat(os.path.join(path, name)))
+                    for name in children.get(relpath, []) ]
+            except OSError:
+                entries = None
+        if entries is None:
+            entries = _entries(path)
+            if relpath:
+                changed.append(relpath)
+        for name, cst in entries:
+            child = os.path.join(relpath, name) if relpath else name
+            if stat.S_ISDIR(cst.st_mode):
+                stack.append((child, cst))
+            elif stat.S_ISREG(cst.st_mode) or stat.S_ISLNK(cst.st_mode):
+                signature = _signature(cst)
+                current.files[child] = signature
+                if not manifest.matches(child, signature):
+                    changed.append(child)
+    return changed, current
+
+class NativeSync(object):
+    """Copy new and changed files from an origin to a destination.
+
+    :param origin: The origin path.
+    :param destination: The destination directory.
+    :param delete: Whether to remove files from the destination which are not
+        in the origin.
+    :param dry_run: Report what would be copied, without copying anything.
+    :param manifest: The filename of the manifest, or ``None``.
+    :param workers: The number of threads used to copy files.
+    :param output: A function called with each line of output, with the
+        signature of :func:`print`. Progress lines are given ``end="\\r"``.
+    :param verbose: Whether to output the name of each copied file.
+    :param progress: Whether to output progress lines in the format of
+        ``rsync --info=progress2``.
+
+    """
+
+    workers = 4
+    """The default number of copying threads."""
+
+    def __init__(self, origin, destination, delete=False, dry_run=False,
+        manifest=None, workers=None, output=None, verbose=False, progress=False):
+        super(NativeSync, self).__init__()
+        if not origin.endswith(os.sep):
+            destination = os.path.join(destination, os.path.basename(origin))
+        self.origin = os.path.abspath(origin)
+        self.destination = os.path.abspath(destination)
+        self.delete = delete
+        self.dry_run = dry_run
+        self.manifest = Manifest(manifest, self.origin, self.destination)
+        if workers is not None:
+            self.workers = workers
+        self.output = output if output is not None else print
+        self.verbose = verbose
+        self.progress = progress
+        self.cancelled = threading.Event()
+        self.errors = 0
+        self.copied = 0
+        self.transferred = 0
+        self.deleted = 0
+        self._total = 0
+        self._started = None
+        self._seen = set()
+        self._directories = []
+        self._directory_set = set()
+
+    def _touched(self, relpath):
+        """Note a destination directory whose times must be restored."""
+        if relpath not in self._directory_set:
+            self._directory_set.add(relpath)
+            self._directories.append(relpath)
+
+    def _plan(self):
+        """Walk the origin, creating directories and links, and return the
+        files which must be copied along with the new manifest entries."""
+        files = {}
+        copies = []
+        for relpath, st in walk(self.origin, onerror=self._unreadable):
+            if self.cancelled.is_set():
+                raise SyncCancelled()
+            self._seen.add(relpath)
+            target = os.path.join(self.destination, relpath)
+            if stat.S_ISDIR(st.st_mode):
+                if not os.path.isdir(target):
+                    self._report(relpath + os.sep)
+                    try:
+                        if not self.dry_run:
+                            os.makedirs(target)
+                    except OSError as e:
+                        self.errors += 1
+                        self.output("sync: failed to make {0}: {1}".format(relpath, e))
+                        continue
+                    self._touched(relpath)
+            elif stat.S_ISLNK(st.st_mode):
+                try:
+                    if not self.dry_run:
+                        copy_link(os.path.join(self.origin, relpath), target)
+                except (IOError, OSError) as e:
+                    self.errors += 1
+                    self.output("sync: failed to copy {0}: {1}".format(relpath, e))
+            elif stat.S_ISREG(st.st_mode):
+                signature = _signature(st)
+                if self.manifest.matches(relpath, signature) or not self._changed(target, st):
+                    files[relpath] = signature
+                else:
+                    copies.append((relpath, signature))
+                    self._touched(os.path.dirname(relpath))
+        return files, copies
+
+    def _unreadable(self, relpath, error):
+        """Report a path in the origin which can't be read. Like rsync, the
+        sync carries on without it and exits with code 23."""
+        self.errors += 1
+        self.output("sync: failed to read {0}: {1}".format(relpath or ".", error))
+
+    def _changed(self, target, st):
+        """Whether the destination file is missing or differs from the origin,
+        using the size and modification time (in whole seconds). Newer files
+        in the destination are left alone."""
+        try:
+            current = os.lstat(target)
+        except OSError:
+            return True
+        if int(current.st_mtime) > int(st.st_mtime):
+            return False
+        return current.st_size != st.st_size or int(current.st_mtime) != int(st.st_mtime)
+
+    def _copy(self, item):
+        """Copy a single file."""
+        relpath, signature = item
+        if self.cancelled.is_set():
+            return relpath, signature, SyncCancelled()
+        try:
+            if not self.dry_run:
+                copy_file(os.path.join(self.origin, relpath),
+                    os.path.join(self.destination, relpath))
+        except (IOError, OSError) as e:
+            return relpath, signature, e
+        return relpath, signature, None
+
+    def _delete(self, keep):
+        """Remove destination files which are not in the origin."""
+        for relpath, st in list(walk(self.destination)):
+            if self.cancelled.is_set():
+                raise SyncCancelled()
+            if relpath in self._seen:
+                continue
+            parent = os.path.dirname(relpath)
+            if parent and parent not in self._seen:
+                continue
+            self._report("deleting {0}".format(relpath))
+            self.deleted += 1
+            if not self.dry_run:
+                _remove(os.path.join(self.destination, relpath))
+            keep.pop(relpath, None)
+
+    def _report(self, line):
+        """Output a line, if verbose."""
+        if self.verbose:
+            self.output(line)
+
+    def _report_progress(self):
+        """Output a line of progress."""
+        if not self.progress:
+            return
+        elapsed = max(time.time() - self._started, 1e-6)
+        rate = self.transferred / elapsed
+        percent = int(100 * self.transferred / self._total) if self._total else 100
+        remaining = int((self._total - self.transferred) / rate) if rate else 0
+        for unit in ("B", "kB", "MB", "GB"):
+            if rate < 1000 or unit == "GB":
+                break
+            rate /= 1000
+        self.output("{0:>15,d} {1:>3d}% {2:>7.2f}{3}/s {4:d}:{5:02d}:{6:02d}".format(
+            self.transferred, percent, rate, unit,
+            remaining // 3600, remaining // 60 % 60, remaining % 60), end="\r")
+
+    def run(self):
+        """Copy the files, returning an exit status like ``rsync``'s: 0 for
+        success, 20 if the copy was cancelled and 23 if some files could not
+        be copied."""
+        self._started = time.time()
+        files = None
+        try:
+            if not os.path.isdir(self.destination) and not self.dry_run:
+                os.makedirs(self.destination)
+            files, copies = self._plan()
+            self._total = sum(signature[0] for _, signature in copies)
+            reported = time.time()
+            pool = ThreadPool(max(1, self.workers))
+            try:
+                for relpath, signature, error in pool.imap_unordered(self._copy, copies):
+                    if isinstance(error, SyncCancelled):
+                        continue
+                    elif error is not None:
+                        self.errors += 1
+                        self.output("sync: failed to copy {0}: {1}".format(relpath, error))
+                        continue
+                    self._report(relpath)
+                    files[relpath] = signature
+                    self.copied += 1
+                    self.transferred += signature[0]
+                    if time.time() - reported > 0.5:
+                        self._report_progress()
+                        reported = time.time()
+            finally:
+                pool.close()
+                pool.join()
+            if self.cancelled.is_set():
+                raise SyncCancelled()
+            if self.delete and self.errors:
+                # Like rsync, don't delete files which may only be missing
+                # from the origin because they couldn't be read.
+                self.output("sync: IO error encountered -- skipping file deletion")
+            elif self.delete:
+                self._delete(files)
+            self._report_progress()
+        except SyncCancelled:
+            status = 20
+        else:
+            status = 23 if self.errors else 0
+        finally:
+            if files is not None and not self.dry_run:
+                self._finish(files)
+        if status == 0 and self.errors:
+            status = 23
+        return status
+
+    def _finish(self, files):
+        """Copy directory times and permissions, and save the manifest.
+        Errors are reported and counted, rather than raised, so that they
+        don't hide an error from the copy itself."""
+        # Directory times and permissions are copied last, as copying
+        # files into a directory changes its modification time.
+        for relpath in reversed(self._directories):
+            try:
+                shutil.copystat(os.path.join(self.origin, relpath),
+                    os.path.join(self.destination, relpath))
+            except (IOError, OSError) as e:
+                self.errors += 1
+                self.output("sync: failed to set times on {0}: {1}".format(relpath or ".", e))
+        self.manifest.files = files
+        self.manifest.directories = {}
+        try:
+            self.manifest.save()
+        except (IOError, OSError) as e:
+            self.errors += 1
+            self.output("sync: failed to save the manifest: {0}".format(e))
+
+class NativeProcess(object):
+    """Run a :class:`NativeSync` in a thread, with the parts of the interface
+    of :class:`subprocess.Popen` used by :mod:`pyshell.backup`.
+
+    :param args: ``rsync`` style arguments, ending with the origin and
+        destination. ``-n``, ``-v``, ``--del`` and ``--info=progress2`` are
+        understood, and other options are ignored.
+    :param manifest: The filename of the manifest.
+
+    Output is written to a pipe, available as :attr:`stdout`.
+    """
+
+    def __init__(self, args, manifest=None, workers=None):
+        super(NativeProcess, self).__init__()
+        args = list(args)
+        destination = args.pop()
+        origin = args.pop()
+        readfd, self._writefd = os.pipe()
+        self.stdout = io.open(readfd, 'rb', buffering=0)
+        self.returncode = None
+        self.sync = NativeSync(origin, destination,
+            delete = '--del' in args or '--delete' in args,
+            dry_run = '-n' in args or '--dry-run' in args,
+            verbose = '-v' in args or '--verbose' in args,
+            progress = '--info=progress2' in args,
+            manifest = manifest, workers = workers, output = self._write)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sync({0})".format(origin))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write(self, line, end="\n"):
+        """Write a line of output to the pipe."""
+        data = (line + end).encode('utf-8')
+        with self._lock:
+            while data:
+                data = data[os.write(self._writefd, data):]
+
+    def _run(self):
+        """Run the copy."""
+        try:
+            returncode = self.sync.run()
+        except Exception as e:
+            self._write("sync: {0}".format(e))
+            returncode = 1
+        finally:
+            os.close(self._writefd)
+        self.returncode = returncode
+
+    def poll(self):
+        """Return the exit status, or ``None`` if the copy is still running."""
+        return self.returncode
+
+    def wait(self):
+        """Wait for the copy to finish, and return the exit status."""
+        while self._thread.is_alive():
+            self._thread.join(0.1)
+        return self.returncode
+
+    def terminate(self):
+        """Stop the copy after the files currently being copied."""
+        self.sync.cancelled.set()
+
+    kill = terminate
@@ -11,13 +11,27 @@ from __future__ import (absolute_import, unicode_literals, division,
                         print_function)
 
 import shutil, os, os.path
+import sys
+import time
+import glob
+import argparse
 import pyshell.backup
 import nose.tools as nt
 import warnings
 from nose.plugins.skip import Skip,SkipTest
 from subprocess import CalledProcessError, Popen, PIPE
 import shlex
-from .util import dests_from_argparse, on_travis_ci
+import tempfile
+from .util import dests_from_argparse, on_travis_ci, run_python
+
+STARTUP_BUDGET = 1.0
+"""The most time (in seconds) starting ``BackupEngine.script()`` may take,
+up to reporting a missing target."""
+
+FAKE_RSYNC = """#!/bin/sh
+echo "$@" >> "{calls}"
+echo "rsync  version 3.1.0  protocol version 31"
+"""
 
 
 def clear_dir(tdir):
@@ -32,6 +46,27 @@ def make_files(tdir,N):
     for i in range(N):
         open("%s%s.%03d.test" % (tdir,fname,i),'w').close()
     
+class TemporaryRoot(object):
+    """A temporary directory, ``self.root``, for each test, which fake
+    commands can record their ``calls`` in."""
+    
+    def setup(self):
+        """Make the temporary directory."""
+        self.root = tempfile.mkdtemp()
+        self.calls = os.path.join(self.root, 'calls')
+        
+    def teardown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root)
+        
+    def fake(self, name, template, **kwargs):
+        """Write an executable script from a template, returning its path."""
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as stream:
+            stream.write(template.format(calls=self.calls, **kwargs))
+        os.chmod(path, 0o755)
+        return path
+    
     
 class test_BackupEngine(object):
     """pyshell.backup.BackupEngine"""
@@ -39,7 +74,10 @@ class test_BackupEngine(object):
     @nt.raises(CalledProcessError)
     def test_command_change(self):
         """Change command to 'scp' fails."""
+        if pyshell.backup.which('scp') is None:
+            raise SkipTest("scp is not installed")
         engine = pyshell.backup.BackupEngine(cmd='scp')
+        engine._cmd_version
         
     def test_attrs(self):
         """BackupEngine attributes"""
@@ -99,6 +137,714 @@ class test_BackupEngine(object):
     pass
     
 
+def sleeper(name, seconds=0.1, **kwargs):
+    """Make a destination which runs python, sleeping, instead of rsync."""
+    path = os.path.dirname(__file__) + os.path.sep
+    return pyshell.backup._BackupDestination(name, command=sys.executable,
+        origin=kwargs.pop("origin", path), destination=kwargs.pop("destination", path), **kwargs)
+    
+class test_BackupStartup(TemporaryRoot):
+    """pyshell.backup.BackupEngine.script() startup"""
+    
+    def setup(self):
+        """Put a fake rsync on the path."""
+        super(test_BackupStartup, self).setup()
+        self.fake('rsync', FAKE_RSYNC)
+        self.env = { str('PATH'): str(os.pathsep.join([self.root, os.environ.get('PATH', '')])),
+            str('XDG_CACHE_HOME'): str(os.path.join(self.root, 'cache')),
+            str('XDG_DATA_HOME'): str(os.path.join(self.root, 'data')),
+            str('PYTHONIOENCODING'): str('utf-8') }
+        
+    def script(self, *args, **kwargs):
+        """Run the backup script."""
+        return run_python("-c", "from pyshell.backup import BackupEngine; BackupEngine.script()", 
+            *args, env=self.env, cwd=self.root, **kwargs)
+        
+    def probes(self):
+        """The number of times rsync was run."""
+        if not os.path.exists(self.calls):
+            return 0
+        with open(self.calls) as stream:
+            return len(stream.readlines())
+        
+    def test_lazy(self):
+        """rsync is only run to show help"""
+        self.script(returncode=2)
+        nt.eq_(self.probes(), 0)
+        stdout, _ = self.script("--help")
+        nt.ok_(str("Using rsync  version 3.1.0") in stdout)
+        nt.eq_(self.probes(), 1)
+        
+    def test_cached(self):
+        """The rsync version is cached"""
+        self.script("--help")
+        self.script("--help")
+        nt.eq_(self.probes(), 1)
+        os.utime(os.path.join(self.root, 'rsync'), (0, 0))
+        self.script("--help")
+        nt.eq_(self.probes(), 2)
+        
+    def test_example(self):
+        """The shipped example configuration loads"""
+        example = os.path.join(os.path.dirname(pyshell.backup.__file__), 'Backup_example.yml')
+        stdout, _ = self.script("--config", example, "--help")
+        for mode in ("apps", "scratch", "offsite"):
+            nt.ok_(str(mode) in stdout.split(), mode)
+        
+    def test_reserved(self):
+        """Targets named for settings are still targets, with a warning"""
+        config = os.path.join(self.root, 'Backup.yml')
+        with open(config, 'w') as stream:
+            stream.write("history_size: 10\nhistory:\n  origin: a/\n  destination: b/\n")
+        engine = pyshell.backup.BackupEngine()
+        engine.init()
+        engine.arguments(["--config", config, "history"])
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            engine.configure()
+        nt.ok_(any("Target 'history' is named for a setting" in str(warning.message) 
+            for warning in w), [ str(warning.message) for warning in w ])
+        nt.eq_(engine._destinations['history'].destination, 'b/')
+        nt.eq_(engine.history_size, 10)
+        
+    def test_startup(self):
+        """BackupEngine.script() is within its startup budget"""
+        import time
+        start = time.time()
+        self.script(returncode=2)
+        elapsed = time.time() - start
+        nt.ok_(elapsed < STARTUP_BUDGET, "Startup took {0:.3f}s".format(elapsed))
+        
+class test_BackupNative(TemporaryRoot):
+    """pyshell.backup._BackupDestination with the native command"""
+    
+    def setup(self):
+        """Make an origin tree."""
+        super(test_BackupNative, self).setup()
+        self.origin = os.path.join(self.root, 'origin') + os.path.sep
+        os.mkdir(self.origin)
+        make_files(self.origin, 3)
+        
+    def test_native(self):
+        """Copy with the native command"""
+        manifest = os.path.join(self.root, 'manifests', 'native.json')
+        destination = pyshell.backup._BackupDestination('native', 
+            command=pyshell.backup.NATIVE, origin=self.origin,
+            destination=os.path.join(self.root, 'destination'), manifest=manifest)
+        lines = []
+        destination.output = lambda destination, line: lines.append(line)
+        nt.ok_(destination.launch(['-a', '-v']))
+        destination.wait()
+        nt.eq_(destination.returncode, 0)
+        nt.ok_(not destination.running)
+        nt.eq_(len(lines), 3)
+        nt.eq_(sorted(os.listdir(os.path.join(self.root, 'destination'))), sorted(os.listdir(self.origin)))
+        nt.ok_(os.path.exists(manifest))
+        
+    def test_native_delete(self):
+        """Delete with the native command"""
+        os.mkdir(os.path.join(self.root, 'destination'))
+        open(os.path.join(self.root, 'destination', 'extra'), 'w').close()
+        destination = pyshell.backup._BackupDestination('native', 
+            command=pyshell.backup.NATIVE, origin=self.origin, delete=True,
+            destination=os.path.join(self.root, 'destination'))
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            nt.ok_(destination.launch(['-a']))
+        destination.wait()
+        nt.eq_(destination.returncode, 0)
+        nt.eq_(sorted(os.listdir(os.path.join(self.root, 'destination'))), sorted(os.listdir(self.origin)))
+        
+    def test_incremental(self):
+        """Give rsync only the changed paths"""
+        manifest = os.path.join(self.root, 'manifests', 'rsync.json')
+        destination = pyshell.backup._BackupDestination('rsync', origin=self.origin,
+            destination=os.path.join(self.root, 'destination'), manifest=manifest)
+        paths = destination.paths
+        nt.eq_(destination._incremental(paths), paths)
+        destination._returncode = 0
+        destination._finish_incremental()
+        nt.ok_(os.path.exists(manifest))
+        
+        changed = os.path.join(self.origin, sorted(os.listdir(self.origin))[0])
+        with open(changed, 'w') as stream:
+            stream.write("changed")
+        args = destination._incremental(paths)
+        nt.eq_(args[0], '--from0')
+        nt.eq_(args[2:], paths)
+        with open(destination._files_from, 'rb') as stream:
+            nt.eq_(stream.read(), os.path.basename(changed).encode('utf-8') + b"\0")
+        files_from = destination._files_from
+        destination._finish_incremental()
+        nt.ok_(not os.path.exists(files_from))
+        
+    def test_incremental_launch(self):
+        """Changed paths are found while waiting, not when launching"""
+        manifest = os.path.join(self.root, 'manifests', 'sleeper.json')
+        destination = sleeper('sleeper', origin=self.origin, manifest=manifest, incremental=True)
+        nt.ok_(destination.launch(["-c", "import sys; sys.exit(0)"]))
+        nt.ok_(destination.running)
+        nt.ok_(destination._preparing.is_set())
+        nt.ok_(not destination._process)
+        destination.wait()
+        nt.eq_(destination.returncode, 0)
+        nt.ok_(os.path.exists(manifest))
+        nt.eq_(destination._pargs[-2:], destination.paths)
+        
+    def test_incremental_default(self):
+        """Incremental runs are opt-in"""
+        engine = pyshell.backup.BackupEngine()
+        engine.set_destination('full', 'a/', 'b/')
+        engine.set_destination('changed', 'a/', 'b/', incremental=True)
+        nt.ok_(not engine._destinations['full'].incremental)
+        nt.ok_(engine._destinations['changed'].incremental)
+        
+    def test_incremental_full(self):
+        """Use full rsync runs when deleting"""
+        manifest = os.path.join(self.root, 'manifests', 'rsync.json')
+        destination = pyshell.backup._BackupDestination('rsync', origin=self.origin,
+            destination=os.path.join(self.root, 'destination'), manifest=manifest)
+        destination._pargs += ['--del']
+        nt.eq_(destination._incremental(destination.paths), destination.paths)
+        nt.eq_(destination._scanned, None)
+        
+    def test_remote(self):
+        """The native command skips remote paths"""
+        destination = pyshell.backup._BackupDestination('native', 
+            command=pyshell.backup.NATIVE, origin=self.origin,
+            destination="example.com:backup/")
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            nt.ok_(not destination.launch([]))
+        nt.eq_(len(w), 1)
+        
+class test_BackupScheduler(object):
+    """pyshell.backup._BackupScheduler"""
+    
+    def setup(self):
+        """Set up the launch record."""
+        self.started = []
+        self.most = 0
+        self.args = ["-c", "import time; time.sleep({0:f})".format(0.1)]
+        
+    def start(self, destination):
+        """Launch a destination, tracking concurrency."""
+        self.started.append(destination.name)
+        running = sum(1 for other in self.scheduler.running if other.running)
+        self.most = max(self.most, running + 1)
+        return destination.launch(self.args)
+        
+    def test_concurrency(self):
+        """Concurrency is limited."""
+        self.scheduler = pyshell.backup._BackupScheduler(self.start, concurrency=2)
+        for i in range(5):
+            self.scheduler.add(sleeper("job{0:d}".format(i)))
+        self.scheduler.run()
+        nt.eq_(len(self.started), 5)
+        nt.eq_(self.most, 2)
+        
+    def test_host_concurrency(self):
+        """Concurrency is limited by host."""
+        self.scheduler = pyshell.backup._BackupScheduler(self.start, host_concurrency=1)
+        for i in range(3):
+            self.scheduler.add(sleeper("job{0:d}".format(i)))
+        self.scheduler.run()
+        nt.eq_(self.most, 1)
+        
+    def test_priority(self):
+        """Destinations are launched by priority."""
+        self.scheduler = pyshell.backup._BackupScheduler(self.start, concurrency=1)
+        self.scheduler.add(sleeper("low", priority=-1))
+        self.scheduler.add(sleeper("first"))
+        self.scheduler.add(sleeper("high", priority=1))
+        self.scheduler.add(sleeper("second"))
+        self.scheduler.run()
+        nt.eq_(self.started, ["high", "first", "second", "low"])
+        
+    def test_cost(self):
+        """Costly destinations are launched first."""
+        self.scheduler = pyshell.backup._BackupScheduler(self.start, concurrency=1)
+        cheap, costly, urgent = sleeper("cheap"), sleeper("costly"), sleeper("urgent", priority=1)
+        cheap.cost, costly.cost = 1.0, 60.0
+        for destination in (cheap, costly, urgent):
+            self.scheduler.add(destination)
+        self.scheduler.run()
+        nt.eq_(self.started, ["urgent", "costly", "cheap"])
+        
+    def test_after(self):
+        """Destinations wait for their dependencies."""
+        self.scheduler = pyshell.backup._BackupScheduler(self.start)
+        self.scheduler.add(sleeper("second"), after=["first"])
+        self.scheduler.add(sleeper("first"))
+        self.scheduler.run()
+        nt.eq_(self.started, ["first", "second"])
+        
+    def test_failed(self):
+        """Destinations are skipped when their dependencies fail."""
+        self.scheduler = pyshell.backup._BackupScheduler(self.start)
+        self.args = ["-c", "import sys; sys.exit(1)"]
+        self.scheduler.add(sleeper("second"), after=["first"])
+        self.scheduler.add(sleeper("first"))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.scheduler.run()
+        nt.eq_(self.started, ["first"])
+        nt.eq_(self.scheduler.finished, {"first": False, "second": False})
+        
+    def test_host(self):
+        """Remote hosts are found."""
+        nt.eq_(sleeper("remote", destination="user@example.com:backup/").host, "example.com")
+        nt.eq_(sleeper("local").host, None)
+        
+FLAKY = """#!/bin/sh
+echo "$@" >> "{calls}"
+if [ $(wc -l < "{calls}") -le {failures} ]; then exit {code}; fi
+exit 0
+"""
+
+class test_BackupRetry(TemporaryRoot):
+    """pyshell.backup._BackupDestination retries and timeouts"""
+    
+    def flaky(self, failures, code=23, **kwargs):
+        """Make a destination whose command fails a number of times."""
+        command = self.fake('flaky', FLAKY, failures=failures, code=code)
+        path = self.root + os.path.sep
+        return pyshell.backup._BackupDestination('flaky', command=command, 
+            origin=path, destination=path, backoff=0.01, **kwargs)
+        
+    def run(self, destination):
+        """Run a destination to completion."""
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            nt.ok_(destination.launch(["-a"]))
+            destination.wait()
+        return w
+        
+    def arguments(self):
+        """The arguments of each call to the command."""
+        with open(self.calls) as stream:
+            return stream.read().splitlines()
+        
+    def test_retry(self):
+        """Retry retryable failures, resuming partial transfers"""
+        destination = self.flaky(2, retries=2)
+        self.run(destination)
+        nt.eq_(destination.returncode, 0)
+        nt.eq_(destination.attempts, 3)
+        nt.eq_(destination.status, "ok")
+        calls = self.arguments()
+        nt.ok_("--partial-dir" not in calls[0])
+        nt.ok_(calls[1].startswith("--partial-dir=.rsync-partial -a"))
+        nt.eq_(calls[1], calls[2])
+        
+    def test_retries_exhausted(self):
+        """Give up after the last retry"""
+        destination = self.flaky(5, retries=1)
+        self.run(destination)
+        nt.eq_(destination.returncode, 23)
+        nt.eq_(destination.attempts, 2)
+        nt.eq_(destination.status, "failed")
+        
+    def test_not_retryable(self):
+        """Don't retry other failures"""
+        destination = self.flaky(1, code=1, retries=3)
+        self.run(destination)
+        nt.eq_(destination.returncode, 1)
+        nt.eq_(destination.attempts, 1)
+        
+    def test_timeout(self):
+        """Terminate commands which run too long"""
+        destination = sleeper('slow', timeout=0.2, retries=2, retry_codes=[-15, 1])
+        start = time.time()
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            destination.launch(["-c", "import time; time.sleep(5)"])
+            destination.wait()
+        nt.ok_(time.time() - start < 2.0)
+        nt.eq_(destination.status, "timeout")
+        nt.eq_(destination.attempts, 1)
+        
+    def test_idle_timeout(self):
+        """Pass the idle timeout to rsync"""
+        destination = self.flaky(0, idle_timeout=30)
+        self.run(destination)
+        nt.ok_("--timeout=30" in self.arguments()[0].split())
+        
+    def test_kill_backoff(self):
+        """Kill destinations waiting to retry"""
+        import threading
+        destination = self.flaky(5, retries=3)
+        destination.backoff = 10.0
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            destination.launch(["-a"])
+            waiting = threading.Thread(target=destination.wait)
+            waiting.start()
+            while not destination._retrying.is_set():
+                time.sleep(0.01)
+            nt.ok_(destination.running)
+            destination.kill()
+            waiting.join(2.0)
+        nt.ok_(not waiting.is_alive())
+        nt.eq_(destination.attempts, 1)
+        nt.ok_(not destination.running)
+        
+    def test_backoff_slot(self):
+        """Destinations backing off make room for others"""
+        flaky = self.flaky(1, retries=1)
+        flaky.backoff = 1.0
+        other = sleeper("other")
+        def start(destination):
+            return destination.launch(["-a"] if destination is flaky else ["-c", "pass"])
+        scheduler = pyshell.backup._BackupScheduler(start, concurrency=1)
+        scheduler.add(flaky)
+        scheduler.add(other)
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            scheduler.run()
+        nt.eq_(scheduler.finished, {"flaky": True, "other": True})
+        nt.eq_(flaky.attempts, 2)
+        nt.ok_(other.progress.finished < flaky.progress.finished)
+        
+    def test_kill_waiting(self):
+        """Killed destinations are reaped by the thread waiting for them"""
+        import threading, signal
+        destination = sleeper("killed")
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            destination.launch(["-c", "import time; time.sleep(10)"])
+            waiting = threading.Thread(target=destination.wait)
+            waiting.start()
+            while destination._reaper is None:
+                time.sleep(0.01)
+            nt.ok_(not destination.kill())
+            waiting.join(2.0)
+        nt.ok_(not waiting.is_alive())
+        nt.ok_(not destination.running)
+        nt.eq_(destination.returncode, -signal.SIGTERM)
+        
+    def test_policy(self):
+        """Targets use the engine's policy by default"""
+        engine = pyshell.backup.BackupEngine()
+        engine.retries = 2
+        engine.set_destination('default', 'a/', 'b/')
+        engine.set_destination('custom', 'a/', 'b/', retries=4, timeout=60)
+        nt.eq_(engine._destinations['default'].retries, 2)
+        nt.eq_(engine._destinations['default'].timeout, None)
+        nt.eq_(engine._destinations['custom'].retries, 4)
+        nt.eq_(engine._destinations['custom'].timeout, 60)
+        nt.eq_(engine._destinations['custom'].retry_codes, (23, 24, 30, 35))
+        
+THROTTLED = """#!/bin/sh
+echo "$@" >> "{calls}"
+case "$*" in *short*) exit 0;; esac
+sleep 1
+"""
+
+class test_BackupThrottle(TemporaryRoot):
+    """pyshell.backup bandwidth and priority limits"""
+    
+    def setup(self):
+        """Make a command which records its arguments."""
+        super(test_BackupThrottle, self).setup()
+        self.command = self.fake('throttled', THROTTLED)
+        self.limits = {}
+        
+    def destination(self, name, **kwargs):
+        """Make a destination using the command."""
+        path = os.path.join(self.root, name) + os.path.sep
+        os.mkdir(path)
+        return pyshell.backup._BackupDestination(name, command=self.command,
+            origin=path, destination=path, **kwargs)
+        
+    def start(self, destination):
+        """Launch a destination, recording its bandwidth limit."""
+        self.limits[destination.name] = destination.bwlimit
+        return destination.launch(["-a"])
+        
+    def run(self, scheduler):
+        """Run the scheduler."""
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            scheduler.run()
+        
+    def test_share(self):
+        """Bandwidth is shared between destinations"""
+        scheduler = pyshell.backup._BackupScheduler(self.start, concurrency=2, bwlimit=100)
+        for name in ("short1", "short2", "short3"):
+            scheduler.add(self.destination(name))
+        self.run(scheduler)
+        nt.eq_(self.limits, {"short1": 50, "short2": 50, "short3": 50})
+        scheduler = pyshell.backup._BackupScheduler(self.start, bwlimit=90)
+        for name in ("short4", "short5", "short6"):
+            scheduler.add(self.destination(name))
+        self.run(scheduler)
+        nt.eq_(self.limits["short6"], 30)
+        share = pyshell.backup._BackupScheduler(self.start, bwlimit=100.0)._share(3)
+        nt.eq_(share, 33)
+        nt.ok_(isinstance(share, int))
+        
+    def test_restart(self):
+        """Running destinations are restarted with a larger share"""
+        scheduler = pyshell.backup._BackupScheduler(self.start, bwlimit=100, restart=True)
+        scheduler.add(self.destination("long"))
+        scheduler.add(self.destination("short"))
+        self.run(scheduler)
+        with open(self.calls) as stream:
+            calls = [ line.split() for line in stream if "long" in line ]
+        nt.eq_(len(calls), 2)
+        nt.eq_(calls[0][0], "--bwlimit=50")
+        nt.eq_(calls[1][:2], ["--bwlimit=100", "--partial-dir=.rsync-partial"])
+        nt.eq_(scheduler.finished, {"long": True, "short": True})
+        
+    def test_priority(self):
+        """Run with nice and ionice"""
+        destination = self.destination("short", nice=10, ionice="best-effort:7")
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            prefix = destination._prefix()
+        nt.eq_(prefix[:3], ["nice", "-n", "10"])
+        if pyshell.backup.which("ionice") is not None:
+            nt.eq_(prefix[3:], ["ionice", "-c", "2", "-n", "7"])
+        
+FAKE_SSH = """#!/bin/sh
+echo "$@" >> "{calls}"
+case "$*" in *down.example.com*) exit 255;; esac
+case "$*" in *"-O check"*) [ -e "{calls}.closed" ] && exit 255;; esac
+exit 0
+"""
+
+class test_BackupSSH(TemporaryRoot):
+    """pyshell.backup shared SSH connections"""
+    
+    def setup(self):
+        """Make a fake ssh."""
+        super(test_BackupSSH, self).setup()
+        self.ssh = self.fake('ssh', FAKE_SSH)
+        self.engine = pyshell.backup.BackupEngine()
+        self.engine.ssh = self.ssh
+        
+    def arguments(self):
+        """The arguments of each call to ssh."""
+        with open(self.calls) as stream:
+            return [ line.split() for line in stream ]
+        
+    def plan(self, **targets):
+        """Plan backups to the given destinations."""
+        for mode, destination in sorted(targets.items()):
+            self.engine.set_destination(mode, self.root + os.path.sep, destination)
+        self.engine._plan = [ (mode, []) for mode in sorted(targets) ]
+        
+    def test_shared(self):
+        """Targets on the same host share a connection"""
+        self.plan(a="user@example.com:a/", b="user@example.com:b/", 
+            c="other.org:c/", d=os.path.join(self.root, 'd'),
+            e="daemon.example.com::module/", f="rsync://daemon.example.com/module/")
+        self.engine._start_masters()
+        destinations = self.engine._destinations
+        nt.eq_(len(self.arguments()), 2)
+        nt.ok_(all("-fN" in call and "ControlMaster=yes" in call for call in self.arguments()))
+        nt.ok_(all("ControlPersist=3600" in call for call in self.arguments()))
+        nt.eq_(destinations['a'].rsh, destinations['b'].rsh)
+        nt.ok_(destinations['c'].rsh not in (None, destinations['a'].rsh))
+        nt.eq_(destinations['d'].rsh, None)
+        nt.eq_(destinations['e'].rsh, None)
+        nt.eq_(destinations['f'].rsh, None)
+        directory = self.engine._ssh_directory
+        nt.ok_(os.path.isdir(directory))
+        
+        self.engine.final()
+        exits = [ call for call in self.arguments() if "-O" in call ]
+        nt.eq_(sorted(call[-1] for call in exits), ["other.org", "user@example.com"])
+        nt.ok_(not os.path.exists(directory))
+        self.engine.final()
+        nt.eq_(len(self.arguments()), 4)
+        
+    def test_failed(self):
+        """Targets don't use connections which failed"""
+        self.plan(a="down.example.com:a/")
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            self.engine._start_masters()
+        nt.eq_(len(w), 1)
+        nt.eq_(self.engine._destinations['a'].rsh, None)
+        self.engine.final()
+        nt.eq_(len(self.arguments()), 1)
+        
+    def test_restart(self):
+        """Connections which closed are made again"""
+        master = pyshell.backup._SSHMaster("example.com", self.root, ssh=self.ssh)
+        nt.ok_(master.start())
+        nt.ok_(master.restart())
+        nt.eq_(len(self.arguments()), 2)
+        open(self.calls + ".closed", 'w').close()
+        master.restart()
+        calls = self.arguments()
+        nt.eq_(len(calls), 4)
+        nt.ok_("-fN" in calls[-1])
+        
+    def test_interrupted(self):
+        """Connections are closed when a run is interrupted"""
+        self.plan(a="user@example.com:a/")
+        self.engine.history = os.path.join(self.root, 'history')
+        self.engine._pargs = []
+        self.engine._opts = argparse.Namespace(prints=False)
+        def interrupt(destination):
+            raise KeyboardInterrupt()
+        self.engine._start_mode = interrupt
+        nt.assert_raises(KeyboardInterrupt, self.engine.do)
+        nt.eq_([ call[-1] for call in self.arguments() if "-O" in call ], ["user@example.com"])
+        nt.eq_(self.engine._ssh_directory, None)
+        
+    def test_rsh(self):
+        """rsync is given the shared connection"""
+        destination = pyshell.backup._BackupDestination('remote', command=self.ssh,
+            origin=self.root + os.path.sep, destination="example.com:backup/")
+        master = pyshell.backup._SSHMaster("example.com", self.root, ssh="ssh")
+        destination.rsh = master.rsh
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            destination.launch(["-a"])
+            destination.wait()
+        call = self.arguments()[0]
+        nt.eq_(call[:4], ["-e", "ssh", "-o", "ControlPath={0}".format(master.path)])
+        
+class test_BackupHistory(TemporaryRoot):
+    """pyshell.backup run history"""
+    
+    def setup(self):
+        """Make a history file."""
+        super(test_BackupHistory, self).setup()
+        self.filename = os.path.join(self.root, 'Backup.history')
+        
+    def report(self, elapsed, status="ok", dry_run=False):
+        """Make a report of a run of one target."""
+        return dict(started=0.0, finished=elapsed, elapsed=elapsed, dry_run=dry_run,
+            targets=[dict(target="docs", status=status, attempts=1, returncode=0,
+                elapsed=elapsed, transferred=int(1000 * elapsed), files=None)])
+        
+    def test_percentile(self):
+        """Percentiles by nearest rank"""
+        nt.eq_(pyshell.backup._percentile(range(1, 101), 50), 50)
+        nt.eq_(pyshell.backup._percentile(range(1, 101), 95), 95)
+        nt.eq_(pyshell.backup._percentile([3.0], 95), 3.0)
+        nt.eq_(pyshell.backup._percentile([], 50), None)
+        
+    def test_append(self):
+        """Keep a rolling history"""
+        history = pyshell.backup._History(self.filename, size=3)
+        for elapsed in range(1, 6):
+            history.append(self.report(float(elapsed)))
+        reports = history.load()
+        nt.eq_([ report['elapsed'] for report in reports ], [3.0, 4.0, 5.0])
+        nt.eq_(os.listdir(self.root), ['Backup.history'])
+        
+    def test_summary(self):
+        """Summarize successful runs"""
+        history = pyshell.backup._History(self.filename)
+        for elapsed in (1.0, 2.0, 3.0, 4.0):
+            history.append(self.report(elapsed))
+        history.append(self.report(100.0, dry_run=True))
+        history.append(self.report(50.0, status="failed"))
+        summary = history.summary()
+        nt.eq_(summary['docs']['runs'], 5)
+        nt.eq_(summary['docs']['p50'], 2.0)
+        nt.eq_(summary['docs']['p95'], 4.0)
+        nt.eq_(summary['docs']['throughput'], 1000.0)
+        nt.eq_(summary['docs']['last'], "failed")
+        nt.eq_(history.summary(['other']), {})
+        
+    def test_engine(self):
+        """Record runs and summarize them with --stats"""
+        origin = os.path.join(self.root, 'origin') + os.path.sep
+        os.mkdir(origin)
+        make_files(origin, 3)
+        config = os.path.join(self.root, 'Backup.yml')
+        with open(config, 'w') as stream:
+            stream.write("docs:\n  origin: {0}\n  destination: {1}\n  command: native\n".format(
+                origin, os.path.join(self.root, 'destination')))
+        env = { str('PYTHONIOENCODING'): str('utf-8'), 
+            str('XDG_CACHE_HOME'): str(os.path.join(self.root, 'cache')),
+            str('XDG_DATA_HOME'): str(os.path.join(self.root, 'data')) }
+        script = "from pyshell.backup import BackupEngine; BackupEngine.script()"
+        run_python("-c", script, "--config", config, "docs", env=env, cwd=self.root)
+        run_python("-c", script, "--config", os.path.relpath(config, origin), "docs", env=env, cwd=origin)
+        state = glob.glob(os.path.join(self.root, 'data', 'pyshell', 'backup', 'Backup-*'))
+        nt.eq_(len(state), 1)
+        nt.ok_(os.path.exists(os.path.join(state[0], 'manifests', 'docs.json')))
+        nt.ok_(not os.path.exists(os.path.join(self.root, 'Backup.manifests')))
+        nt.ok_(not os.path.exists(os.path.join(self.root, 'Backup.history')))
+        nt.ok_(not glob.glob(os.path.join(state[0], '*.partial')))
+        reports = pyshell.backup._History(os.path.join(state[0], 'history.jsonl')).load()
+        nt.eq_(len(reports), 2)
+        nt.eq_(reports[0]['targets'][0]['status'], "ok")
+        nt.eq_(reports[0]['targets'][0]['files'], 3)
+        nt.eq_(reports[1]['targets'][0]['files'], 0)
+        stdout, _ = run_python("-c", script, "--config", config, "--stats", env=env, cwd=origin)
+        lines = stdout.splitlines()
+        nt.eq_(lines[0].split()[:3], ["Target", "Runs", "p50"])
+        nt.eq_(lines[1].split()[:2], ["docs", "2"])
+        
+class test_BackupProgress(object):
+    """pyshell.backup._Progress"""
+    
+    def test_parse(self):
+        """Progress lines are parsed."""
+        progress = pyshell.backup._Progress()
+        nt.ok_(progress.parse("  1,238,099  45%  112.34MB/s    0:00:12 (xfr#5, to-chk=10/100)"))
+        nt.eq_(progress.transferred, 1238099)
+        nt.eq_(progress.percent, 45)
+        nt.eq_(progress.rate, "112.34MB/s")
+        nt.eq_(progress.eta, "0:00:12")
+        nt.ok_(not progress.parse("sending incremental file list"))
+        nt.ok_("1.2MB" in progress.line("main"))
+        
+    def test_capture(self):
+        """Output is captured, and progress is tracked."""
+        lines = []
+        destination = sleeper("capture")
+        destination.output = lambda destination, line : lines.append(line)
+        destination.launch(["-c", "import sys; sys.stdout.write("
+            "'file.txt\\n      1,024  50%    1.00kB/s    0:00:01\\r      2,048 100%    1.00kB/s    0:00:00\\n')"])
+        destination.wait()
+        nt.eq_(lines, ["file.txt"])
+        nt.eq_(destination.progress.transferred, 2048)
+        nt.eq_(destination.progress.percent, 100)
+        
+class test_backup_plan(object):
+    """pyshell.backup._backup_plan"""
+    
+    def plan(self, modes, **destinations):
+        """Plan with pseudo destinations, given as name=(triggers, after)."""
+        destinations = dict((name, pyshell.backup._BackupDestination(name, triggers=triggers, after=after))
+            for name, (triggers, after) in destinations.items())
+        return pyshell.backup._backup_plan(destinations, modes)
+        
+    def test_triggers(self):
+        """Shared triggers are planned once."""
+        plan = self.plan(["a", "b"], a=(["c"], []), b=(["c"], []), c=([], []))
+        nt.eq_([ name for name, _ in plan ], ["a", "c", "b"])
+        
+    def test_trigger_cycle(self):
+        """Trigger cycles are planned once."""
+        plan = self.plan(["a"], a=(["b"], []), b=(["a"], []))
+        nt.eq_(sorted(name for name, _ in plan), ["a", "b"])
+        
+    def test_after(self):
+        """Modes run after their planned dependencies."""
+        plan = self.plan(["a", "b"], a=([], ["b", "unplanned"]), b=([], []), unplanned=([], []))
+        nt.eq_(plan, [("b", []), ("a", ["b"])])
+        
+    @nt.raises(ValueError)
+    def test_cycle(self):
+        """Dependency cycles are errors."""
+        self.plan(["a"], a=(["b", "c"], ["c"]), b=([], ["a"]), c=([], ["b"]))
+        
+    @nt.raises(ValueError)
+    def test_missing(self):
+        """Missing triggers are errors."""
+        self.plan(["a"], a=(["b"], []))
+        
 class test_BackupScript(object):
     """pyshell.backup.BackupEngine.script()"""
     
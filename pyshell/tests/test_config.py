@@ -94,6 +94,114 @@ class test_Configuration(object):
         cfg.load(StringIO(""))
         assert cfg.store == {'a':'a'}
         
+    def test_make_sequence(self):
+        """.make() merges a sequence of files in order"""
+        self.CLASS(self.test_dict_A).save("Test.yaml")
+        self.CLASS(self.test_dict_B).save("TestB.yaml")
+        try:
+            cfg = self.CLASS.make(["Test.yaml", {"Hi":{"Z":1}}, "TestB.yaml"])
+        finally:
+            self.remove("TestB.yaml")
+        expected = dict(self.test_dict_C)
+        expected["Hi"]["Z"] = 1
+        nt.eq_(cfg.store, expected)
+        
+    def test_configure(self):
+        """.configure() loads files in order"""
+        self.CLASS(self.test_dict_A).save("Test.yaml")
+        self.CLASS(self.test_dict_B).save("TestB.yaml")
+        try:
+            cfg = self.CLASS()
+            cfg.configure(module=__name__, defaultcfg="test_config/test_config.yml",
+                cfg="TestB.yaml", supercfg=[(None, "Test.yaml")])
+        finally:
+            self.remove("TestB.yaml")
+        nt.eq_(cfg["Hi"]["A.py.p"], 3)
+        nt.eq_(cfg["Hi"]["B"], 2)
+        nt.ok_("g" in cfg)
+        
+    def test_load_environ(self):
+        """.load_environ() overlays prefixed environment variables"""
+        environ = {
+            "MYAPP__Hi__B" : "5",
+            "MYAPP__HI__C" : "1.5",
+            "MYAPP__NEW__FLAG" : "yes",
+            "MYAPP__NEW__NAME" : "value",
+            "OTHER__Hi__B" : "6",
+        }
+        cfg = self.CLASS(self.test_dict_A)
+        nt.ok_(cfg.load_environ("MYAPP", environ=environ))
+        nt.eq_(cfg.store["Hi"]["B"], 5)
+        nt.eq_(cfg.store["Hi"]["c"], 1.5)
+        nt.eq_(cfg.store["Hi"]["A.py.p"], 1)
+        nt.eq_(cfg.store["new"], {"flag":True, "name":"value"})
+        nt.ok_(not cfg.load_environ("NOTHING", environ=environ))
+        
+    def test_load_environ_cache(self):
+        """.load_environ() reuses parsed values for an unchanged environment"""
+        from pyshell.config.core import _parse_environ
+        environ = {"MYAPP__A" : "1"}
+        parsed = _parse_environ("MYAPP", "__", environ)
+        nt.ok_(_parse_environ("MYAPP", "__", dict(environ)) is parsed)
+        environ["MYAPP__A"] = "2"
+        nt.eq_(_parse_environ("MYAPP", "__", environ), [(("A",), 2)])
+        
+    def test_load_environ_conflict(self):
+        """.load_environ() warns about scalars which conflict with nested variables"""
+        import warnings
+        environ = {"MYAPP__A" : "1", "MYAPP__a__B" : "2"}
+        cfg = self.CLASS()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            cfg.load_environ("MYAPP", environ=environ)
+        nt.eq_(len(caught), 1)
+        nt.ok_("MYAPP__A" in str(caught[0].message))
+        nt.eq_(cfg.store["a"], {"b":2})
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.CLASS().load_environ("MYAPP", environ=dict(environ))
+        nt.eq_(len(caught), 1)
+        
+    def test_provenance(self):
+        """.explain() reports where values came from"""
+        self.CLASS(self.test_dict_A).save("Test.yaml")
+        cfg = self.CLASS()
+        cfg.track_provenance()
+        cfg.load("Test.yaml")
+        cfg.merge({"Hi":{"B":5}}, source="override")
+        source, line = cfg.explain("Hi.A.py.p")[1:]
+        nt.eq_(source, "Test.yaml")
+        with open("Test.yaml") as stream:
+            nt.ok_(stream.readlines()[line-1].strip().startswith("A.py.p:"))
+        nt.eq_(cfg.explain("Hi.B"), config.Provenance("Hi.B", "override", None))
+        nt.eq_(cfg.explain("Hi.D.0").key, "Hi.D")
+        nt.ok_(cfg.explain("Hi.D").source is cfg.explain("Hi.E.py.p.F").source)
+        nt.eq_(set(cfg.provenance("Hi.E.py.p")), set(["Hi.E.py.p.F"]))
+        nt.assert_raises(KeyError, cfg.explain, "Bogus")
+        
+    def test_provenance_set(self):
+        """.explain() reports values which were set or parsed from the command line"""
+        self.CLASS(self.test_dict_A).save("Test.yaml")
+        cfg = self.CLASS()
+        cfg.track_provenance()
+        cfg.load("Test.yaml")
+        cfg.parse_literals("Hi=5")
+        nt.eq_(cfg.explain("Hi"), config.Provenance("Hi", "command line", None))
+        nt.eq_(cfg.provenance("Hi"), {"Hi":config.Provenance("Hi", "command line", None)})
+        cfg["Hi"] = {"B":1}
+        nt.eq_(cfg.explain("Hi.B"), config.Provenance("Hi.B", "set", None))
+        nt.ok_("Hi" not in cfg.provenance())
+        cfg.update({"Hi":{"C":2}})
+        nt.eq_(cfg.explain("Hi.C").source, "set")
+        del cfg["Hi"]
+        nt.eq_(cfg.provenance("Hi"), {})
+        
+    @nt.raises(ValueError)
+    def test_provenance_off(self):
+        """.explain() requires provenance tracking"""
+        cfg = self.CLASS(self.test_dict_A)
+        cfg.explain("Hi.B")
+        
 class test_DottedConfiguration(test_Configuration):
     """pyshell.config.DottedConfiguration"""
         
@@ -203,4 +311,50 @@ class test_StructuredConfiguration(test_DottedConfiguration):
     """pyshell.config.StructuredConfiguration"""
     
     CLASS = config.StructuredConfiguration
-        
\ No newline at end of file
+
+class test_FrozenConfiguration(object):
+    """pyshell.config.FrozenConfiguration"""
+
+    def setup(self):
+        self.test_dict_A = {"Hi":{"A.py.p":1,"B":2,"D":[1,2],"E.py.p":{"F":"G"}},}
+        self.test_dict_B = {"Hi":{"A.py.p":3,"C":4,"D":[3,4],"E.py.p":{"F":"G"}},}
+
+    def test_freeze(self):
+        """.freeze() is equal and hashable"""
+        frozen = config.Configuration(self.test_dict_A).freeze()
+        nt.ok_(isinstance(frozen, config.FrozenConfiguration))
+        nt.eq_(frozen, self.test_dict_A)
+        nt.eq_(hash(frozen), hash(config.Configuration(self.test_dict_A).freeze()))
+        nt.ok_(frozen != config.Configuration(self.test_dict_B).freeze())
+        nt.eq_(frozen["Hi"]["D"], (1,2))
+
+    def test_subtree(self):
+        """Subtrees are shared, not copied."""
+        frozen = config.DottedConfiguration(self.test_dict_A).freeze()
+        nt.ok_(frozen["Hi"] is frozen["Hi"])
+        nt.ok_(frozen["Hi.E.py.p"] is frozen["Hi"]["E.py.p"])
+        nt.eq_(frozen["Hi.E.py.p.F"], "G")
+        nt.ok_("Hi.B" in frozen)
+        nt.ok_("Hi.Z" not in frozen)
+
+    @nt.raises(TypeError)
+    def test_immutable(self):
+        """Frozen configurations can't be changed."""
+        frozen = config.Configuration(self.test_dict_A).freeze()
+        frozen["Hi"] = 1
+
+    def test_memoization_key(self):
+        """Frozen subtrees work as dictionary keys."""
+        frozen = config.Configuration(self.test_dict_A).freeze()
+        cache = { frozen["Hi"] : 1 }
+        nt.eq_(cache[config.Configuration(self.test_dict_A).freeze()["Hi"]], 1)
+
+    def test_thaw(self):
+        """.thaw() round trips"""
+        frozen = config.DottedConfiguration(self.test_dict_A).freeze()
+        thawed = frozen.thaw()
+        nt.ok_(isinstance(thawed, config.DottedConfiguration))
+        nt.eq_(thawed.store, self.test_dict_A)
+        thawed["Hi.B"] = 5
+        nt.eq_(frozen["Hi.B"], 2)
+        nt.eq_(config.Configuration.make(frozen).store, self.test_dict_A)
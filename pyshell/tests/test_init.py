@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# 
+#  test_init.py
+#  pyshell
+#  
+# 
+
+from __future__ import (absolute_import, unicode_literals, division,
+                        print_function)
+
+import nose.tools as nt
+from nose.plugins.skip import SkipTest
+
+from .util import run_python, find_python
+
+IMPORT_BUDGET = 1.0
+"""The most time (in seconds) ``import pyshell`` may take. This is loose, so
+that busy test machines don't fail it; it catches slow imports creeping back."""
+
+SLOW_MODULES = ['IPython', 'pkg_resources', 'curses']
+"""Modules which should not be imported by ``import pyshell``."""
+
+class test_import(object):
+    """import pyshell"""
+    
+    def test_slow_modules(self):
+        """Slow modules are not imported with pyshell."""
+        stdout, _ = run_python("-c", "import pyshell, sys; print('\\n'.join(sys.modules))")
+        modules = set(stdout.split())
+        for module in SLOW_MODULES:
+            nt.ok_(module not in modules, "{} was imported".format(module))
+        
+    def test_lazy_engines(self):
+        """Engines are imported on first use."""
+        python = find_python((3, 7))
+        if python is None:
+            raise SkipTest("Lazy imports require Python 3.7")
+        stdout, _ = run_python("-c", "import pyshell, sys; print('pyshell.base' in sys.modules); "
+            "pyshell.CLIEngine; print('pyshell.base' in sys.modules)", executable=python)
+        nt.eq_(stdout.split(), ["False", "True"])
+        
+    def test_getattr(self):
+        """The lazy attribute hook imports engines, and rejects other names."""
+        import pyshell, pyshell.base
+        nt.ok_(pyshell.__getattr__("CLIEngine") is pyshell.base.CLIEngine)
+        nt.assert_raises(AttributeError, pyshell.__getattr__, "NotAnEngine")
+        
+    def test_namespace(self):
+        """Helper modules don't leak into the pyshell namespace."""
+        import pyshell
+        nt.ok_(not hasattr(pyshell, "sys"))
+        nt.ok_(not hasattr(pyshell, "importlib"))
+        
+    def test_terminal(self):
+        """Terminal capabilities can be imported directly."""
+        stdout, _ = run_python("-c", "from pyshell.console.terminal import RED, COLUMNS; print('ok')")
+        nt.eq_(stdout.split()[-1], "ok")
+        
+    def test_importtime(self):
+        """import pyshell is within its time budget."""
+        python = find_python((3, 7))
+        if python is None:
+            raise SkipTest("-X importtime requires Python 3.7")
+        _, stderr = run_python("-X", "importtime", "-c", "import pyshell", executable=python)
+        cumulative = {}
+        for line in stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                _, total, name = line.split("|")
+                if total.strip().isdigit():
+                    cumulative[name.strip()] = int(total) * 1e-6
+        nt.ok_(cumulative["pyshell"] < IMPORT_BUDGET, 
+            "import pyshell took {:.3f}s".format(cumulative["pyshell"]))
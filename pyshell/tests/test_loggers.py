@@ -0,0 +1,700 @@
+# -*- coding: utf-8 -*-
+# 
+#  test_loggers.py
+#  pyshell
+#  
+# 
+
+from __future__ import (absolute_import, unicode_literals, division,
+                        print_function)
+
+import os
+import sys
+import time
+import json
+import gzip
+import shutil
+import tempfile
+import logging
+import pyshell.loggers as loggers
+import nose.tools as nt
+
+def make_record(msg="message", level=logging.INFO, name="test", args=()):
+    """Make a log record."""
+    return logging.LogRecord(name, level, __file__, 0, msg, args, None)
+    
+class ListHandler(logging.Handler):
+    """A handler which keeps records in a list."""
+    def __init__(self, level=logging.NOTSET):
+        super(ListHandler, self).__init__(level)
+        self.records = []
+        
+    def emit(self, record):
+        """Keep the record"""
+        self.records.append(record)
+        
+class test_BufferHandler(object):
+    """pyshell.loggers.BufferHandler"""
+    
+    def test_unbounded(self):
+        """Unbounded buffers keep everything."""
+        handler = loggers.BufferHandler(1e7)
+        for i in range(100):
+            handler.handle(make_record())
+        nt.eq_(len(handler.buffer), 100)
+        nt.ok_(isinstance(handler.buffer, list))
+        
+    def test_ring_oldest(self):
+        """Ring buffers drop the oldest records."""
+        handler = loggers.BufferHandler(1e7, maxlen=10)
+        for i in range(25):
+            handler.handle(make_record("%d", args=(i,)))
+        nt.eq_(len(handler.buffer), 10)
+        nt.eq_(handler.buffer[0].args, (15,))
+        nt.eq_(handler.dropped, 15)
+        nt.eq_(handler.dropped_by_level[logging.INFO], 15)
+        
+    def test_ring_level(self):
+        """Ring buffers drop low level records when full."""
+        handler = loggers.BufferHandler(1e7, maxlen=10, overflow="level")
+        for i in range(10):
+            handler.handle(make_record(level=logging.DEBUG))
+        handler.handle(make_record(level=logging.INFO))
+        handler.handle(make_record(level=logging.WARNING))
+        nt.eq_(len(handler.buffer), 10)
+        nt.eq_(handler.buffer[-1].levelno, logging.WARNING)
+        nt.eq_(handler.dropped_by_level[logging.INFO], 1)
+        nt.eq_(handler.dropped_by_level[logging.DEBUG], 1)
+        
+    def test_ring_sample(self):
+        """Ring buffers sample records when full."""
+        handler = loggers.BufferHandler(1e7, maxlen=10, overflow="sample", sample=5)
+        for i in range(60):
+            handler.handle(make_record("%d", args=(i,)))
+        nt.eq_(len(handler.buffer), 10)
+        nt.eq_(handler.buffer[-1].args, (59,))
+        nt.eq_(handler.buffer[-2].args, (54,))
+        
+    def test_max_bytes(self):
+        """Ring buffers respect a memory budget."""
+        size = loggers._record_size(make_record())
+        handler = loggers.BufferHandler(1e7, max_bytes=size * 5)
+        for i in range(20):
+            handler.handle(make_record())
+        nt.eq_(len(handler.buffer), 5)
+        nt.ok_(handler.buffered_bytes <= size * 5)
+        nt.eq_(handler.dropped, 15)
+        
+    def test_flush_reports_drops(self):
+        """Flushing reports dropped records."""
+        handler = loggers.BufferHandler(1e7, maxlen=2)
+        target = ListHandler()
+        for i in range(5):
+            handler.handle(make_record())
+        handler.setTarget(target)
+        handler.flush()
+        nt.eq_(len(target.records), 3)
+        nt.eq_(target.records[0].levelno, logging.WARNING)
+        nt.ok_("Dropped 3" in target.records[0].getMessage())
+        nt.eq_(handler.dropped, 0)
+        nt.eq_(len(handler.buffer), 0)
+        
+    @nt.raises(ValueError)
+    def test_bad_policy(self):
+        """Unknown overflow policies are rejected."""
+        loggers.BufferHandler(1e7, maxlen=2, overflow="bogus")
+        
+class BlockingHandler(ListHandler):
+    """A handler which waits for an event before handling records."""
+    def __init__(self, level=logging.NOTSET):
+        super(BlockingHandler, self).__init__(level)
+        import threading
+        self.event = threading.Event()
+        
+    def emit(self, record):
+        """Wait, then keep the record"""
+        self.event.wait()
+        super(BlockingHandler, self).emit(record)
+        
+class test_AsyncTargetHandler(object):
+    """pyshell.loggers.AsyncTargetHandler"""
+    
+    def test_dispatch(self):
+        """Records reach the target in order."""
+        target = ListHandler()
+        handler = loggers.AsyncTargetHandler(target)
+        for i in range(20):
+            handler.handle(make_record("%d", args=(i,)))
+        handler.flush()
+        nt.eq_([ record.getMessage() for record in target.records ], 
+            [ "{0:d}".format(i) for i in range(20) ])
+        handler.close()
+        
+    def test_prepare(self):
+        """Queued records don't change with their arguments."""
+        target = BlockingHandler()
+        handler = loggers.AsyncTargetHandler(target)
+        args = [1]
+        record = make_record("%r", args=(args,))
+        handler.handle(record)
+        args.append(2)
+        target.event.set()
+        handler.close()
+        nt.eq_(target.records[0].getMessage(), "[1]")
+        nt.ok_(target.records[0] is not record)
+        
+    def test_drop_newest(self):
+        """Full queues drop new records."""
+        target = BlockingHandler()
+        handler = loggers.AsyncTargetHandler(target, maxsize=2, policy="drop_newest")
+        for i in range(10):
+            handler.handle(make_record("%d", args=(i,)))
+        target.event.set()
+        handler.close()
+        nt.ok_(handler.dropped >= 7)
+        nt.eq_(len(target.records) + handler.dropped, 10)
+        nt.eq_(target.records[0].getMessage(), "0")
+        
+    def test_drop_oldest(self):
+        """Full queues drop old records."""
+        target = BlockingHandler()
+        handler = loggers.AsyncTargetHandler(target, maxsize=2, policy="drop_oldest")
+        for i in range(10):
+            handler.handle(make_record("%d", args=(i,)))
+        target.event.set()
+        handler.close()
+        nt.eq_(len(target.records) + handler.dropped, 10)
+        nt.eq_(target.records[-1].getMessage(), "9")
+        
+    def test_closed(self):
+        """Closed handlers give records to the target directly."""
+        target = ListHandler()
+        handler = loggers.AsyncTargetHandler(target, maxsize=2)
+        handler.close()
+        for i in range(5):
+            handler.handle(make_record("%d", args=(i,)))
+        nt.eq_(len(target.records), 5)
+        nt.ok_(handler.queue.empty())
+        
+    def test_configure(self):
+        """configure_logging() moves handlers to the background."""
+        loggers.configure_logging({"logging":{
+            "version":1,
+            "disable_existing_loggers":False,
+            "handlers":{"testlist":{"()":"pyshell.tests.test_loggers.ListHandler"}},
+            "loggers":{"test.background":{"handlers":["testlist"], "level":"DEBUG", "propagate":False}},
+            "background":{"handlers":["testlist"], "policy":"drop_oldest"},
+        }})
+        logger = logging.getLogger("test.background")
+        nt.eq_(len(logger.handlers), 1)
+        handler = logger.handlers[0]
+        nt.ok_(isinstance(handler, loggers.AsyncTargetHandler))
+        logger.info("Hello")
+        handler.flush()
+        nt.eq_(handler.target.records[-1].getMessage(), "Hello")
+        logger.removeHandler(handler)
+        handler.close()
+        
+class CountingStream(object):
+    """A stream which counts writes."""
+    def __init__(self):
+        self.writes = []
+        
+    def write(self, text):
+        """Write text"""
+        self.writes.append(text)
+        
+    def flush(self):
+        """Flush"""
+        pass
+        
+class test_handle_batch(object):
+    """pyshell.loggers.handle_batch"""
+    
+    def test_stream(self):
+        """Stream handlers write batches at once."""
+        stream = CountingStream()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        loggers.handle_batch(handler, [ make_record("%d", args=(i,)) for i in range(5) ])
+        nt.eq_(stream.writes, ["0\n1\n2\n3\n4\n"])
+        
+    def test_logger(self):
+        """Loggers pass batches to their handlers."""
+        logger = logging.getLogger("test.batch")
+        logger.propagate = False
+        target = ListHandler(logging.INFO)
+        logger.addHandler(target)
+        try:
+            loggers.handle_batch(logger, [ make_record(level=level) 
+                for level in (logging.DEBUG, logging.INFO, logging.ERROR) ])
+        finally:
+            logger.removeHandler(target)
+        nt.eq_([ record.levelno for record in target.records ], [logging.INFO, logging.ERROR])
+        
+    def test_subclass(self):
+        """Stream handler subclasses handle each record."""
+        class EmittingHandler(logging.StreamHandler):
+            emitted = 0
+            def emit(self, record):
+                self.emitted += 1
+                super(EmittingHandler, self).emit(record)
+        stream = CountingStream()
+        handler = EmittingHandler(stream)
+        loggers.handle_batch(handler, [ make_record("%d", args=(i,)) for i in range(5) ])
+        nt.eq_(handler.emitted, 5)
+        nt.eq_(len(stream.writes), 5)
+        
+    def test_no_handlers(self):
+        """Loggers without handlers fall back like Logger.callHandlers."""
+        logger = logging.getLogger("test.batch.unhandled")
+        logger.propagate = False
+        emitted = logger.manager.emittedNoHandlerWarning
+        logger.manager.emittedNoHandlerWarning = False
+        stderr, sys.stderr = sys.stderr, CountingStream()
+        try:
+            loggers.handle_batch(logger, [ make_record(level=logging.ERROR) ])
+            written = sys.stderr.writes
+        finally:
+            sys.stderr = stderr
+            logger.manager.emittedNoHandlerWarning = emitted
+        nt.ok_(len(written))
+        
+    def test_debuffer(self):
+        """Debuffering filters by logger level, and keeps order."""
+        logger = logging.getLogger("test.debuffer")
+        logger.propagate = False
+        loggers.buffer_logger("test.debuffer")
+        logging.getLogger("test.debuffer.quiet").setLevel(logging.WARNING)
+        for i in range(10):
+            logging.getLogger("test.debuffer").info("%d", i)
+            logging.getLogger("test.debuffer.quiet").info("quiet %d", i)
+            logging.getLogger("test.debuffer.quiet").warning("loud %d", i)
+        target = ListHandler()
+        logger.addHandler(target)
+        try:
+            loggers.debuffer_logger("test.debuffer")
+        finally:
+            logger.removeHandler(target)
+        messages = [ record.getMessage() for record in target.records ]
+        nt.eq_(len(messages), 20)
+        nt.eq_(messages[:2], ["0", "loud 0"])
+        nt.ok_(not any(message.startswith("quiet") for message in messages))
+        
+class test_ColorStreamFormatter(object):
+    """pyshell.loggers.ColorStreamFormatter"""
+    
+    def setup(self):
+        """Set up the formatter"""
+        self.formatter = loggers.ColorStreamFormatter("%(color)s%(levelname)s%(nocolor)s: %(message)s")
+        
+    def test_format(self):
+        """Formatted records carry their level's colors."""
+        record = make_record("hello %s", level=logging.WARNING, args=("world",))
+        color, nocolor = self.formatter.colors(logging.WARNING)
+        nt.eq_(self.formatter.format(record), "{0}WARNING{1}: hello world".format(color, nocolor))
+        
+    def test_no_mutation(self):
+        """Records are not given color attributes."""
+        record = make_record()
+        self.formatter.format(record)
+        nt.ok_(not hasattr(record, "color"))
+        nt.ok_(not hasattr(record, "nocolor"))
+        plain = logging.Formatter("%(message)s")
+        nt.eq_(plain.format(record), "message")
+        
+    def test_conversion_flags(self):
+        """Color fields accept flags and widths."""
+        formatter = loggers.ColorStreamFormatter("%(color)-1s%(levelname)s%(nocolor)s: %(message)s")
+        color, nocolor = formatter.colors(logging.WARNING)
+        record = make_record(level=logging.WARNING)
+        nt.eq_(formatter.format(record), "{0:<1s}WARNING{1}: message".format(color, nocolor))
+        formatter = loggers.ColorStreamFormatter("%(color)5s|%(message)s")
+        nt.eq_(formatter.format(make_record(level=logging.DEBUG - 1)), "     |message")
+        
+    def test_levels(self):
+        """Colors follow the level thresholds."""
+        nt.eq_(self.formatter.colors(logging.DEBUG - 1), ("", ""))
+        nt.eq_(self.formatter.colors(logging.INFO + 5), self.formatter.colors(logging.INFO))
+        nt.eq_(self.formatter.colors(logging.CRITICAL), self.formatter.colors(logging.ERROR))
+        
+    def test_exception(self):
+        """Exceptions are appended to the message."""
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            record = logging.LogRecord("test", logging.ERROR, __file__, 0, "oops", (), sys.exc_info())
+        text = self.formatter.format(record)
+        nt.ok_(text.endswith("ValueError: bad"))
+        
+class test_JSONFormatter(object):
+    """pyshell.loggers.JSONFormatter"""
+    
+    def test_fields(self):
+        """Fields are written in order, with static fields first."""
+        formatter = loggers.JSONFormatter(fields=["levelname", "message"], static={"service": "test"})
+        text = formatter.format(make_record("hello %s", args=("world",)))
+        nt.eq_(text, '{"service":"test","levelname":"INFO","message":"hello world"}')
+        
+    def test_renamed(self):
+        """Fields can be renamed."""
+        formatter = loggers.JSONFormatter(fields={"level": "levelno"})
+        nt.eq_(json.loads(formatter.format(make_record())), {"level": logging.INFO})
+        
+    def test_extra(self):
+        """Extra fields are included."""
+        formatter = loggers.JSONFormatter(fields=["message"])
+        record = make_record("quote \" and\nnewline")
+        record.user = "ü"
+        record.count = 3
+        record.obj = object()
+        text = formatter.format(record)
+        nt.ok_("\n" not in text)
+        data = json.loads(text)
+        nt.eq_(data["message"], "quote \" and\nnewline")
+        nt.eq_(data["user"], "ü")
+        nt.eq_(data["count"], 3)
+        nt.ok_(data["obj"].startswith("<object"))
+        nt.eq_(set(data), set(["message", "user", "count", "obj"]))
+        nt.ok_(not loggers.JSONFormatter(extra=False).format(record).count("user"))
+        
+    def test_exception(self):
+        """Exceptions are included."""
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            record = logging.LogRecord("test", logging.ERROR, __file__, 0, "oops", (), sys.exc_info())
+        data = json.loads(loggers.JSONFormatter().format(record))
+        nt.ok_(data["exc_info"].endswith("ValueError: bad"))
+        
+    def test_fmt(self):
+        """Fields can be chosen with a format string."""
+        formatter = loggers.JSONFormatter("%(levelname)-8s %(message)s")
+        nt.eq_(formatter.format(make_record()), '{"levelname":"INFO","message":"message"}')
+        formatter = loggers.JSONFormatter("{name} {message}", style="{", extra=False)
+        nt.eq_(sorted(json.loads(formatter.format(make_record()))), ["message", "name"])
+        
+    def test_configure(self):
+        """JSON formatters can be configured."""
+        stream = CountingStream()
+        loggers.configure_logging({"logging": {
+            "version": 1,
+            "disable_existing_loggers": False,
+            "formatters": {"json": {"()": "pyshell.loggers.JSONFormatter", "fields": ["name", "message"]}},
+            "handlers": {"json": {"class": "logging.StreamHandler", "formatter": "json", "stream": stream}},
+            "loggers": {"test.json": {"handlers": ["json"], "propagate": False, "level": "INFO"}},
+        }})
+        try:
+            logging.getLogger("test.json").info("hello", extra={"request": 1})
+        finally:
+            logging.getLogger("test.json").handlers = []
+        nt.eq_(stream.writes[0], '{"name":"test.json","message":"hello","request":1}\n')
+        
+class test_RateLimitFilter(object):
+    """pyshell.loggers.RateLimitFilter"""
+    
+    def setup(self):
+        """Set up a filter with a fake clock."""
+        self.now = 0.0
+        self.filter = loggers.RateLimitFilter(rate=1.0, burst=2, period=10.0, maxkeys=2)
+        self.filter.clock = lambda : self.now
+        
+    def teardown(self):
+        """Don't report this filter's suppressed messages at exit."""
+        loggers._rate_limit_filters.discard(self.filter)
+        
+    def passed(self, n, msg="repeated %d", level=logging.WARNING, name="test"):
+        """Filter n records, returning those which pass."""
+        return [ record for record in (make_record(msg, level, name, args=(i,)) for i in range(n))
+            if self.filter.filter(record) ]
+        
+    def test_burst(self):
+        """Bursts are limited."""
+        nt.eq_(len(self.passed(10)), 2)
+        nt.eq_(self.filter.suppressed, 8)
+        nt.eq_(len(self.passed(10, level=logging.ERROR)), 2)
+        nt.eq_(len(self.passed(10, msg="other %d")), 2)
+        
+    def test_refill(self):
+        """Tokens refill over time, and report repeats."""
+        self.passed(10)
+        self.now += 1.0
+        records = self.passed(10)
+        nt.eq_(len(records), 1)
+        nt.eq_(records[0].repeated, 8)
+        nt.eq_(records[0].getMessage(), "repeated 0")
+        formatter = loggers.ColorStreamFormatter("%(message)s")
+        nt.eq_(formatter.format(records[0]), "repeated 0 (repeated 8 times)")
+        nt.eq_(json.loads(loggers.JSONFormatter().format(records[0]))["repeated"], 8)
+        
+    def test_summary(self):
+        """Suppressed messages are summarized periodically."""
+        self.passed(10)
+        self.filter.rate = 0.0
+        self.now += 10.0
+        records = self.passed(10)
+        nt.eq_(len(records), 1)
+        nt.eq_(records[0].repeated, 8)
+        
+    def test_close(self):
+        """Suppressed messages are reported when the filter is closed."""
+        target = ListHandler()
+        logger = logging.getLogger("test.ratelimit.close")
+        logger.addHandler(target)
+        logger.addFilter(self.filter)
+        logger.propagate = False
+        try:
+            self.passed(10, name="test.ratelimit.close")
+            self.passed(3, msg="other %d", name="test.ratelimit.close")
+            self.filter.close()
+        finally:
+            logger.removeHandler(target)
+            logger.removeFilter(self.filter)
+        nt.eq_(sorted(record.getMessage() for record in target.records), ["other 2", "repeated 9"])
+        nt.eq_(sorted(getattr(record, "repeated", 0) for record in target.records), [0, 7])
+        nt.ok_(self.filter.filter(make_record()))
+        
+    def test_close_handler(self):
+        """Summaries go only to the handlers with the filter."""
+        filtered, unfiltered = ListHandler(), ListHandler()
+        filtered.addFilter(self.filter)
+        logger = logging.getLogger("test.ratelimit.handler")
+        logger.addHandler(filtered)
+        logger.addHandler(unfiltered)
+        logger.propagate = False
+        try:
+            for i in range(5):
+                logger.warning("m %d", i)
+            self.filter.close()
+        finally:
+            logger.removeHandler(filtered)
+            logger.removeHandler(unfiltered)
+        nt.eq_([ record.getMessage() for record in unfiltered.records ], 
+            ["m 0", "m 1", "m 2", "m 3", "m 4"])
+        nt.eq_([ record.getMessage() for record in filtered.records ], ["m 0", "m 1", "m 4"])
+        nt.eq_(filtered.records[-1].repeated, 2)
+        
+    def test_lru(self):
+        """Only the most recent messages are tracked."""
+        self.passed(10, msg="a %d")
+        self.passed(10, msg="b %d")
+        self.passed(10, msg="c %d")
+        nt.eq_(len(self.filter._buckets), 2)
+        nt.eq_(len(self.passed(10, msg="a %d")), 2)
+        
+    def test_configure(self):
+        """Rate limit filters can be configured."""
+        target = ListHandler()
+        loggers.configure_logging({"logging": {
+            "version": 1,
+            "disable_existing_loggers": False,
+            "filters": {"ratelimit": {"()": "pyshell.loggers.RateLimitFilter", "burst": 3}},
+            "loggers": {"test.ratelimit": {"filters": ["ratelimit"], "propagate": False, "level": "INFO"}},
+        }})
+        logger = logging.getLogger("test.ratelimit")
+        logger.addHandler(target)
+        try:
+            for i in range(100):
+                logger.warning("hot loop %d", i)
+        finally:
+            logger.removeHandler(target)
+            logger.filters = []
+        nt.eq_(len(target.records), 3)
+        
+class test_metrics(object):
+    """pyshell.loggers.metrics_snapshot"""
+    
+    def setup(self):
+        """Set up a logger with a handler."""
+        self.logger = logging.getLogger("test.metrics")
+        self.logger.propagate = False
+        self.target = ListHandler()
+        self.target.set_name("metrics-list")
+        self.logger.addHandler(self.target)
+        
+    def teardown(self):
+        """Turn off metrics."""
+        loggers.stop_metrics_dump()
+        loggers.enable_metrics(False)
+        self.logger.removeHandler(self.target)
+        
+    def test_disabled(self):
+        """Instrumentation is off by default."""
+        nt.ok_("handle" not in vars(self.target))
+        nt.ok_(loggers._metrics_filter not in self.logger.filters)
+        self.logger.warning("uncounted")
+        snapshot = loggers.metrics_snapshot()
+        nt.ok_(not snapshot["enabled"])
+        nt.eq_(snapshot["records"], {})
+        
+    def test_counts(self):
+        """Records are counted by logger and level."""
+        loggers.enable_metrics()
+        for i in range(3):
+            self.logger.warning("counted %d", i)
+        self.logger.error("counted")
+        snapshot = loggers.metrics_snapshot()
+        nt.eq_(snapshot["records"]["test.metrics"], {"WARNING": 3, "ERROR": 1})
+        latency = snapshot["handlers"]["metrics-list"]
+        nt.eq_(latency["count"], 4)
+        nt.eq_(sum(count for _, count in latency["histogram"]), 4)
+        loggers.reset_metrics()
+        nt.eq_(loggers.metrics_snapshot()["records"], {})
+        
+    def test_scope(self):
+        """Instrumentation doesn't change the logging module, and covers overridden handlers."""
+        handle = logging.Handler.__dict__["handle"]
+        loggers.enable_metrics()
+        nt.ok_(logging.Handler.__dict__["handle"] is handle)
+        buffered = loggers.BufferHandler(1e7)
+        buffered.set_name("metrics-buffer")
+        self.logger.addHandler(buffered)
+        try:
+            self.logger.warning("counted")
+        finally:
+            self.logger.removeHandler(buffered)
+        nt.eq_(loggers.metrics_snapshot()["handlers"]["metrics-buffer"]["count"], 1)
+        loggers.enable_metrics(False)
+        nt.ok_("handle" not in vars(self.target))
+        
+    def test_buffers(self):
+        """Buffers are reported."""
+        loggers.buffer_logger("test.metrics.buffered")
+        logging.getLogger("test.metrics.buffered").info("buffered")
+        buffers = loggers.metrics_snapshot()["buffers"]
+        nt.eq_(buffers["test.metrics.buffered"]["buffered"], 1)
+        
+    def test_dump(self):
+        """Metrics are dumped to a logger."""
+        loggers.enable_metrics()
+        self.logger.warning("counted")
+        loggers.dump_metrics("test.metrics")
+        record = self.target.records[-1]
+        nt.eq_(record.metrics["records"]["test.metrics"], {"WARNING": 1})
+        nt.ok_(record.getMessage().startswith("Logging metrics: 1 records handled"))
+        
+    def test_periodic(self):
+        """Metrics are dumped periodically."""
+        loggers.start_metrics_dump(0.01, name="test.metrics")
+        time.sleep(0.1)
+        loggers.stop_metrics_dump()
+        nt.ok_(len(self.target.records) >= 2)
+        
+class test_CompressedRotatingFileHandler(object):
+    """pyshell.loggers.CompressedRotatingFileHandler"""
+    
+    def setup(self):
+        """Make a temporary directory."""
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "test.log")
+        
+    def teardown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.directory)
+        
+    def rotated(self):
+        """List the rotated files."""
+        return sorted(filename for filename in os.listdir(self.directory) if filename != "test.log")
+        
+    def test_size(self):
+        """Files are rotated by size, compressed and pruned."""
+        handler = loggers.CompressedRotatingFileHandler(self.filename, maxBytes=100, backupCount=2)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        for i in range(40):
+            handler.handle(make_record("record %02d", args=(i,)))
+        handler.close()
+        rotated = self.rotated()
+        nt.eq_(len(rotated), 2)
+        nt.ok_(all(filename.endswith(".gz") for filename in rotated))
+        with gzip.open(os.path.join(self.directory, rotated[-1]), "rb") as stream:
+            lines = stream.read().decode("utf-8").splitlines()
+        with open(self.filename) as stream:
+            nt.eq_(stream.read().splitlines()[-1], "record 39")
+        nt.ok_(lines[0].startswith("record "))
+        
+    def test_time(self):
+        """Files are rotated by time."""
+        handler = loggers.CompressedRotatingFileHandler(self.filename, when="S", compression=None)
+        handler.handle(make_record("before"))
+        handler.rolloverAt = time.time() - 1
+        handler.handle(make_record("after"))
+        handler.close()
+        rotated = self.rotated()
+        nt.eq_(len(rotated), 1)
+        with open(os.path.join(self.directory, rotated[0])) as stream:
+            nt.eq_(stream.read(), "before\n")
+        
+    def test_time_restart(self):
+        """Time based rotation carries over between processes."""
+        with open(self.filename, "w") as stream:
+            stream.write("old\n")
+        os.utime(self.filename, (time.time() - 120, time.time() - 120))
+        handler = loggers.CompressedRotatingFileHandler(self.filename, when="M", compression=None)
+        handler.handle(make_record("new"))
+        handler.close()
+        rotated = self.rotated()
+        nt.eq_(len(rotated), 1)
+        with open(os.path.join(self.directory, rotated[0])) as stream:
+            nt.eq_(stream.read(), "old\n")
+        
+    def test_size_bytes(self):
+        """Sizes are counted in encoded bytes."""
+        handler = loggers.CompressedRotatingFileHandler(self.filename, maxBytes=100, 
+            encoding="utf-8", compression=None)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        for i in range(3):
+            handler.handle(make_record("\u00e9" * 30))
+        handler.close()
+        nt.eq_(len(self.rotated()), 2)
+        nt.ok_(os.path.getsize(self.filename) <= 100)
+        
+    def test_buffered(self):
+        """Writes are buffered, and flushed periodically."""
+        handler = loggers.CompressedRotatingFileHandler(self.filename, flushInterval=0.05)
+        handler.handle(make_record("buffered"))
+        nt.eq_(os.path.getsize(self.filename), 0)
+        handler.handle(make_record("error", level=logging.ERROR))
+        nt.ok_(os.path.getsize(self.filename) > 0)
+        handler.handle(make_record("buffered again"))
+        time.sleep(0.2)
+        with open(self.filename) as stream:
+            nt.eq_(stream.read().splitlines()[-1], "buffered again")
+        handler.close()
+        
+    @nt.raises(ValueError)
+    def test_bad_compression(self):
+        """Unknown compression is an error."""
+        loggers.CompressedRotatingFileHandler(self.filename, compression="zip")
+        
+class test_PyshellLogger(object):
+    """pyshell.loggers.PyshellLogger"""
+    
+    def setup(self):
+        """Set up a logger with a handler."""
+        self.logger = loggers.PyshellLogger("test.pyshelllogger")
+        self.logger.propagate = False
+        self.target = ListHandler()
+        self.logger.addHandler(self.target)
+        
+    def test_status(self):
+        """Custom level methods log at their level."""
+        self.logger.setLevel(logging.INFO)
+        self.logger.status("status %d", 1)
+        nt.eq_([ (record.levelno, record.getMessage()) for record in self.target.records ], [(25, "status 1")])
+        nt.eq_(loggers.STATUS, 25)
+        
+    def test_cached(self):
+        """Custom level methods are cached on the class."""
+        self.logger.status("cached")
+        nt.ok_("status" in vars(loggers.PyshellLogger))
+        
+    def test_disabled(self):
+        """Disabled custom levels don't log."""
+        self.logger.setLevel(logging.WARNING)
+        self.logger.status("quiet")
+        nt.eq_(self.target.records, [])
+        
+    @nt.raises(AttributeError)
+    def test_missing(self):
+        """Unknown level names are missing attributes."""
+        self.logger.notalevel("message")
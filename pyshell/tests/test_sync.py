@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#
+#  test_sync.py
+#  pyshell
+#
+
+from __future__ import (absolute_import, unicode_literals, division,
+                        print_function)
+
+import os, os.path
+import io
+import shutil
+import tempfile
+import nose.tools as nt
+from nose.plugins.skip import SkipTest
+
+import pyshell.sync
+
+def write(path, text):
+    """Write a file, making its directory."""
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with io.open(path, 'w') as stream:
+        stream.write(text)
+
+def read(path):
+    """Read a file."""
+    with io.open(path, 'r') as stream:
+        return stream.read()
+
+class test_NativeSync(object):
+    """pyshell.sync.NativeSync"""
+
+    def setup(self):
+        """Make origin and destination trees."""
+        self.root = tempfile.mkdtemp()
+        self.origin = os.path.join(self.root, 'origin') + os.sep
+        self.destination = os.path.join(self.root, 'destination')
+        self.manifest = os.path.join(self.root, 'manifest.json')
+        write(os.path.join(self.origin, 'a.txt'), "a")
+        write(os.path.join(self.origin, 'sub', 'b.txt'), "bb")
+        write(os.path.join(self.origin, 'sub', 'deeper', 'c.txt'), "c" * 100000)
+        os.symlink('a.txt', os.path.join(self.origin, 'link'))
+
+    def teardown(self):
+        """Remove the trees."""
+        shutil.rmtree(self.root)
+
+    def sync(self, **kwargs):
+        """Run a sync, collecting its output."""
+        self.output = []
+        kwargs.setdefault('manifest', self.manifest)
+        sync = pyshell.sync.NativeSync(self.origin, self.destination,
+            output=lambda line, end="\n": self.output.append(line), verbose=True, **kwargs)
+        nt.eq_(sync.run(), 0)
+        return sync
+
+    def test_copy(self):
+        """Copy a tree"""
+        sync = self.sync()
+        nt.eq_(sync.copied, 3)
+        nt.eq_(read(os.path.join(self.destination, 'sub', 'b.txt')), "bb")
+        nt.eq_(read(os.path.join(self.destination, 'sub', 'deeper', 'c.txt')), "c" * 100000)
+        nt.eq_(os.readlink(os.path.join(self.destination, 'link')), 'a.txt')
+        nt.eq_(int(os.stat(os.path.join(self.destination, 'a.txt')).st_mtime),
+            int(os.stat(os.path.join(self.origin, 'a.txt')).st_mtime))
+        nt.ok_(os.path.exists(self.manifest))
+
+    def test_directory(self):
+        """Origins without a trailing separator are copied into the destination"""
+        self.origin = self.origin.rstrip(os.sep)
+        self.sync()
+        nt.eq_(read(os.path.join(self.destination, 'origin', 'a.txt')), "a")
+
+    def test_incremental(self):
+        """Only changed files are copied"""
+        self.sync()
+        sync = self.sync()
+        nt.eq_(sync.copied, 0)
+        write(os.path.join(self.origin, 'sub', 'b.txt'), "changed")
+        sync = self.sync()
+        nt.eq_(sync.copied, 1)
+        nt.eq_(self.output, [os.path.join('sub', 'b.txt')])
+        nt.eq_(read(os.path.join(self.destination, 'sub', 'b.txt')), "changed")
+
+    def test_manifest(self):
+        """Unchanged files are skipped without the manifest"""
+        self.sync(manifest=None)
+        sync = self.sync(manifest=None)
+        nt.eq_(sync.copied, 0)
+
+    def test_delete(self):
+        """Delete files missing from the origin"""
+        self.sync()
+        os.remove(os.path.join(self.origin, 'a.txt'))
+        shutil.rmtree(os.path.join(self.origin, 'sub', 'deeper'))
+        sync = self.sync()
+        nt.eq_(sync.deleted, 0)
+        nt.ok_(os.path.exists(os.path.join(self.destination, 'a.txt')))
+        sync = self.sync(delete=True)
+        nt.eq_(sync.deleted, 2)
+        nt.ok_(not os.path.exists(os.path.join(self.destination, 'a.txt')))
+        nt.ok_(not os.path.exists(os.path.join(self.destination, 'sub', 'deeper')))
+        nt.ok_(os.path.exists(os.path.join(self.destination, 'sub', 'b.txt')))
+
+    def test_finish_errors(self):
+        """Errors restoring directory times don't hide the copy result"""
+        sync = pyshell.sync.NativeSync(self.origin, self.destination, manifest=self.manifest,
+            output=lambda line, end="\n": None)
+        shutil.rmtree(os.path.join(self.origin, 'sub', 'deeper'))
+        sync._touched('missing')
+        nt.eq_(sync.run(), 23)
+        nt.eq_(sync.errors, 1)
+        nt.eq_(read(os.path.join(self.destination, 'sub', 'b.txt')), "bb")
+        
+    def test_unreadable(self):
+        """Unreadable directories are reported, and the rest is copied"""
+        if os.geteuid() == 0:
+            raise SkipTest("root can read any directory")
+        unreadable = os.path.join(self.origin, 'sub', 'deeper')
+        os.chmod(unreadable, 0)
+        try:
+            sync = pyshell.sync.NativeSync(self.origin, self.destination, manifest=self.manifest,
+                delete=True, output=lambda line, end="\n": None)
+            nt.eq_(sync.run(), 23)
+        finally:
+            os.chmod(unreadable, 0o755)
+        nt.eq_(sync.errors, 1)
+        nt.eq_(read(os.path.join(self.destination, 'sub', 'b.txt')), "bb")
+        nt.eq_(sync.deleted, 0)
+        
+    def test_dry_run(self):
+        """Dry runs don't copy"""
+        sync = self.sync(dry_run=True)
+        nt.ok_(os.path.join('sub', 'b.txt') in self.output)
+        nt.ok_(not os.path.exists(self.destination))
+        nt.ok_(not os.path.exists(self.manifest))
+
+class test_scan(object):
+    """pyshell.sync.scan"""
+
+    def setup(self):
+        """Make a tree."""
+        self.root = tempfile.mkdtemp()
+        write(os.path.join(self.root, 'a.txt'), "a")
+        write(os.path.join(self.root, 'sub', 'b.txt'), "bb")
+        write(os.path.join(self.root, 'other', 'c.txt'), "c")
+
+    def teardown(self):
+        """Remove the tree."""
+        shutil.rmtree(self.root)
+
+    def test_scan(self):
+        """Scan for changes"""
+        changed, manifest = pyshell.sync.scan(self.root, pyshell.sync.Manifest())
+        nt.eq_(sorted(changed), sorted(['a.txt', 'sub', 'other',
+            os.path.join('sub', 'b.txt'), os.path.join('other', 'c.txt')]))
+        nt.eq_(sorted(manifest.directories), ['', 'other', 'sub'])
+        changed, manifest = pyshell.sync.scan(self.root, manifest)
+        nt.eq_(changed, [])
+        write(os.path.join(self.root, 'sub', 'b.txt'), "changed")
+        write(os.path.join(self.root, 'other', 'd.txt'), "d")
+        changed, manifest = pyshell.sync.scan(self.root, manifest)
+        nt.ok_(os.path.join('sub', 'b.txt') in changed)
+        nt.ok_(os.path.join('other', 'd.txt') in changed)
+        nt.ok_(os.path.join('other', 'c.txt') not in changed)
+
+    def test_manifest(self):
+        """Save and load scanned manifests"""
+        filename = os.path.join(self.root, 'manifests', 'scan.json')
+        changed, manifest = pyshell.sync.scan(self.root,
+            pyshell.sync.Manifest(filename, self.root, 'destination'))
+        manifest.save()
+        loaded = pyshell.sync.Manifest(filename, self.root, 'destination')
+        nt.eq_(loaded.files, manifest.files)
+        nt.eq_(loaded.directories, manifest.directories)
+        nt.eq_(pyshell.sync.Manifest(filename, self.root, 'elsewhere').files, {})
+
+class test_NativeProcess(object):
+    """pyshell.sync.NativeProcess"""
+
+    def setup(self):
+        """Make an origin tree."""
+        self.root = tempfile.mkdtemp()
+        self.origin = os.path.join(self.root, 'origin') + os.sep
+        self.destination = os.path.join(self.root, 'destination')
+        write(os.path.join(self.origin, 'a.txt'), "a")
+
+    def teardown(self):
+        """Remove the trees."""
+        shutil.rmtree(self.root)
+
+    def test_process(self):
+        """Run like a subprocess"""
+        process = pyshell.sync.NativeProcess(['-a', '-v', '--info=progress2',
+            self.origin, self.destination])
+        output = process.stdout.read()
+        nt.eq_(process.wait(), 0)
+        nt.eq_(process.poll(), 0)
+        nt.ok_(b"a.txt\n" in output)
+        nt.ok_(b"100%" in output)
+        nt.eq_(read(os.path.join(self.destination, 'a.txt')), "a")
+
+    def test_terminate(self):
+        """Terminate before copying"""
+        process = pyshell.sync.NativeProcess([self.origin, self.destination])
+        process.terminate()
+        nt.ok_(process.wait() in (0, 20))
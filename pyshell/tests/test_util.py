@@ -92,4 +92,82 @@ def test_semiabstractmethod_decorator_with_args():
     nt.eq_(my_method.__name__,'my_method')
     nt.eq_(my_method.__doc__,'test-doc')
     my_method()
-    
\ No newline at end of file
+        
+def test_resolve_cache():
+    """resolve(name) caches results"""
+    import collections
+    pyshell.util.clear_resolve_cache()
+    nt.ok_(pyshell.util.resolve("collections.OrderedDict") is collections.OrderedDict)
+    nt.ok_("collections.OrderedDict" in pyshell.util._resolved)
+    nt.ok_(pyshell.util.resolve("os.path.join") is __import__("os").path.join)
+    
+def test_configure_class():
+    """configure_class(configuration) doesn't modify the configuration"""
+    configuration = {"()":"collections.OrderedDict", "a":1}
+    obj = pyshell.util.configure_class(configuration)
+    nt.eq_(obj, {"a":1})
+    nt.eq_(configuration, {"()":"collections.OrderedDict", "a":1})
+    nt.ok_(pyshell.util.configure_class(configuration) is not obj)
+    
+def test_configure_class_memoize():
+    """configure_class(configuration, memoize=True)"""
+    from pyshell.config import Configuration
+    configuration = Configuration({"()":"collections.OrderedDict", "a":1}).freeze()
+    obj = pyshell.util.configure_class(configuration, memoize=True)
+    nt.ok_(pyshell.util.configure_class(configuration, memoize=True) is obj)
+    pyshell.util.clear_configure_cache()
+    nt.ok_(pyshell.util.configure_class(configuration, memoize=True) is not obj)
+    
+def test_configure_class_memoize_unhashable():
+    """configure_class(configuration, memoize=True) with list and dict values"""
+    pyshell.util.clear_configure_cache()
+    configuration = {"()":"collections.OrderedDict", "a":[1, 2], "b":{"c":3}}
+    obj = pyshell.util.configure_class(configuration, memoize=True)
+    nt.eq_(obj, {"a":[1, 2], "b":{"c":3}})
+    nt.ok_(pyshell.util.configure_class(dict(configuration), memoize=True) is obj)
+    class Unhashable(object):
+        __hash__ = None
+    configuration = {"()":"collections.OrderedDict", "a":Unhashable()}
+    obj = pyshell.util.configure_class(configuration, memoize=True)
+    nt.ok_(pyshell.util.configure_class(configuration, memoize=True) is not obj)
+    pyshell.util.clear_configure_cache()
+    
+def test_configure_class_memoize_bounded():
+    """configure_class(configuration, memoize=True) keeps a bounded cache"""
+    from pyshell.config import Configuration
+    pyshell.util.clear_configure_cache()
+    for i in range(pyshell.util._CONFIGURED_SIZE + 10):
+        pyshell.util.configure_class(Configuration({"()":"collections.OrderedDict", "a":i}).freeze(), memoize=True)
+    nt.eq_(len(pyshell.util._configured), pyshell.util._CONFIGURED_SIZE)
+    pyshell.util.clear_configure_cache()
+    
+def test_configure_classes():
+    """configure_classes(mapping) builds in dependency order"""
+    configurations = {
+        "outer" : {"()":"collections.OrderedDict", "inner":"cfg://inner", "many":["cfg://inner", "b"]},
+        "inner" : {"()":"collections.OrderedDict", "a":1},
+        "plain" : "collections.OrderedDict",
+    }
+    built = pyshell.util.configure_classes(configurations)
+    nt.eq_(set(built.keys()), set(["outer", "inner", "plain"]))
+    nt.ok_(built["outer"]["inner"] is built["inner"])
+    nt.ok_(built["outer"]["many"][0] is built["inner"])
+    nt.eq_(built["outer"]["many"][1], "b")
+    nt.eq_(built["plain"], {})
+    
+def test_configure_classes_nested():
+    """configure_classes(mapping) resolves nested references"""
+    built = pyshell.util.configure_classes({
+        "outer" : {"()":"collections.OrderedDict", "nested":{"key":["cfg://inner", {"deep":"cfg://inner"}]}},
+        "inner" : {"()":"collections.OrderedDict", "a":1},
+    })
+    nt.ok_(built["outer"]["nested"]["key"][0] is built["inner"])
+    nt.ok_(built["outer"]["nested"]["key"][1]["deep"] is built["inner"])
+    
+@nt.raises(ValueError)
+def test_configure_classes_cycle():
+    """configure_classes(mapping) detects cycles"""
+    pyshell.util.configure_classes({
+        "a" : {"()":"collections.OrderedDict", "b":"cfg://b"},
+        "b" : {"()":"collections.OrderedDict", "a":"cfg://a"},
+    })
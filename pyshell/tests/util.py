@@ -13,6 +13,9 @@ from __future__ import (absolute_import, unicode_literals, division,
 
 import argparse
 import os
+import sys
+import subprocess
+import nose.tools as nt
 
 def dests_from_argparse(parser):
     """Get destinations from a parser"""
@@ -20,4 +23,39 @@ def dests_from_argparse(parser):
 
 def on_travis_ci():
     """Check whether we are on travis"""
-    return os.environ.get("CI",False) and os.environ.get("TRAVIS",False)
\ No newline at end of file
+    return os.environ.get("CI",False) and os.environ.get("TRAVIS",False)
+
+def find_python(version):
+    """Find a python interpreter of at least ``version``, starting with this 
+    one and then trying ``python3`` on the path. Returns ``None`` if there 
+    isn't one."""
+    if sys.version_info >= version:
+        return sys.executable
+    try:
+        output = subprocess.check_output(["python3", "-c", 
+            "import sys; print(sys.executable); print(sys.version_info >= {0!r})".format(tuple(version))],
+            universal_newlines=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    executable, supported = output.split()
+    return executable if supported == "True" else None
+
+def run_python(*args, **kwargs):
+    """Run python in a subprocess which can import this copy of pyshell,
+    returning its standard output and standard error.
+    
+    :keyword env: Extra environment variables.
+    :keyword cwd: The working directory.
+    :keyword returncode: The expected exit status.
+    :keyword executable: The python interpreter, defaults to this one.
+    """
+    import pyshell
+    env = dict(os.environ)
+    env.update(kwargs.get("env", {}))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(pyshell.__file__)))
+    env[str("PYTHONPATH")] = os.pathsep.join([root, env.get("PYTHONPATH", "")])
+    process = subprocess.Popen([kwargs.get("executable", sys.executable)] + list(args), env=env, cwd=kwargs.get("cwd"),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    stdout, stderr = process.communicate()
+    nt.eq_(process.returncode, kwargs.get("returncode", 0), stderr)
+    return stdout, stderr
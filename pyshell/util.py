@@ -27,6 +27,10 @@ import functools
 import inspect
 import six
 import collections
+try:
+    import collections.abc as collections_abc
+except ImportError:
+    collections_abc = collections
 import argparse
 
 try:
@@ -34,9 +38,15 @@ try:
 except NameError:
     pass
 
-with warnings.catch_warnings():
-    warnings.simplefilter('ignore')
-    import pkg_resources # pylint: disable = unused-import
+def resource_stream(module, filename):
+    """Open a package resource with :func:`pkg_resources.resource_stream`.
+    
+    :mod:`pkg_resources` is slow to import, so it is imported (with its
+    import-time warnings silenced) only when a resource is first needed."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        import pkg_resources
+    return pkg_resources.resource_stream(module, filename)
 
 _ipydb_active = False
 
@@ -90,33 +100,182 @@ def askip(pylab=False, enter="Launch iPython?", exit="Continuing...", default="n
     else:
         return lambda : None #No-op callable.
         
-def resolve(name):
-    """Resolve a dotted name to a global object."""
-    name = name.split('.')
-    used = name.pop(0)
+_resolved = {}
+
+def resolve(name, cache=True):
+    """Resolve a dotted name to a global object.
+    
+    :param name: The dotted name to resolve.
+    :param cache: Whether to use (and populate) the resolver cache. The cache
+        is keyed by dotted name, so repeated lookups skip the import machinery.
+    
+    """
+    if cache:
+        try:
+            return _resolved[name]
+        except KeyError:
+            pass
+    parts = name.split('.')
+    used = parts.pop(0)
     found = __import__(used)
-    for n in name:
+    for n in parts:
         used = used + '.' + n
         try:
             found = getattr(found, n)
         except AttributeError:
             __import__(used)
             found = getattr(found, n)
+    if cache:
+        _resolved[name] = found
     return found
+    
+def clear_resolve_cache():
+    """Clear the cache used by :func:`resolve`."""
+    _resolved.clear()
 
-def configure_class(configuration):
-    """Resolve and configure a class."""
+_configured = collections.OrderedDict()
+
+_CONFIGURED_SIZE = 128
+
+def clear_configure_cache():
+    """Clear the cache used by :func:`configure_class` with ``memoize=True``."""
+    _configured.clear()
+
+def _configure_key(configuration):
+    """A hashable key for a class configuration, or None if it can't be hashed."""
+    from .config import FrozenConfiguration
+    if isinstance(configuration, collections_abc.Mapping):
+        configuration = FrozenConfiguration(configuration)
+    try:
+        hash(configuration)
+    except TypeError:
+        return None
+    return configuration
+
+def configure_class(configuration, memoize=False):
+    """Resolve and configure a class.
+    
+    :param configuration: Either a dotted class name, or a mapping with the 
+        dotted class name in the key ``"()"``, and keyword arguments for the class
+        in the remaining keys. The mapping is not modified.
+    :param memoize: If set, return the same object for equal configurations.
+        Mappings are frozen to build the cache key; configurations which still
+        can't be hashed are configured without memoizing. At most the 128 most recently built objects are kept, and the cache can be
+        emptied with :func:`clear_configure_cache`.
+    
+    """
+    key = _configure_key(configuration) if memoize else None
+    if key is not None:
+        try:
+            class_obj = _configured.pop(key)
+        except KeyError:
+            class_obj = configure_class(configuration)
+            while len(_configured) >= _CONFIGURED_SIZE:
+                _configured.popitem(last=False)
+        _configured[key] = class_obj
+        return class_obj
     if isinstance(configuration, six.string_types):
         class_obj = resolve(configuration)()
-    elif isinstance(configuration, collections.MutableMapping):
+    elif isinstance(configuration, collections_abc.Mapping):
         if "()" in configuration:
-            class_type = resolve(configuration.pop("()"))
-            class_obj = class_type(**configuration)
+            class_type = resolve(configuration["()"])
+            class_obj = class_type(**_class_kwargs(configuration))
         else:
             raise ValueError("Must provide class name in key '()'")
     else:
         raise ValueError("Can't understand {}".format(configuration))
     return class_obj
+    
+def _class_kwargs(configuration):
+    """Keyword arguments from a class configuration."""
+    return dict((str(key), value) for key, value in configuration.items() if key != "()")
+    
+_REFERENCE_PREFIX = "cfg://"
+
+def _class_references(configuration):
+    """Names referenced with ``cfg://name`` anywhere in a class configuration,
+    including in nested mappings and lists."""
+    if isinstance(configuration, six.string_types):
+        if configuration.startswith(_REFERENCE_PREFIX):
+            return [configuration[len(_REFERENCE_PREFIX):]]
+        return []
+    elif isinstance(configuration, collections_abc.Mapping):
+        values = configuration.values()
+    elif isinstance(configuration, collections_abc.Sequence):
+        values = configuration
+    else:
+        return []
+    references = []
+    for value in values:
+        references.extend(_class_references(value))
+    return references
+
+def _dereference(value, built):
+    """Replace ``cfg://name`` references with built objects, in nested mappings
+    and lists as well."""
+    if isinstance(value, six.string_types):
+        if value.startswith(_REFERENCE_PREFIX):
+            return built[value[len(_REFERENCE_PREFIX):]]
+        return value
+    elif isinstance(value, collections_abc.Mapping):
+        return dict((key, _dereference(item, built)) for key, item in value.items())
+    elif isinstance(value, collections_abc.Sequence):
+        return [ _dereference(item, built) for item in value ]
+    return value
+
+def configure_classes(configurations):
+    """Resolve and configure a mapping of named classes.
+    
+    :param configurations: A mapping of names to configurations, as accepted by
+        :func:`configure_class`.
+    :returns: A dictionary of names to configured objects.
+    
+    Configured objects can refer to each other by using the string 
+    ``"cfg://name"`` as a keyword argument value (or anywhere inside a list or
+    mapping of keyword argument values). Objects are built in dependency order, so that ``name`` will be 
+    built before the object which refers to it. All class names are resolved 
+    once, before any object is built.
+    
+    """
+    order = []
+    state = {}
+    def visit(name, chain):
+        """Depth-first topological sort."""
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError("Circular reference in class configuration: {}".format(
+                " -> ".join(chain + [name])))
+        if name not in configurations:
+            raise KeyError("Class configuration '{}' referenced by '{}' does not exist.".format(
+                name, chain[-1]))
+        state[name] = "visiting"
+        for reference in _class_references(configurations[name]):
+            visit(reference, chain + [name])
+        state[name] = "done"
+        order.append(name)
+    for name in configurations:
+        visit(name, [])
+    
+    classes = {}
+    for name, configuration in configurations.items():
+        if isinstance(configuration, six.string_types):
+            classes[name] = resolve(configuration)
+        elif isinstance(configuration, collections_abc.Mapping) and "()" in configuration:
+            classes[name] = resolve(configuration["()"])
+        else:
+            raise ValueError("Can't understand {}".format(configuration))
+    
+    built = {}
+    for name in order:
+        configuration = configurations[name]
+        if isinstance(configuration, six.string_types):
+            built[name] = classes[name]()
+        else:
+            kwargs = dict((key, _dereference(value, built)) 
+                for key, value in _class_kwargs(configuration).items())
+            built[name] = classes[name](**kwargs)
+    return built
 
 def is_type_factory(ttype):
     """Return a function which checks if an object can be cast as a given 
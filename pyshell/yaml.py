@@ -154,7 +154,11 @@ from __future__ import (absolute_import, unicode_literals, division,
 import yaml
 import six
 import abc
-from collections import OrderedDict, Mapping
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 __all__ = ['load_yaml_unicode', 'dump_yaml_unicode'
             'dump_yaml_subclasses', 'dump_yaml_classmapping'